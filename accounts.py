@@ -0,0 +1,224 @@
+import logging
+import threading
+
+from db import shared_connection
+from balance_journal import BalanceJournal
+from write_behind import WriteBehindQueue
+from hot_table import hot_table
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Как часто журнал сворачивается в снимок (секунды)
+COMPACT_INTERVAL = 60
+
+# Групповой коммит: не реже чем раз в COMMIT_INTERVAL секунд или каждые COMMIT_BATCH изменений
+COMMIT_INTERVAL = 0.05
+COMMIT_BATCH = 200
+
+
+class AccountStore:
+    """Балансы пользователей в casino.db с атомарными списаниями.
+
+    Таблица users служит снимком, а каждое изменение баланса дописывается
+    в журнал. При старте хвост журнала накатывается поверх снимка.
+    Изменения фиксируются в БД групповым коммитом в фоновом потоке.
+    Все суммы - целые центы. Текущие балансы зеркалируются в hot_table
+    для быстрого чтения.
+    """
+
+    def __init__(self, db_path='casino.db', journal_path='balance_journal.log', compact_interval=COMPACT_INTERVAL):
+        self.db_path = db_path
+        self.conn, self._lock = shared_connection(db_path)
+        self.journal = BalanceJournal(journal_path)
+        self.init_database()
+        self.replay_journal()
+        self.convert_to_cents()
+        self.sync_hot_table()
+        self._commits = WriteBehindQueue(self._commit, "accounts", COMMIT_INTERVAL, COMMIT_BATCH)
+
+        self.compact_interval = compact_interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._compact_loop, name="account-compactor", daemon=True)
+        self._thread.start()
+
+    def init_database(self):
+        """Создание таблиц, если их ещё нет"""
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    balance INTEGER DEFAULT 1000,
+                    wins INTEGER DEFAULT 0,
+                    losses INTEGER DEFAULT 0
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            # Номер последней записи журнала, учтённой в строке
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(users)')]
+            if 'journal_seq' not in columns:
+                self.conn.execute('ALTER TABLE users ADD COLUMN journal_seq INTEGER DEFAULT 0')
+            self.conn.commit()
+
+    def replay_journal(self):
+        """Накатывает записи журнала, которых ещё нет в снимке"""
+        applied = 0
+        with self._lock:
+            for entry in self.journal.read_entries():
+                user_id = entry['user']
+                self.conn.execute('INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, 0)', (user_id,))
+                cursor = self.conn.execute(
+                    'UPDATE users SET balance = balance + ?, journal_seq = ? WHERE user_id = ? AND journal_seq < ?',
+                    (entry['delta'], entry['seq'], user_id, entry['seq'])
+                )
+                applied += cursor.rowcount
+            self.conn.commit()
+
+            row = self.conn.execute('SELECT COALESCE(MAX(journal_seq), 0) FROM users').fetchone()
+            self._seq = max(row[0], self.journal.last_seq)
+
+        if applied:
+            logging.info(f"Восстановлено записей из журнала балансов: {applied}")
+        self.compact('TRUNCATE')
+
+    def convert_to_cents(self):
+        """Однократный перевод балансов из долларов с плавающей точкой в целые центы"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'balance_units'").fetchone()
+            if row and row[0] == 'cents':
+                return
+            if self.journal.entries:
+                # Записи журнала в долларах нельзя смешивать с балансами в центах
+                raise RuntimeError("Журнал балансов не свёрнут, перевод в центы невозможен")
+            self.conn.execute('UPDATE users SET balance = CAST(ROUND(balance * 100) AS INTEGER)')
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('balance_units', 'cents')")
+            self.conn.commit()
+        logging.info("Балансы переведены в центы")
+
+    def sync_hot_table(self):
+        """Переносит балансы из снимка в горячую таблицу"""
+        with self._lock:
+            for user_id, balance in self.conn.execute('SELECT user_id, balance FROM users'):
+                hot_table.set_balance_cents(user_id, balance)
+
+    def compact(self, mode='PASSIVE'):
+        """Сворачивает журнал: переносит WAL в файл БД и очищает журнал.
+
+        По таймеру - PASSIVE: не ждёт читателей и не держит общую блокировку
+        casino.db долго. TRUNCATE (ждёт читателей и обрезает WAL) - только при
+        запуске и остановке
+        """
+        with self._lock:
+            if not self.journal.entries:
+                return
+            self.conn.commit()
+            busy, log, checkpointed = self.conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+            if busy or checkpointed != log:
+                # Снимок не записан целиком - журнал пока нужен
+                return
+            self.journal.truncate()
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logging.error(f"Ошибка сжатия журнала балансов: {e}")
+
+    def _commit(self, user_ids):
+        """Фиксирует одной транзакцией все изменения, накопленные с прошлого коммита"""
+        with self._lock:
+            self.conn.commit()
+
+    def _apply(self, user_id, delta, reason, game, condition=''):
+        """Меняет баланс и пишет запись в журнал. Вызывается под блокировкой"""
+        seq = self._seq + 1
+        params = [delta, seq, int(user_id)]
+        if condition:
+            params.append(-delta)
+        row = self.conn.execute(
+            f'UPDATE users SET balance = balance + ?, journal_seq = ? WHERE user_id = ?{condition} RETURNING balance',
+            params
+        ).fetchone()
+        if row is None:
+            return False
+        hot_table.set_balance_cents(user_id, row[0])
+        self._seq = seq
+        self.journal.append(seq, user_id, delta, reason, game)
+        return True
+
+    def ensure_account(self, user_id, username=None):
+        """Создаёт счёт с нулевым балансом, если его нет"""
+        with self._lock:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO users (user_id, username, balance) VALUES (?, ?, 0)',
+                (int(user_id), username)
+            )
+            if cursor.rowcount:
+                hot_table.set_balance_cents(user_id, 0)
+            if username:
+                self.conn.execute('UPDATE users SET username = ? WHERE user_id = ?', (username, int(user_id)))
+            self._commits.mark(int(user_id))
+
+    def get_balance(self, user_id):
+        """Текущий баланс пользователя в центах (из горячей таблицы, без запроса к БД)"""
+        cents = hot_table.get_balance_cents(user_id)
+        return cents if cents is not None else 0
+
+    def debit(self, user_id, amount, reason='bet', game=None):
+        """Списывает сумму в центах, только если хватает средств. Возвращает True при успехе"""
+        with self._lock:
+            ok = self._apply(user_id, -amount, reason, game, condition=' AND balance >= ?')
+            self._commits.mark(int(user_id))
+        return ok
+
+    def credit(self, user_id, amount, reason='win', game=None):
+        """Начисляет сумму в центах на баланс"""
+        with self._lock:
+            self.conn.execute('INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, 0)', (int(user_id),))
+            self._apply(user_id, amount, reason, game)
+            self._commits.mark(int(user_id))
+
+    def transfer(self, from_id, to_id, amount, reason='transfer'):
+        """Переводит сумму в центах между пользователями одной операцией. True при успехе"""
+        with self._lock:
+            if not self._apply(from_id, -amount, reason, None, condition=' AND balance >= ?'):
+                return False
+            self.conn.execute('INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, 0)', (int(to_id),))
+            self._apply(to_id, amount, reason, None)
+            self._commits.mark(int(from_id))
+            self._commits.mark(int(to_id))
+        return True
+
+    def set_balance(self, user_id, amount, reason='admin_set'):
+        """Устанавливает баланс в центах (админ-команды)"""
+        with self._lock:
+            self.conn.execute('INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, 0)', (int(user_id),))
+            row = self.conn.execute('SELECT balance FROM users WHERE user_id = ?', (int(user_id),)).fetchone()
+            self._apply(user_id, amount - row[0], reason, None)
+            self._commits.mark(int(user_id))
+
+    def get_total_balance(self):
+        """Сумма балансов всех пользователей в центах"""
+        with self._lock:
+            row = self.conn.execute('SELECT COALESCE(SUM(balance), 0) FROM users').fetchone()
+        return row[0]
+
+    def close(self):
+        """Останавливает сжатие журнала и фиксирует последние изменения"""
+        self._stop.set()
+        self._commits.close()
+        try:
+            self.compact('TRUNCATE')
+        except Exception as e:
+            logging.error(f"Ошибка сжатия журнала балансов: {e}")
+        self.journal.close()
+
+
+# Глобальный экземпляр хранилища балансов
+account_store = AccountStore()
@@ -0,0 +1,153 @@
+import math
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+from db import shared_connection
+from write_behind import WriteBehindQueue
+
+# Точность скетча: 2^12 регистров (4 КБ на день), стандартная ошибка ~1.6%
+HLL_PRECISION = 12
+
+# Сколько дней скетчей держать в памяти и в БД
+ACTIVITY_DAYS = 30
+
+# Сброс в БД: не реже чем раз в ACTIVITY_FLUSH_INTERVAL секунд или каждые ACTIVITY_FLUSH_BATCH пользователей
+ACTIVITY_FLUSH_INTERVAL = 5.0
+ACTIVITY_FLUSH_BATCH = 1000
+
+
+class HyperLogLog:
+    """Скетч числа уникальных элементов фиксированного размера.
+
+    Скетчи объединяются поэлементным максимумом регистров, поэтому число
+    уникальных за неделю или месяц - это объединение дневных скетчей.
+    """
+
+    def __init__(self, registers=None, precision=HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    def add(self, item):
+        value = int.from_bytes(hashlib.blake2b(str(item).encode(), digest_size=8).digest(), 'big')
+        rest_bits = 64 - self.precision
+        index = value >> rest_bits
+        rest = value & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Малые количества точнее считает линейный подсчёт
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class ActivityTracker:
+    """Активные пользователи по дням: время последней активности и дневные скетчи.
+
+    Отметка активности - запись в память. Фоновый поток пачками сохраняет
+    время последней активности и изменённые скетчи в bot_stats.db.
+    DAU/WAU/MAU считаются объединением не более 30 скетчей по 4 КБ.
+    """
+
+    def __init__(self, db_path='bot_stats.db'):
+        self.conn, self._lock = shared_connection(db_path)
+        self._state_lock = threading.Lock()
+        # дата -> скетч; загружаются из БД при первом обращении
+        self._sketches = {}
+        self._dirty_days = set()
+        # user_id -> время последней активности, ещё не записанное в БД
+        self._pending = {}
+        # user_id -> дата последней отметки: повторная отметка за день ничего не меняет
+        self._last_day = {}
+        self.init_database()
+        self._queue = WriteBehindQueue(self._flush, "activity", ACTIVITY_FLUSH_INTERVAL, ACTIVITY_FLUSH_BATCH)
+
+    def init_database(self):
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS daily_active (
+                    date TEXT PRIMARY KEY,
+                    sketch BLOB NOT NULL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_activity (
+                    user_id INTEGER PRIMARY KEY,
+                    last_active INTEGER NOT NULL
+                )
+            ''')
+            self.conn.commit()
+
+    def _sketch(self, date):
+        sketch = self._sketches.get(date)
+        if sketch is None:
+            with self._lock:
+                row = self.conn.execute('SELECT sketch FROM daily_active WHERE date = ?', (date,)).fetchone()
+            sketch = self._sketches[date] = HyperLogLog(row[0] if row else None)
+        return sketch
+
+    def record(self, user_id):
+        """Отмечает активность пользователя"""
+        user_id = int(user_id)
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._state_lock:
+            self._pending[user_id] = int(time.time())
+            if self._last_day.get(user_id) != today:
+                self._last_day[user_id] = today
+                if self._sketch(today).add(user_id):
+                    self._dirty_days.add(today)
+        self._queue.mark(user_id)
+
+    def _flush(self, user_ids):
+        oldest = (datetime.now() - timedelta(days=ACTIVITY_DAYS)).strftime('%Y-%m-%d')
+        with self._state_lock:
+            activity = [(user_id, self._pending.pop(user_id)) for user_id in user_ids if user_id in self._pending]
+            sketches = [(date, bytes(self._sketches[date].registers)) for date in self._dirty_days]
+            self._dirty_days.clear()
+            for date in [date for date in self._sketches if date < oldest]:
+                del self._sketches[date]
+            if len(self._last_day) > ACTIVITY_FLUSH_BATCH * 100:
+                self._last_day.clear()
+        try:
+            with self._lock:
+                self.conn.executemany('''
+                    INSERT INTO user_activity (user_id, last_active) VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET last_active = MAX(last_active, excluded.last_active)
+                ''', activity)
+                self.conn.executemany('INSERT OR REPLACE INTO daily_active (date, sketch) VALUES (?, ?)', sketches)
+                self.conn.execute('DELETE FROM daily_active WHERE date < ?', (oldest,))
+                self.conn.commit()
+        except Exception:
+            # Вернём несохранённое - очередь повторит сброс
+            with self._state_lock:
+                for user_id, timestamp in activity:
+                    self._pending[user_id] = max(self._pending.get(user_id, 0), timestamp)
+                self._dirty_days.update(date for date, _ in sketches)
+            raise
+
+    def count_active(self, days=1):
+        """Число уникальных активных пользователей за последние days дней (включая сегодня)"""
+        now = datetime.now()
+        dates = [(now - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days)]
+        total = HyperLogLog()
+        with self._state_lock:
+            for date in dates:
+                total.merge(self._sketch(date))
+        return total.count()
+
+
+# Глобальный учёт активности
+activity_tracker = ActivityTracker()
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+JOURNAL_FILE = 'balance_journal.log'
+
+# Как часто записи журнала группой сбрасываются на диск с fsync (секунды)
+SYNC_INTERVAL = 0.2
+
+
+class BalanceJournal:
+    """Журнал изменений балансов: только дозапись, fsync группами в фоне"""
+
+    def __init__(self, path=JOURNAL_FILE, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        # _lock защищает только буфер и счётчики: его берёт append под блокировкой
+        # casino.db, поэтому запись в файл и fsync идут под отдельной _io_lock
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._buffer = []
+        self.last_seq = 0
+        self.entries = 0
+
+        for entry in self.read_entries():
+            self.last_seq = max(self.last_seq, entry['seq'])
+            self.entries += 1
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._terminate_torn_line()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sync_loop, name="balance-journal-sync", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def read_entries(self):
+        """Читает записи журнала; оборванная последняя строка пропускается"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logging.error(f"Пропущена повреждённая запись журнала: {line[:100]!r}")
+        except FileNotFoundError:
+            return
+
+    def _terminate_torn_line(self):
+        """Закрывает оборванную при сбое строку, чтобы новые записи не склеились с ней"""
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                self._file.write('\n')
+                self._file.flush()
+
+    def append(self, seq, user_id, delta, reason, game=None):
+        """Добавляет запись в буфер; на диск её запишет фоновый поток"""
+        entry = {
+            'seq': seq,
+            'user': int(user_id),
+            'delta': delta,
+            'reason': reason,
+            'game': game,
+            'ts': round(time.time(), 3)
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._buffer.append(line)
+            self.last_seq = seq
+            self.entries += 1
+
+    def sync(self):
+        """Записывает накопленные записи одной группой и делает fsync"""
+        with self._io_lock:
+            with self._lock:
+                if not self._buffer:
+                    return
+                lines, self._buffer = self._buffer, []
+            start = time.perf_counter()
+            try:
+                self._file.write(''.join(lines))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception as e:
+                logging.error(f"Ошибка записи журнала балансов: {e}")
+                with self._lock:
+                    self._buffer = lines + self._buffer
+                return
+        metrics.observe("balance_journal.fsync_ms", (time.perf_counter() - start) * 1000)
+        metrics.observe("balance_journal.batch_size", len(lines))
+
+    def truncate(self):
+        """Очищает журнал после того, как снимок надёжно записан"""
+        with self._io_lock:
+            with self._lock:
+                # Всё, что ещё в буфере, уже попало в снимок
+                self._buffer = []
+                self.entries = 0
+            self._file.truncate(0)
+            self._file.seek(0)
+            os.fsync(self._file.fileno())
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def close(self):
+        """Останавливает фоновый поток и сбрасывает последние записи"""
+        self._stop.set()
+        self.sync()
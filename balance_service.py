@@ -0,0 +1,102 @@
+import threading
+
+from accounts import account_store
+from metrics import metrics
+from settlements import settlement_stage
+
+# Число полос блокировок: пользователи из разных полос не ждут друг друга
+LOCK_STRIPES = 64
+
+
+class BalanceService:
+    """Списания, начисления и переводы поверх AccountStore.
+
+    Каждое изменение баланса - одно условное UPDATE, которое сравнивает
+    баланс с суммой внутри запроса (compare-and-swap), поэтому параллельные
+    изменения не затирают друг друга. Многошаговые операции одного
+    пользователя (проверка состояния игры и выплата) сериализуются
+    блокировкой его полосы. Успешные операции передаются в стадию
+    агрегации расчётов (оборот, выигрыши, депозиты).
+    """
+
+    def __init__(self, store, stripes=LOCK_STRIPES):
+        self.store = store
+        # Важно: все обработчики бота - корутины одного потока цикла событий,
+        # а RLock повторно входим, поэтому друг от друга корутины эти блокировки
+        # НЕ отделяют. Защищают они только потому, что внутри блока
+        # `with user_lock(...)` нет ни одного await: блок выполняется целиком,
+        # без переключения на другую корутину. await под блокировкой запрещён.
+        # От фоновых потоков (сброс TTL, планировщик) блокировки защищают как обычно.
+        self._stripes = [threading.RLock() for _ in range(stripes)]
+
+    def _stripe_index(self, user_id):
+        return int(user_id) % len(self._stripes)
+
+    def user_lock(self, user_id):
+        """Блокировка пользователя для многошаговых операций (повторно входимая).
+
+        Внутри блока with не должно быть await - см. комментарий в __init__
+        """
+        return self._stripes[self._stripe_index(user_id)]
+
+    def debit(self, user_id, amount, reason='bet', game=None):
+        """Списывает сумму в центах, если хватает средств. Возвращает True при успехе"""
+        if amount <= 0:
+            raise ValueError(f"Некорректная сумма списания: {amount}")
+        with self.user_lock(user_id):
+            ok = self.store.debit(user_id, amount, reason, game)
+        metrics.inc("balance.debits" if ok else "balance.debits_rejected")
+        if ok:
+            settlement_stage.record(user_id, reason, amount, game)
+        return ok
+
+    def credit(self, user_id, amount, reason='win', game=None):
+        """Начисляет сумму в центах"""
+        if amount < 0:
+            raise ValueError(f"Некорректная сумма начисления: {amount}")
+        if not amount:
+            return
+        with self.user_lock(user_id):
+            self.store.credit(user_id, amount, reason, game)
+        metrics.inc("balance.credits")
+        settlement_stage.record(user_id, reason, amount, game)
+
+    def set_balance(self, user_id, amount, reason='admin_set'):
+        """Устанавливает баланс в центах (админ-команды)"""
+        if amount < 0:
+            raise ValueError(f"Некорректный баланс: {amount}")
+        with self.user_lock(user_id):
+            self.store.set_balance(user_id, amount, reason)
+        metrics.inc("balance.admin_sets")
+
+    def transfer(self, from_id, to_id, amount, reason='transfer'):
+        """Переводит сумму в центах от одного пользователя другому. True при успехе"""
+        if amount <= 0:
+            raise ValueError(f"Некорректная сумма перевода: {amount}")
+        if int(from_id) == int(to_id):
+            return True
+        # Полосы берутся в порядке номеров, чтобы встречные переводы не взаимоблокировались
+        indexes = sorted({self._stripe_index(from_id), self._stripe_index(to_id)})
+        for index in indexes:
+            self._stripes[index].acquire()
+        try:
+            ok = self.store.transfer(from_id, to_id, amount, reason)
+        finally:
+            for index in reversed(indexes):
+                self._stripes[index].release()
+        metrics.inc("balance.transfers" if ok else "balance.transfers_rejected")
+        return ok
+
+    def refund_on_evict(self, game):
+        """Хук on_evict для хранилища сессий: возвращает несыгранную ставку (bet_amount)"""
+        def refund(user_id, session):
+            self.credit(user_id, session.bet_amount, reason='refund', game=game)
+        return refund
+
+    def get_balance(self, user_id):
+        """Текущий баланс в центах"""
+        return self.store.get_balance(user_id)
+
+
+# Глобальный сервис балансов
+balance_service = BalanceService(account_store)
@@ -1,38 +1,30 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, CLICK_TTL
+from pending_input import pending_inputs
+from records import BalloonSession
 import logging
 import time
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        logging.error(f"Ошибка загрузки данных: {e}")
-        return {}
-
-def save_users_data(data):
-    try:
-        with open('users_data.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка сохранения данных: {e}")
-
 # Активные игры шарика
-active_balloon_games = {}
+def cash_out_abandoned(user_id, game_data):
+    """Брошенная игра закрывается выплатой по текущему множителю"""
+    balance_service.credit(user_id, payout(game_data.bet_amount, game_data.multiplier), game='balloon')
 
-# Минимальная и максимальная ставка
-MIN_BET = 0.2
-MAX_BET = 1000
+active_balloon_games = SessionStore('balloon', GAME_TTL, on_evict=cash_out_abandoned)
+
+# Минимальная и максимальная ставка (в центах)
+MIN_BET = 20
+MAX_BET = 100000
 
 # Задержка между нажатиями
-last_click_time = {}
+last_click_time = SessionStore('balloon_clicks', CLICK_TTL)
 
 def rate_limit(user_id):
     """Проверка ограничения по времени между нажатиями (0.4 секунды)"""
@@ -81,69 +73,67 @@ def get_balloon_rules():
 • Не жадничайте!
 
 ⚡ <b>Ставки:</b>
-• Минимальная: ${MIN_BET}
-• Максимальная: ${MAX_BET}
+• Минимальная: ${format_money(MIN_BET)}
+• Максимальная: ${format_money(MAX_BET)}
 </blockquote>
 
 🎈 <i>Удачи в надувании!</i>
 """
 
-def play_balloon_game(bot, call, bet_amount, user_id):
+async def play_balloon_game(bot, call, bet_amount, user_id):
     """Запуск игры в шарик"""
     try:
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
-
         # Списываем ставку
-        users_data[user_id]['balance'] = round(current_balance - bet_amount, 2)
-        save_users_data(users_data)
+        if not balance_service.debit(user_id, bet_amount, game='balloon'):
+            await bot.send_message(call.message.chat.id, "❌ Недостаточно средств!")
+            return
 
         # Создаем новую игру
-        game_data = {
-            'bet_amount': bet_amount,
-            'multiplier': 1.0,
-            'game_active': True,
-            'chat_id': call.message.chat.id,
-            'message_id': call.message.message_id
-        }
+        game_data = BalloonSession(
+            bet_amount=bet_amount,
+            multiplier=1.0,
+            game_active=True,
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id
+        )
 
         active_balloon_games[user_id] = game_data
 
         # Сразу показываем игру (без кнопки "Начать игру")
-        show_balloon_game_state(bot, call, user_id)
+        await show_balloon_game_state(bot, call, user_id)
 
     except Exception as e:
         logging.error(f"Ошибка запуска игры в шарик: {e}")
-        bot.edit_message_text(
+        await bot.edit_message_text(
             "❌ Произошла ошибка при запуске игры",
             call.message.chat.id,
             call.message.message_id
         )
 
-def show_balloon_game_state(bot, call, user_id):
+async def show_balloon_game_state(bot, call, user_id):
     """Показывает текущее состояние игры"""
     try:
         if user_id not in active_balloon_games:
             return
 
         game_data = active_balloon_games[user_id]
-        bet_amount = game_data['bet_amount']
-        multiplier = game_data['multiplier']
+        bet_amount = game_data.bet_amount
+        multiplier = game_data.multiplier
 
         # Создаем визуализацию шарика
         balloon_visual = create_balloon_visual(multiplier)
         risk_level = calculate_risk_level(multiplier)
 
         # Текущий возможный выигрыш
-        current_win = bet_amount * multiplier
+        current_win = payout(bet_amount, multiplier)
 
         message_text = f"""
 <b>🎈 ИГРА "ШАРИК"</b>
 
 <blockquote>
-💰 Ставка: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
 🎯 Текущий множитель: {multiplier:.1f}x
-🏆 Текущий выигрыш: ${current_win:.2f}
+🏆 Текущий выигрыш: ${format_money(current_win)}
 ⚠️ Уровень риска: {risk_level}
 </blockquote>
 
@@ -159,7 +149,7 @@ def show_balloon_game_state(bot, call, user_id):
             types.InlineKeyboardButton("💰 ЗАБРАТЬ", callback_data="balloon_cashout")
         )
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             message_text,
             call.message.chat.id,
             call.message.message_id,
@@ -196,91 +186,88 @@ def calculate_risk_level(multiplier):
     else:
         return "💥 КРИТИЧЕСКИЙ"
 
-def process_balloon_inflate(bot, call, user_id):
+async def process_balloon_inflate(bot, call, user_id):
     """Обработка надувания шарика"""
     try:
-        if user_id not in active_balloon_games:
-            bot.answer_callback_query(call.id, "❌ Игра не найдена")
+        with balance_service.user_lock(user_id):
+            game_data = active_balloon_games.get(user_id)
+            if game_data is None or not game_data.game_active:
+                game_data = None
+            # Проверяем шанс лопнуть (15%)
+            elif random.random() < 0.15:
+                # Шарик лопнул - ставка проиграна, снимаем игру до ответа
+                game_data.game_active = False
+                active_balloon_games.pop(user_id, None)
+            else:
+                # Увеличиваем множитель (не больше 10.0x)
+                game_data.multiplier = min(round(game_data.multiplier + 0.2, 1), 10.0)
+
+        if game_data is None:
+            await bot.answer_callback_query(call.id, "❌ Игра не найдена")
             return
 
-        game_data = active_balloon_games[user_id]
-
-        # Проверяем шанс лопнуть (15%)
-        if random.random() < 0.15:
-            # Шарик лопнул
-            game_data['game_active'] = False
-            show_balloon_burst_result(bot, call, user_id)
+        if not game_data.game_active:
+            await show_balloon_burst_result(bot, call, user_id, game_data)
             return
 
-        # Увеличиваем множитель
-        game_data['multiplier'] = round(game_data['multiplier'] + 0.2, 1)
-
         # Проверяем максимальный множитель
-        if game_data['multiplier'] >= 10.0:
-            game_data['multiplier'] = 10.0
-            bot.answer_callback_query(call.id, "🎉 Достигнут максимальный множитель 10.0x!")
+        if game_data.multiplier >= 10.0:
+            await bot.answer_callback_query(call.id, "🎉 Достигнут максимальный множитель 10.0x!")
         else:
-            bot.answer_callback_query(call.id, "✅ Шарик надут! +0.2x")
+            await bot.answer_callback_query(call.id, "✅ Шарик надут! +0.2x")
 
         # Показываем обновленное состояние
-        show_balloon_game_state(bot, call, user_id)
+        await show_balloon_game_state(bot, call, user_id)
 
     except Exception as e:
         logging.error(f"Ошибка надувания шарика: {e}")
-        bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+        await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
 
-def process_balloon_cashout(bot, call, user_id):
+async def process_balloon_cashout(bot, call, user_id):
     """Обработка вывода выигрыша"""
     try:
-        if user_id not in active_balloon_games:
-            bot.answer_callback_query(call.id, "❌ Игра не найдена")
+        # Игру снимаем до выплаты: повторное нажатие её уже не найдёт
+        with balance_service.user_lock(user_id):
+            game_data = active_balloon_games.pop(user_id, None)
+            if game_data is not None and game_data.game_active:
+                # Завершаем игру
+                game_data.game_active = False
+
+                # Вычисляем выигрыш и обновляем баланс
+                win_amount = payout(game_data.bet_amount, game_data.multiplier)
+                balance_service.credit(user_id, win_amount, game='balloon')
+            else:
+                game_data = None
+
+        if game_data is None:
+            await bot.answer_callback_query(call.id, "❌ Игра не найдена")
             return
 
-        game_data = active_balloon_games[user_id]
-        bet_amount = game_data['bet_amount']
-        multiplier = game_data['multiplier']
-
-        # Вычисляем выигрыш
-        win_amount = round(bet_amount * multiplier, 2)
-
-        # Обновляем баланс
-        users_data = load_users_data()
-        users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
-        save_users_data(users_data)
-
-        # Завершаем игру
-        game_data['game_active'] = False
-
         # Показываем результат
-        show_balloon_win_result(bot, call, user_id, win_amount)
+        await show_balloon_win_result(bot, call, user_id, game_data, win_amount)
 
     except Exception as e:
         logging.error(f"Ошибка вывода в шарике: {e}")
-        bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+        await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
 
-def show_balloon_win_result(bot, call, user_id, win_amount):
-    """Показывает результат победы"""
+async def show_balloon_win_result(bot, call, user_id, game_data, win_amount):
+    """Показывает результат победы (игра уже снята и оплачена)"""
     try:
-        if user_id not in active_balloon_games:
-            return
-
-        game_data = active_balloon_games[user_id]
-        bet_amount = game_data['bet_amount']
-        multiplier = game_data['multiplier']
+        bet_amount = game_data.bet_amount
+        multiplier = game_data.multiplier
         
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
+        current_balance = account_store.get_balance(user_id)
         profit = win_amount - bet_amount
 
         message_text = f"""
 <b>🎉 ПОБЕДА!</b>
 
 <blockquote>
-💰 Ставка: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
 🎯 Финальный множитель: {multiplier:.1f}x
-🏆 Выигрыш: ${win_amount:.2f}
-💵 Прибыль: ${profit:.2f}
-💎 Текущий баланс: ${current_balance:.2f}
+🏆 Выигрыш: ${format_money(win_amount)}
+💵 Прибыль: ${format_money(profit)}
+💎 Текущий баланс: ${format_money(current_balance)}
 </blockquote>
 
 🎈 <i>Вы успешно забрали выигрыш!</i>
@@ -292,7 +279,7 @@ def show_balloon_win_result(bot, call, user_id, win_amount):
             types.InlineKeyboardButton("🎮 ДРУГИЕ ИГРЫ", callback_data="balloon_other_games")
         )
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             message_text,
             call.message.chat.id,
             call.message.message_id,
@@ -300,33 +287,25 @@ def show_balloon_win_result(bot, call, user_id, win_amount):
             parse_mode='HTML'
         )
 
-        # Удаляем игру из активных
-        del active_balloon_games[user_id]
-
     except Exception as e:
         logging.error(f"Ошибка показа победы: {e}")
 
-def show_balloon_burst_result(bot, call, user_id):
-    """Показывает результат лопнувшего шарика"""
+async def show_balloon_burst_result(bot, call, user_id, game_data):
+    """Показывает результат лопнувшего шарика (игра уже снята)"""
     try:
-        if user_id not in active_balloon_games:
-            return
-
-        game_data = active_balloon_games[user_id]
-        bet_amount = game_data['bet_amount']
-        multiplier = game_data['multiplier']
+        bet_amount = game_data.bet_amount
+        multiplier = game_data.multiplier
         
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
+        current_balance = account_store.get_balance(user_id)
 
         message_text = f"""
 <b>💥 ШАРИК ЛОПНУЛ!</b>
 
 <blockquote>
-💰 Ставка: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
 🎯 Достигнутый множитель: {multiplier:.1f}x
-💸 Потеряно: ${bet_amount}
-💎 Текущий баланс: ${current_balance:.2f}
+💸 Потеряно: ${format_money(bet_amount)}
+💎 Текущий баланс: ${format_money(current_balance)}
 </blockquote>
 
 😞 <i>Шарик не выдержал давления...</i>
@@ -338,7 +317,7 @@ def show_balloon_burst_result(bot, call, user_id):
             types.InlineKeyboardButton("🎮 ДРУГИЕ ИГРЫ", callback_data="balloon_other_games")
         )
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             message_text,
             call.message.chat.id,
             call.message.message_id,
@@ -346,67 +325,58 @@ def show_balloon_burst_result(bot, call, user_id):
             parse_mode='HTML'
         )
 
-        # Удаляем игру из активных
-        del active_balloon_games[user_id]
-
     except Exception as e:
         logging.error(f"Ошибка показа проигрыша: {e}")
 
 def register_balloon_handlers(bot):
     """Регистрация обработчиков для игры в шарик"""
 
-    def process_custom_bet_balloon(message):
+    async def process_custom_bet_balloon(message):
         """Обработка ручного ввода ставки для шарика"""
         try:
-            bet_amount = float(message.text)
-            users_data = load_users_data()
+            bet_amount = parse_amount(message.text)
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
             
             # Проверяем минимальную и максимальную ставку
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}!")
                 return
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}!")
                 return
             if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             # Сразу запускаем игру (без кнопки "Начать игру")
-            play_balloon_game(bot, types.CallbackQuery(message=message, data=f"balloon_start_{bet_amount}", from_user=message.from_user, id=""), bet_amount, user_id)
+            await play_balloon_game(bot, types.CallbackQuery(message=message, data=f"balloon_start_{format_money(bet_amount)}", from_user=message.from_user, id=""), bet_amount, user_id)
 
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
         except Exception as e:
             logging.error(f"Ошибка в process_custom_bet_balloon: {e}")
-            bot.send_message(message.chat.id, "❌ Произошла ошибка!")
+            await bot.send_message(message.chat.id, "❌ Произошла ошибка!")
 
     @bot.message_handler(func=lambda message: message.text == "🎈 Шарик")
-    def balloon_start(message):
+    async def balloon_start(message):
         """Начало игры в шарик"""
         try:
             # Проверяем задержку
             if not rate_limit(str(message.from_user.id)):
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"""<b>🎈 ИГРА "ШАРИК"</b>
 
@@ -418,37 +388,36 @@ def register_balloon_handlers(bot):
             )
         except Exception as e:
             logging.error(f"Ошибка в balloon_start: {e}")
-            bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
+            await bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('balloon_'))
-    def balloon_callback_handler(call):
+    async def balloon_callback_handler(call):
         """Обработчик колбэков шарика"""
         try:
             user_id = str(call.from_user.id)
 
             # Проверяем задержку
             if not rate_limit(user_id):
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
             if call.data.startswith("balloon_bet_"):
-                bet_amount = float(call.data.split("_")[2])
-                users_data = load_users_data()
+                bet_amount = parse_amount(call.data.split("_")[2])
 
-                balance = users_data[user_id].get('balance', 0)
+                balance = account_store.get_balance(user_id)
                 if bet_amount > balance:
-                    bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                    await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                     return
 
                 # Сразу запускаем игру (без кнопки "Начать игру")
-                play_balloon_game(bot, call, bet_amount, user_id)
+                await play_balloon_game(bot, call, bet_amount, user_id)
 
             elif call.data == "balloon_custom_bet":
-                bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-                bot.register_next_step_handler(call.message, process_custom_bet_balloon)
+                await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+                pending_inputs.register(call.message, process_custom_bet_balloon)
 
             elif call.data == "balloon_rules":
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     get_balloon_rules(),
                     call.message.chat.id,
                     call.message.message_id,
@@ -459,11 +428,10 @@ def register_balloon_handlers(bot):
                 )
 
             elif call.data == "balloon_back_to_bet":
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""<b>🎈 ИГРА "ШАРИК"</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -476,21 +444,19 @@ def register_balloon_handlers(bot):
                 )
 
             elif call.data == "balloon_inflate":
-                process_balloon_inflate(bot, call, user_id)
+                await process_balloon_inflate(bot, call, user_id)
 
             elif call.data == "balloon_cashout":
-                process_balloon_cashout(bot, call, user_id)
+                await process_balloon_cashout(bot, call, user_id)
 
             elif call.data == "balloon_play_again":
                 # Очищаем предыдущую игру
-                if user_id in active_balloon_games:
-                    del active_balloon_games[user_id]
+                active_balloon_games.discard(user_id)
 
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""<b>🎈 ИГРА "ШАРИК"</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -504,10 +470,9 @@ def register_balloon_handlers(bot):
 
             elif call.data == "balloon_other_games":
                 # Возврат к основным играм
-                if user_id in active_balloon_games:
-                    del active_balloon_games[user_id]
+                active_balloon_games.discard(user_id)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     "🎮 <b>Выберите игру:</b>",
                     call.message.chat.id,
                     call.message.message_id,
@@ -517,6 +482,6 @@ def register_balloon_handlers(bot):
         except Exception as e:
             logging.error(f"Ошибка в balloon_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+                await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
             except:
                 pass
\ No newline at end of file
@@ -1,40 +1,29 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, CLICK_TTL
+from pending_input import pending_inputs
+from records import CoinSession
 import time
+import asyncio
 import logging
 import threading
 import secrets  # Добавляем для лучшей случайности
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        logging.error(f"Ошибка загрузки данных: {e}")
-        return {}
-
-def save_users_data(data):
-    try:
-        with open('users_data.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка сохранения данных: {e}")
-
 # Активные игры Орел-Решка
-active_coin_games = {}
+active_coin_games = SessionStore('coin', GAME_TTL, on_evict=balance_service.refund_on_evict('coin'))
 
-# Минимальная и максимальная ставка
-MIN_BET = 0.2
-MAX_BET = 1000
+# Минимальная и максимальная ставка (в центах)
+MIN_BET = 20
+MAX_BET = 100000
 
 # Задержка между нажатиями
-last_click_time = {}
+last_click_time = SessionStore('coin_clicks', CLICK_TTL)
 click_lock = threading.Lock()
 
 def rate_limit(user_id):
@@ -93,55 +82,53 @@ def get_coin_choice_keyboard():
     )
     return markup
 
-def play_coin_game(bot, call, bet_amount, user_id):
+async def play_coin_game(bot, call, bet_amount, user_id):
     """Основная логика игры в Орел-Решку"""
     try:
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
-
         # Списываем ставку
-        users_data[user_id]['balance'] = round(current_balance - bet_amount, 2)
-        save_users_data(users_data)
+        if not balance_service.debit(user_id, bet_amount, game='coin'):
+            await bot.send_message(call.message.chat.id, "❌ Недостаточно средств!")
+            return
 
         # Сохраняем состояние игры
-        active_coin_games[user_id] = {
-            'bet_amount': bet_amount,
-            'chat_id': call.message.chat.id,
-            'message_id': call.message.message_id
-        }
+        active_coin_games[user_id] = CoinSession(
+            bet_amount=bet_amount,
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id
+        )
 
         # Показываем выбор стороны
-        show_coin_choice_screen(bot, user_id)
+        await show_coin_choice_screen(bot, user_id)
 
     except Exception as e:
         logging.error(f"Ошибка запуска игры в Орел-Решку: {e}")
-        bot.edit_message_text(
+        await bot.edit_message_text(
             "❌ Произошла ошибка при запуске игры",
             call.message.chat.id,
             call.message.message_id
         )
 
-def show_coin_choice_screen(bot, user_id):
+async def show_coin_choice_screen(bot, user_id):
     """Показывает экран выбора стороны монеты"""
     try:
         if user_id not in active_coin_games:
             return
 
         game_data = active_coin_games[user_id]
-        bet_amount = game_data['bet_amount']
+        bet_amount = game_data.bet_amount
 
         display = f"""🪙 <b>Орел-Решка</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите сторону монеты:"""
 
         keyboard = get_coin_choice_keyboard()
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=keyboard
         )
@@ -149,15 +136,16 @@ def show_coin_choice_screen(bot, user_id):
     except Exception as e:
         logging.error(f"Ошибка показа выбора монеты: {e}")
 
-def process_coin_choice(bot, call, player_choice, user_id):
+async def process_coin_choice(bot, call, player_choice, user_id):
     """Обрабатывает выбор игрока"""
     try:
-        if user_id not in active_coin_games:
-            bot.answer_callback_query(call.id, "❌ Игра не найдена")
+        # Забираем игру до розыгрыша: повторный выбор её уже не найдёт
+        with balance_service.user_lock(user_id):
+            game_data = active_coin_games.pop(user_id, None)
+        if game_data is None:
+            await bot.answer_callback_query(call.id, "❌ Игра не найдена")
             return
-
-        game_data = active_coin_games[user_id]
-        bet_amount = game_data['bet_amount']
+        bet_amount = game_data.bet_amount
 
         # Используем улучшенный бросок монеты
         bot_choice = get_coin_flip()
@@ -166,20 +154,15 @@ def process_coin_choice(bot, call, player_choice, user_id):
         result = "player" if player_choice == bot_choice else "bot"
 
         # Показываем анимацию броска
-        show_coin_animation(bot, user_id, player_choice, bot_choice, result, bet_amount)
+        await show_coin_animation(bot, user_id, game_data, player_choice, bot_choice, result, bet_amount)
 
     except Exception as e:
         logging.error(f"Ошибка обработки выбора монеты: {e}")
-        bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+        await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
 
-def show_coin_animation(bot, user_id, player_choice, bot_choice, result, bet_amount):
+async def show_coin_animation(bot, user_id, game_data, player_choice, bot_choice, result, bet_amount):
     """Показывает анимацию броска монеты"""
     try:
-        if user_id not in active_coin_games:
-            return
-
-        game_data = active_coin_games[user_id]
-
         # Первый этап - показываем анимацию броска
         display = f"""🪙 <b>Орел-Решка</b>
 
@@ -189,15 +172,15 @@ def show_coin_animation(bot, user_id, player_choice, bot_choice, result, bet_amo
 
 ⚪ Монета крутится..."""
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML'
         )
 
         # Ждем 1 секунду
-        time.sleep(1)
+        await asyncio.sleep(1)
 
         # Второй этап - монета в воздухе
         display = f"""🪙 <b>Орел-Решка</b>
@@ -208,31 +191,25 @@ def show_coin_animation(bot, user_id, player_choice, bot_choice, result, bet_amo
 
 🔄 Монета в воздухе..."""
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML'
         )
 
         # Ждем 1 секунду
-        time.sleep(1)
+        await asyncio.sleep(1)
 
         # Показываем финальный результат
-        show_coin_final_result(bot, user_id, player_choice, bot_choice, result, bet_amount)
+        await show_coin_final_result(bot, user_id, game_data, player_choice, bot_choice, result, bet_amount)
 
     except Exception as e:
         logging.error(f"Ошибка анимации монеты: {e}")
 
-def show_coin_final_result(bot, user_id, player_choice, bot_choice, result, bet_amount):
+async def show_coin_final_result(bot, user_id, game_data, player_choice, bot_choice, result, bet_amount):
     """Показывает финальный результат"""
     try:
-        if user_id not in active_coin_games:
-            return
-
-        game_data = active_coin_games[user_id]
-        users_data = load_users_data()
-
         player_side = "🦅 Орел" if player_choice == "eagle" else "🪙 Решка"
         bot_side = "🦅 Орел" if bot_choice == "eagle" else "🪙 Решка"
 
@@ -248,14 +225,14 @@ def show_coin_final_result(bot, user_id, player_choice, bot_choice, result, bet_
 
         if result == "player":
             # Победа игрока
-            win_amount = round(bet_amount * 2, 2)
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
+            win_amount = payout(bet_amount, 2)
+            balance_service.credit(user_id, win_amount, game='coin')
             result_text = f"""🎉 <b>ВЫ ВЫИГРАЛИ!</b>
 
 <blockquote>
-💰 Ставка: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
 🎯 Множитель: 2x
-🏆 Выигрыш: ${win_amount:.2f}
+🏆 Выигрыш: ${format_money(win_amount)}
 </blockquote>"""
             display += "\n✅ <b>Результат: ПОБЕДА!</b>"
 
@@ -265,13 +242,11 @@ def show_coin_final_result(bot, user_id, player_choice, bot_choice, result, bet_
             result_text = f"""❌ <b>ВЫ ПРОИГРАЛИ!</b>
 
 <blockquote>
-💰 Ставка: ${bet_amount}
-💸 Потеряно: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
+💸 Потеряно: ${format_money(bet_amount)}
 </blockquote>"""
             display += "\n❌ <b>Результат: ПРОИГРЫШ</b>"
 
-        save_users_data(users_data)
-
         display += f"\n\n{result_text}"
 
         # Клавиатура после игры
@@ -281,76 +256,66 @@ def show_coin_final_result(bot, user_id, player_choice, bot_choice, result, bet_
             types.InlineKeyboardButton("🎮 Другие игры", callback_data="coin_other_games")
         )
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=markup
         )
 
-        # Удаляем игру из активных
-        if user_id in active_coin_games:
-            del active_coin_games[user_id]
-
     except Exception as e:
         logging.error(f"Ошибка показа результата монеты: {e}")
 
 def register_coin_handlers(bot):
     """Регистрация обработчиков для игры в Орел-Решку"""
 
-    def process_custom_bet_coin(message):
+    async def process_custom_bet_coin(message):
         """Обработка ручного ввода ставки для Орел-Решки"""
         try:
-            bet_amount = float(message.text)
-            users_data = load_users_data()
+            bet_amount = parse_amount(message.text)
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
             
             # Проверяем минимальную и максимальную ставку
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}!")
                 return
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}!")
                 return
             if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             # Сразу запускаем игру без кнопки "Начать игру"
-            play_coin_game(bot, message, bet_amount, user_id)
+            await play_coin_game(bot, message, bet_amount, user_id)
 
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
         except Exception as e:
             logging.error(f"Ошибка в process_custom_bet_coin: {e}")
-            bot.send_message(message.chat.id, "❌ Произошла ошибка!")
+            await bot.send_message(message.chat.id, "❌ Произошла ошибка!")
 
     @bot.message_handler(func=lambda message: message.text == "🪙 Орел-Решка")
-    def coin_start(message):
+    async def coin_start(message):
         """Начало игры в Орел-Решку"""
         try:
             # Проверяем задержку
             if not rate_limit(str(message.from_user.id)):
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"""🪙 <b>Орел-Решка</b>
 
@@ -362,37 +327,36 @@ def register_coin_handlers(bot):
             )
         except Exception as e:
             logging.error(f"Ошибка в coin_start: {e}")
-            bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
+            await bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('coin_'))
-    def coin_callback_handler(call):
+    async def coin_callback_handler(call):
         """Обработчик колбэков Орел-Решки"""
         try:
             user_id = str(call.from_user.id)
 
             # Проверяем задержку
             if not rate_limit(user_id):
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
             if call.data.startswith("coin_bet_"):
-                bet_amount = float(call.data.split("_")[2])
-                users_data = load_users_data()
+                bet_amount = parse_amount(call.data.split("_")[2])
 
-                balance = users_data[user_id].get('balance', 0)
+                balance = account_store.get_balance(user_id)
                 if bet_amount > balance:
-                    bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                    await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                     return
 
                 # Сразу запускаем игру без кнопки "Начать игру"
-                play_coin_game(bot, call, bet_amount, user_id)
+                await play_coin_game(bot, call, bet_amount, user_id)
 
             elif call.data == "coin_custom_bet":
-                bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-                bot.register_next_step_handler(call.message, process_custom_bet_coin)
+                await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+                pending_inputs.register(call.message, process_custom_bet_coin)
 
             elif call.data == "coin_rules":
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     get_coin_rules(),
                     call.message.chat.id,
                     call.message.message_id,
@@ -403,11 +367,10 @@ def register_coin_handlers(bot):
                 )
 
             elif call.data == "coin_back_to_bet":
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""🪙 <b>Орел-Решка</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -421,18 +384,16 @@ def register_coin_handlers(bot):
 
             elif call.data.startswith("coin_choice_"):
                 choice = call.data.split("_")[2]  # eagle, tails
-                process_coin_choice(bot, call, choice, user_id)
+                await process_coin_choice(bot, call, choice, user_id)
 
             elif call.data == "coin_play_again":
                 # Очищаем предыдущую игру
-                if user_id in active_coin_games:
-                    del active_coin_games[user_id]
+                active_coin_games.discard(user_id)
 
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""🪙 <b>Орел-Решка</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -446,10 +407,9 @@ def register_coin_handlers(bot):
 
             elif call.data == "coin_other_games":
                 # Возврат к основным играм
-                if user_id in active_coin_games:
-                    del active_coin_games[user_id]
+                active_coin_games.discard(user_id)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     "🎮 <b>Выберите игру:</b>",
                     call.message.chat.id,
                     call.message.message_id,
@@ -459,6 +419,6 @@ def register_coin_handlers(bot):
         except Exception as e:
             logging.error(f"Ошибка в coin_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+                await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
             except:
                 pass
\ No newline at end of file
@@ -1,40 +1,31 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, CLICK_TTL
+from pending_input import pending_inputs
+from records import CrashSession
+from metrics import metrics
 import time
+import heapq
+import asyncio
 import logging
 import threading
 import math
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        logging.error(f"Ошибка загрузки данных: {e}")
-        return {}
-
-def save_users_data(data):
-    try:
-        with open('users_data.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка сохранения данных: {e}")
-
 # Активные игры Краш
-active_crash_games = {}
+active_crash_games = SessionStore('crash', GAME_TTL, on_evict=balance_service.refund_on_evict('crash'))
 
-# Минимальная и максимальная ставка
-MIN_BET = 0.2
-MAX_BET = 1000
+# Минимальная и максимальная ставка (в центах)
+MIN_BET = 20
+MAX_BET = 100000
 
 # Задержка между нажатиями
-last_click_time = {}
+last_click_time = SessionStore('crash_clicks', CLICK_TTL)
 click_lock = threading.Lock()
 
 def rate_limit(user_id):
@@ -101,55 +92,57 @@ def generate_crash_multiplier():
     
     return crash_point
 
-def play_crash_game(bot, call, bet_amount, user_id):
+async def play_crash_game(bot, call, bet_amount, user_id):
     """Основная логика игры в Краш"""
     try:
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
-
-        # Списываем ставку сразу
-        users_data[user_id]['balance'] = round(current_balance - bet_amount, 2)
-        save_users_data(users_data)
-
-        # Генерируем множитель краха
-        crash_point = generate_crash_multiplier()
-
-        # Сохраняем состояние игры
-        active_crash_games[user_id] = {
-            'bet_amount': bet_amount,
-            'crash_point': crash_point,
-            'current_multiplier': 1.00,
-            'crashed': False,
-            'user_cashed_out': False,
-            'chat_id': call.message.chat.id,
-            'message_id': call.message.message_id,
-            'win_amount': 0,
-            'start_time': time.time()
-        }
+        # Проверка, списание и новая игра - под блокировкой пользователя: новая
+        # ставка не должна вытеснить (и вернуть) уже идущий раунд
+        with balance_service.user_lock(user_id):
+            if user_id in active_crash_games:
+                error = "❌ У вас уже есть игра в Краш! Завершите её, прежде чем начать новую."
+            elif not balance_service.debit(user_id, bet_amount, game='crash'):
+                error = "❌ Недостаточно средств!"
+            else:
+                error = None
+                # Сохраняем состояние игры с заранее сгенерированным множителем краха
+                active_crash_games[user_id] = CrashSession(
+                    bet_amount=bet_amount,
+                    crash_point=generate_crash_multiplier(),
+                    current_multiplier=1.00,
+                    crashed=False,
+                    user_cashed_out=False,
+                    chat_id=call.message.chat.id,
+                    message_id=call.message.message_id,
+                    win_amount=0,
+                    start_time=time.time()
+                )
+        if error:
+            await bot.send_message(call.message.chat.id, error)
+            return
 
         # Показываем экран с кнопкой "Запустить игру"
-        show_crash_start_screen(bot, user_id)
+        await show_crash_start_screen(bot, user_id)
 
     except Exception as e:
         logging.error(f"Ошибка запуска игры в Краш: {e}")
-        bot.edit_message_text(
+        await bot.edit_message_text(
             "❌ Произошла ошибка при запуске игры",
             call.message.chat.id,
             call.message.message_id
         )
 
-def show_crash_start_screen(bot, user_id):
+async def show_crash_start_screen(bot, user_id):
     """Показывает экран начала игры с кнопкой Запустить"""
     try:
         if user_id not in active_crash_games:
             return
 
         game_data = active_crash_games[user_id]
-        bet_amount = game_data['bet_amount']
+        bet_amount = game_data.bet_amount
 
         display = f"""🚀 <b>КРАШ ИГРА</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 ⚠️ <b>Ставка списана! Успейте забрать до краха!</b>
 
@@ -158,10 +151,10 @@ def show_crash_start_screen(bot, user_id):
         keyboard = types.InlineKeyboardMarkup()
         keyboard.add(types.InlineKeyboardButton("🚀 Запустить игру", callback_data="crash_launch"))
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=keyboard
         )
@@ -169,76 +162,157 @@ def show_crash_start_screen(bot, user_id):
     except Exception as e:
         logging.error(f"Ошибка показа стартового экрана краша: {e}")
 
-def start_crash_round(bot, user_id):
-    """Запускает раунд краша"""
-    try:
-        if user_id not in active_crash_games:
+# Период тиков множителя и задержка перед стартом раунда (секунды)
+CRASH_TICK = 0.1
+CRASH_START_DELAY = 1.0
+
+
+class CrashDriver:
+    """Один цикл, который ведёт все идущие раунды краша.
+
+    Раунды лежат в куче по времени следующего тика. Цикл просыпается к
+    ближайшему тику, продвигает множители всех наступивших раундов и
+    отправляет их обновления одной пачкой. Если прошлое обновление раунда
+    ещё не дошло до Telegram, отрисовка пропускается, а множитель растёт
+    дальше. Когда раундов нет, цикл завершается и не просыпается.
+    """
+
+    def __init__(self, tick=CRASH_TICK):
+        self.tick = tick
+        self._heap = []
+        self._seq = 0
+        # user_id -> бот, через которого идёт раунд
+        self._live = {}
+        # user_id -> задача последней отрисовки
+        self._drawing = {}
+        self._tasks = set()
+        self._loop_task = None
+
+    def add(self, bot, user_id, delay=CRASH_START_DELAY):
+        """Запускает раунд; повторный запуск идущего раунда ничего не делает"""
+        if user_id in self._live:
             return
+        self._live[user_id] = bot
+        self._push(user_id, time.monotonic() + delay)
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+
+    def _push(self, user_id, due):
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, user_id))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self):
+        while self._heap:
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            now = time.monotonic()
+            updates, results = [], []
+            while self._heap and self._heap[0][0] <= now:
+                due, _, user_id = heapq.heappop(self._heap)
+                bot = self._live[user_id]
+                try:
+                    state, game_data = self._advance(user_id)
+                except Exception as e:
+                    # Сломанный раунд закрываем, остальные идут дальше
+                    self._drop(user_id, e)
+                    continue
+                if state == 'tick':
+                    # Отставший раунд не догоняет пропущенные тики
+                    self._push(user_id, max(due + self.tick, now))
+                    if user_id not in self._drawing:
+                        updates.append((bot, user_id))
+                else:
+                    del self._live[user_id]
+                    if state == 'crashed':
+                        results.append((bot, user_id, game_data))
+
+            for bot, user_id in updates:
+                try:
+                    task = self._spawn(update_crash_display(bot, user_id))
+                    self._drawing[user_id] = task
+                    task.add_done_callback(lambda _, user_id=user_id: self._drawing.pop(user_id, None))
+                except Exception as e:
+                    self._drop(user_id, e)
+            for bot, user_id, game_data in results:
+                try:
+                    self._spawn(self._finish(bot, user_id, game_data))
+                except Exception as e:
+                    logging.error(f"Ошибка показа итога краша {user_id}: {e}")
+                    metrics.inc("crash.round_errors")
+
+    def _drop(self, user_id, error):
+        """Снимает сломанный раунд; игра закрывается с возвратом ставки"""
+        logging.error(f"Ошибка раунда краша {user_id}: {error}")
+        metrics.inc("crash.round_errors")
+        self._live.pop(user_id, None)
+        self._heap = [entry for entry in self._heap if entry[2] != user_id]
+        heapq.heapify(self._heap)
+        try:
+            active_crash_games.discard(user_id)
+        except Exception as e:
+            logging.error(f"Ошибка закрытия раунда краша {user_id}: {e}")
+
+    def _advance(self, user_id):
+        """Один тик раунда: ('tick' | 'crashed' | 'done', игра).
+
+        'done' - игры уже нет (забрал выигрыш или игра закрыта). Крах и
+        выплата снимают игру под блокировкой пользователя, поэтому она
+        рассчитывается ровно один раз.
+        """
+        with balance_service.user_lock(user_id):
+            game_data = active_crash_games.get(user_id)
+            if game_data is None:
+                return 'done', None
+            if game_data.current_multiplier >= game_data.crash_point:
+                # Крах - ставка проиграна, снимаем игру до показа итога
+                game_data.crashed = True
+                active_crash_games.pop(user_id, None)
+                return 'crashed', game_data
+            game_data.current_multiplier = round(game_data.current_multiplier + 0.01, 2)
+        return 'tick', game_data
+
+    async def wait_drawn(self, user_id):
+        """Ждёт отправки последней отрисовки раунда, чтобы итог не перезаписался ею"""
+        task = self._drawing.get(user_id)
+        if task is not None:
+            await asyncio.wait({task})
+
+    async def _finish(self, bot, user_id, game_data):
+        await self.wait_drawn(user_id)
+        await show_crash_result(bot, user_id, game_data)
+
+
+# Общий цикл всех раундов краша
+crash_driver = CrashDriver()
 
-        # Запускаем поток для обновления множителя
-        thread = threading.Thread(target=update_crash_multiplier, args=(bot, user_id))
-        thread.daemon = True
-        thread.start()
-
-    except Exception as e:
-        logging.error(f"Ошибка запуска раунда краша: {e}")
-
-def update_crash_multiplier(bot, user_id):
-    """Обновляет множитель в реальном времени"""
+def start_crash_round(bot, user_id):
+    """Запускает раунд краша в общем цикле"""
     try:
         if user_id not in active_crash_games:
             return
 
-        game_data = active_crash_games[user_id]
-        crash_point = game_data['crash_point']
-        current_multiplier = 1.00
-
-        # Начальная задержка перед стартом
-        time.sleep(1)
-
-        # Может упасть сразу на 1.00x
-        if crash_point <= 1.00:
-            game_data['crashed'] = True
-            show_crash_result(bot, user_id)
-            return
-
-        while current_multiplier <= crash_point and user_id in active_crash_games:
-            if game_data.get('user_cashed_out', False):
-                break
-
-            # Обновляем множитель
-            current_multiplier += 0.01
-            current_multiplier = round(current_multiplier, 2)
-            game_data['current_multiplier'] = current_multiplier
-
-            # Обновляем отображение
-            update_crash_display(bot, user_id)
-
-            # Ждем перед следующим обновлением
-            time.sleep(0.1)  # 100ms между обновлениями
-
-            # Проверяем достигли ли точки краха
-            if current_multiplier >= crash_point:
-                game_data['crashed'] = True
-                break
-
-        # Если не забрали вовремя - проигрыш
-        if user_id in active_crash_games and not game_data.get('user_cashed_out', False):
-            game_data['crashed'] = True
-            show_crash_result(bot, user_id)
+        crash_driver.add(bot, user_id)
 
     except Exception as e:
-        logging.error(f"Ошибка обновления множителя краша: {e}")
+        logging.error(f"Ошибка запуска раунда краша: {e}")
 
-def update_crash_display(bot, user_id):
+async def update_crash_display(bot, user_id):
     """Обновляет отображение игры"""
     try:
         if user_id not in active_crash_games:
             return
 
         game_data = active_crash_games[user_id]
-        current_multiplier = game_data['current_multiplier']
-        bet_amount = game_data['bet_amount']
+        current_multiplier = game_data.current_multiplier
+        bet_amount = game_data.bet_amount
 
         # Создаем график множителя
         graph = create_crash_graph(current_multiplier)
@@ -248,9 +322,9 @@ def update_crash_display(bot, user_id):
 {graph}
 
 <blockquote>
-💰 Ставка: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
 📈 Текущий множитель: <code>{current_multiplier:.2f}x</code>
-🏆 Можете забрать: ${bet_amount * current_multiplier:.2f}
+🏆 Можете забрать: ${format_money(payout(bet_amount, current_multiplier))}
 </blockquote>"""
 
         if current_multiplier >= 10.00:
@@ -265,10 +339,10 @@ def update_crash_display(bot, user_id):
         keyboard = get_crash_game_keyboard()
 
         try:
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 display,
-                game_data['chat_id'],
-                game_data['message_id'],
+                game_data.chat_id,
+                game_data.message_id,
                 parse_mode='HTML',
                 reply_markup=keyboard
             )
@@ -303,70 +377,58 @@ def get_crash_game_keyboard():
     )
     return markup
 
-def process_crash_cash_out(bot, call, user_id):
+async def process_crash_cash_out(bot, call, user_id):
     """Обрабатывает кнопку Забрать"""
     try:
-        if user_id not in active_crash_games:
-            bot.answer_callback_query(call.id, "❌ Игра не найдена")
-            return
-
-        game_data = active_crash_games[user_id]
-
-        if game_data.get('user_cashed_out', False):
-            bot.answer_callback_query(call.id, "❌ Уже забрали выигрыш")
-            return
-
-        if game_data.get('crashed', False):
-            bot.answer_callback_query(call.id, "❌ Уже произошел крах")
+        # Игру снимаем до выплаты: цикл раундов и повторное нажатие её уже не найдут
+        with balance_service.user_lock(user_id):
+            game_data = active_crash_games.pop(user_id, None)
+            if game_data is not None:
+                # Отмечаем что игрок забрал выигрыш
+                game_data.user_cashed_out = True
+                current_multiplier = game_data.current_multiplier
+                bet_amount = game_data.bet_amount
+
+                # Вычисляем выигрыш
+                win_amount = payout(bet_amount, current_multiplier)
+                game_data.win_amount = win_amount
+
+                # Начисляем выигрыш
+                balance_service.credit(user_id, win_amount, game='crash')
+
+        if game_data is None:
+            await bot.answer_callback_query(call.id, "❌ Игра не найдена")
             return
 
-        # Отмечаем что игрок забрал выигрыш
-        game_data['user_cashed_out'] = True
-        current_multiplier = game_data['current_multiplier']
-        bet_amount = game_data['bet_amount']
-
-        # Вычисляем выигрыш
-        win_amount = round(bet_amount * current_multiplier, 2)
-        game_data['win_amount'] = win_amount
-
-        # Начисляем выигрыш
-        users_data = load_users_data()
-        users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
-        save_users_data(users_data)
-
-        bot.answer_callback_query(call.id, f"✅ Забрали на {current_multiplier:.2f}x! Выигрыш: ${win_amount:.2f}")
+        await bot.answer_callback_query(call.id, f"✅ Забрали на {current_multiplier:.2f}x! Выигрыш: ${format_money(win_amount)}")
 
-        # Показываем результат
-        show_crash_result(bot, user_id)
+        # Показываем результат после последней отрисовки раунда
+        await crash_driver.wait_drawn(user_id)
+        await show_crash_result(bot, user_id, game_data)
 
     except Exception as e:
         logging.error(f"Ошибка обработки кнопки Забрать: {e}")
-        bot.answer_callback_query(call.id, "❌ Ошибка")
+        await bot.answer_callback_query(call.id, "❌ Ошибка")
 
-def show_crash_result(bot, user_id):
-    """Показывает результат игры"""
+async def show_crash_result(bot, user_id, game_data):
+    """Показывает результат игры (игра уже снята и рассчитана)"""
     try:
-        if user_id not in active_crash_games:
-            return
+        bet_amount = game_data.bet_amount
+        crashed = game_data.crashed
+        user_cashed_out = game_data.user_cashed_out
+        final_multiplier = game_data.current_multiplier
+        win_amount = game_data.win_amount
+        crash_point = game_data.crash_point
 
-        game_data = active_crash_games[user_id]
-        bet_amount = game_data['bet_amount']
-        crashed = game_data.get('crashed', False)
-        user_cashed_out = game_data.get('user_cashed_out', False)
-        final_multiplier = game_data['current_multiplier']
-        win_amount = game_data.get('win_amount', 0)
-        crash_point = game_data['crash_point']
-
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
+        current_balance = account_store.get_balance(user_id)
 
         display = f"""🎯 <b>РЕЗУЛЬТАТ ИГРЫ</b>
 
 <blockquote>
-💰 Ставка: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
 📈 Точка краха: {crash_point:.2f}x
 🎮 Ваш множитель: {final_multiplier:.2f}x
-💎 Текущий баланс: ${current_balance:.2f}
+💎 Текущий баланс: ${format_money(current_balance)}
 </blockquote>"""
 
         if user_cashed_out:
@@ -374,8 +436,8 @@ def show_crash_result(bot, user_id):
             display += f"""\n✅ <b>ВЫ ВЫИГРАЛИ!</b>
 
 <blockquote>
-🏆 Выигрыш: ${win_amount:.2f}
-💰 Чистая прибыль: ${profit:.2f}
+🏆 Выигрыш: ${format_money(win_amount)}
+💰 Чистая прибыль: ${format_money(profit)}
 </blockquote>
 
 🎉 Поздравляем с выигрышем!"""
@@ -383,7 +445,7 @@ def show_crash_result(bot, user_id):
             display += f"""\n💥 <b>ВЫ ПРОИГРАЛИ</b>
 
 <blockquote>
-💸 Потеряно: ${bet_amount}
+💸 Потеряно: ${format_money(bet_amount)}
 📉 Не успели забрать вовремя
 </blockquote>
 
@@ -396,57 +458,50 @@ def show_crash_result(bot, user_id):
             types.InlineKeyboardButton("🎮 Другие игры", callback_data="crash_other_games")
         )
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=markup
         )
 
-        # Удаляем игру из активных
-        if user_id in active_crash_games:
-            del active_crash_games[user_id]
-
     except Exception as e:
         logging.error(f"Ошибка показа результата краша: {e}")
 
 def register_crash_handlers(bot):
     """Регистрация обработчиков для игры в Краш"""
 
-    def process_custom_bet_crash(message):
+    async def process_custom_bet_crash(message):
         """Обработка ручного ввода ставки для Краш"""
         try:
-            bet_amount = float(message.text)
-            users_data = load_users_data()
+            bet_amount = parse_amount(message.text)
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
             
             # Проверяем минимальную и максимальную ставку
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}!")
                 return
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}!")
                 return
             if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             # Показываем экран с кнопкой "Запустить игру"
             markup = types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton("🚀 Запустить игру", callback_data=f"crash_start_{bet_amount}"))
+            markup.add(types.InlineKeyboardButton("🚀 Запустить игру", callback_data=f"crash_start_{format_money(bet_amount)}"))
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"""🚀 <b>Игра "Краш"</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 ⚠️ <b>Ставка будет списана при запуске игры!</b>
 
@@ -456,30 +511,27 @@ def register_crash_handlers(bot):
             )
 
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
         except Exception as e:
             logging.error(f"Ошибка в process_custom_bet_crash: {e}")
-            bot.send_message(message.chat.id, "❌ Произошла ошибка!")
+            await bot.send_message(message.chat.id, "❌ Произошла ошибка!")
 
     @bot.message_handler(func=lambda message: message.text == "🚀 Краш")
-    def crash_start(message):
+    async def crash_start(message):
         """Начало игры в Краш"""
         try:
             # Проверяем задержку
             if not rate_limit(str(message.from_user.id)):
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"""🚀 <b>Игра "Краш"</b>
 
@@ -491,36 +543,35 @@ def register_crash_handlers(bot):
             )
         except Exception as e:
             logging.error(f"Ошибка в crash_start: {e}")
-            bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
+            await bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('crash_'))
-    def crash_callback_handler(call):
+    async def crash_callback_handler(call):
         """Обработчик колбэков Краш"""
         try:
             user_id = str(call.from_user.id)
 
             # Проверяем задержку
             if not rate_limit(user_id):
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
             if call.data.startswith("crash_bet_"):
-                bet_amount = float(call.data.split("_")[2])
-                users_data = load_users_data()
+                bet_amount = parse_amount(call.data.split("_")[2])
 
-                balance = users_data[user_id].get('balance', 0)
+                balance = account_store.get_balance(user_id)
                 if bet_amount > balance:
-                    bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                    await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                     return
 
                 # Показываем экран с кнопкой "Запустить игру"
                 markup = types.InlineKeyboardMarkup()
-                markup.add(types.InlineKeyboardButton("🚀 Запустить игру", callback_data=f"crash_start_{bet_amount}"))
+                markup.add(types.InlineKeyboardButton("🚀 Запустить игру", callback_data=f"crash_start_{format_money(bet_amount)}"))
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""🚀 <b>Игра "Краш"</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 ⚠️ <b>Ставка будет списана при запуске игры!</b>
 
@@ -532,11 +583,11 @@ def register_crash_handlers(bot):
                 )
 
             elif call.data == "crash_custom_bet":
-                bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-                bot.register_next_step_handler(call.message, process_custom_bet_crash)
+                await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+                pending_inputs.register(call.message, process_custom_bet_crash)
 
             elif call.data == "crash_rules":
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     get_crash_rules(),
                     call.message.chat.id,
                     call.message.message_id,
@@ -547,11 +598,10 @@ def register_crash_handlers(bot):
                 )
 
             elif call.data == "crash_back_to_bet":
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""🚀 <b>Игра "Краш"</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -564,25 +614,23 @@ def register_crash_handlers(bot):
                 )
 
             elif call.data.startswith("crash_start_"):
-                bet_amount = float(call.data.split("_")[2])
-                play_crash_game(bot, call, bet_amount, user_id)
+                bet_amount = parse_amount(call.data.split("_")[2])
+                await play_crash_game(bot, call, bet_amount, user_id)
 
             elif call.data == "crash_launch":
                 start_crash_round(bot, user_id)
 
             elif call.data == "crash_cash_out":
-                process_crash_cash_out(bot, call, user_id)
+                await process_crash_cash_out(bot, call, user_id)
 
             elif call.data == "crash_play_again":
                 # Очищаем предыдущую игру
-                if user_id in active_crash_games:
-                    del active_crash_games[user_id]
+                active_crash_games.discard(user_id)
 
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""🚀 <b>Игра "Краш"</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -596,10 +644,9 @@ def register_crash_handlers(bot):
 
             elif call.data == "crash_other_games":
                 # Возврат к основным играм
-                if user_id in active_crash_games:
-                    del active_crash_games[user_id]
+                active_crash_games.discard(user_id)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     "🎮 <b>Выберите игру:</b>",
                     call.message.chat.id,
                     call.message.message_id,
@@ -609,6 +656,6 @@ def register_crash_handlers(bot):
         except Exception as e:
             logging.error(f"Ошибка в crash_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+                await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
             except:
                 pass
\ No newline at end of file
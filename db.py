@@ -0,0 +1,29 @@
+import sqlite3
+import threading
+
+# Общие соединения по пути к БД: хранилища одной БД фиксируют изменения одной транзакцией
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def connect_sqlite(db_path):
+    """Долгоживущее соединение SQLite в режиме WAL, общее для потоков"""
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10, cached_statements=256)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=10000')
+    # Временные таблицы сортировок в памяти и кэш страниц ~16 МБ
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-16000')
+    return conn
+
+
+def shared_connection(db_path):
+    """Одно соединение и блокировка на БД для всех хранилищ процесса"""
+    with _shared_lock:
+        if db_path not in _shared:
+            # Повторно входимая блокировка не отделяет корутины цикла событий друг
+            # от друга (они в одном потоке). Под ней нельзя делать await - только
+            # короткие синхронные обращения к БД
+            _shared[db_path] = (connect_sqlite(db_path), threading.RLock())
+        return _shared[db_path]
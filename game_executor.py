@@ -0,0 +1,78 @@
+import time
+import asyncio
+import logging
+
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Одновременно идущих розыгрышей и ждущих свободного места сверх них
+GAME_WORKERS = 200
+GAME_QUEUE_LIMIT = 500
+
+# Ответ игроку, когда очередь розыгрышей заполнена
+SERVER_BUSY_TEXT = "⏳ Сервер перегружен, попробуйте через несколько секунд"
+
+
+class GameExecutor:
+    """Ограниченный исполнитель розыгрышей в цикле событий бота.
+
+    Одновременно идут не больше workers розыгрышей, остальные ждут места
+    в очереди. Когда очередь заполнена, submit отказывает сразу - игрок
+    получает ответ «сервер занят», а нагрузка не растёт. Глубина очереди,
+    число идущих розыгрышей и время ожидания выгружаются в метрики.
+    """
+
+    def __init__(self, name, workers=GAME_WORKERS, queue_limit=GAME_QUEUE_LIMIT):
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._slots = asyncio.Semaphore(workers)
+        self._active = 0
+        self._waiting = 0
+        # Ссылки на задачи держим до их завершения
+        self._tasks = set()
+
+    def submit(self, coro):
+        """Ставит розыгрыш (корутину) в очередь. False, если очередь полна"""
+        if self._active + self._waiting >= self.workers + self.queue_limit:
+            coro.close()
+            metrics.inc(f"{self.name}.rejected")
+            return False
+        self._waiting += 1
+        self._report()
+        task = asyncio.create_task(self._run(coro, time.perf_counter()))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        metrics.inc(f"{self.name}.submitted")
+        return True
+
+    async def _run(self, coro, queued_at):
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self._waiting -= 1
+            self._report()
+            coro.close()
+            raise
+        self._waiting -= 1
+        self._active += 1
+        self._report()
+        metrics.observe(f"{self.name}.wait_ms", (time.perf_counter() - queued_at) * 1000)
+        try:
+            await coro
+        except Exception as e:
+            logging.error(f"Ошибка розыгрыша {self.name}: {e}")
+            metrics.inc(f"{self.name}.errors")
+        finally:
+            self._active -= 1
+            self._slots.release()
+            self._report()
+
+    def _report(self):
+        metrics.set_gauge(f"{self.name}.queue_depth", self._waiting)
+        metrics.set_gauge(f"{self.name}.active", self._active)
+
+
+# Глобальный исполнитель розыгрышей
+game_executor = GameExecutor("games")
@@ -1,50 +1,59 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, INPUT_TTL, CLICK_TTL
+from pending_input import pending_inputs
+from game_executor import game_executor, SERVER_BUSY_TEXT
 import time
-import threading
+import asyncio
 import logging
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        logging.error(f"Ошибка загрузки данных: {e}")
-        return {}
-
-def save_users_data(data):
-    try:
-        with open('users_data.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка сохранения данных: {e}")
+def refund_unplayed_bet(user_id, bet):
+    """Списанная, но не разыгранная ставка возвращается игроку"""
+    bet_amount = bet.get('bet_amount')
+    if bet_amount:
+        balance_service.credit(user_id, bet_amount, reason='refund', game=bet['game_type'])
 
-# Потокобезопасный словарь для активных ставок и времени последнего нажатия
-active_bets = {}
-last_click_time = {}
-bet_lock = threading.Lock()
+# Активные ставки (доступ под блокировкой пользователя) и время последнего нажатия
+active_bets = SessionStore('games_bets', INPUT_TTL, on_evict=refund_unplayed_bet)
+last_click_time = SessionStore('games_clicks', CLICK_TTL)
 
-# Минимальная и максимальная ставка
-MIN_BET = 0.2
-MAX_BET = 1000
+# Минимальная и максимальная ставка (в центах)
+MIN_BET = 20
+MAX_BET = 100000
 
 def rate_limit(user_id):
     """Проверка ограничения по времени между нажатиями (0.4 секунды)"""
     current_time = time.time()
-    with bet_lock:
+    with balance_service.user_lock(user_id):
         if user_id in last_click_time:
             if current_time - last_click_time[user_id] < 0.4:
                 return False
         last_click_time[user_id] = current_time
     return True
 
+def place_bet(user_id, bet_amount):
+    """Списывает ставку в выбранную игру. Возвращает (тип игры, текст ошибки)"""
+    with balance_service.user_lock(user_id):
+        bet = active_bets.get(user_id)
+        if bet is None:
+            return None, "❌ Сначала выберите игру!"
+        game_type = bet['game_type']
+        if not balance_service.debit(user_id, bet_amount, game=game_type):
+            return None, "❌ Недостаточно средств!"
+        previous = bet.get('bet_amount')
+        bet['bet_amount'] = bet_amount
+        if previous:
+            # Прежняя ставка так и не разыграна - возвращаем её
+            balance_service.credit(user_id, previous, reason='refund', game=game_type)
+    return game_type, None
+
 def get_games_keyboard():
     markup = types.InlineKeyboardMarkup(row_width=2)
     markup.add(
@@ -74,17 +83,16 @@ def get_dice_selection_keyboard():
     )
     return markup
 
-def play_dice_game(bot, call, bet_type, bet_amount, user_id):
+async def play_dice_game(bot, call, bet_type, bet_amount, user_id):
     try:
         # Показываем анимацию броска
-        dice_msg = bot.send_dice(call.message.chat.id, emoji='🎲')
+        dice_msg = await bot.send_dice(call.message.chat.id, emoji='🎲')
 
         # Ждем 3 секунды
-        time.sleep(3)
+        await asyncio.sleep(3)
 
         # Получаем результат
         dice_value = dice_msg.dice.value
-        users_data = load_users_data()
 
         # Проверяем выигрыш с новой логикой
         win = False
@@ -103,34 +111,31 @@ def play_dice_game(bot, call, bet_type, bet_amount, user_id):
 
         # Обновляем баланс
         if win:
-            win_amount = bet_amount * multiplier
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
+            win_amount = payout(bet_amount, multiplier)
+            balance_service.credit(user_id, win_amount, game='dice')
             result_text = f"""<b>🎲 Кости</b>
 
 🎉 Победа!
 
 <blockquote>🎯 Ставка: {get_dice_bet_name(bet_type)}
 🎰 Выпало: {dice_value}
-💰 Выигрыш: ${round(win_amount, 2)}</blockquote>"""
+💰 Выигрыш: ${format_money(win_amount)}</blockquote>"""
         else:
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0), 2)
             result_text = f"""<b>🎲 Кости</b>
 
 ❌ Проигрыш!
 
 <blockquote>🎯 Ставка: {get_dice_bet_name(bet_type)}
 🎰 Выпало: {dice_value}
-💸 Ставка: ${bet_amount}</blockquote>"""
-
-        save_users_data(users_data)
+💸 Ставка: ${format_money(bet_amount)}</blockquote>"""
 
         # Удаляем сообщение с костями и показываем результат
         try:
-            bot.delete_message(call.message.chat.id, dice_msg.message_id)
+            await bot.delete_message(call.message.chat.id, dice_msg.message_id)
         except Exception as e:
             logging.warning(f"Не удалось удалить сообщение с dice: {e}")
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             result_text,
             call.message.chat.id,
             call.message.message_id,
@@ -141,14 +146,13 @@ def play_dice_game(bot, call, bet_type, bet_amount, user_id):
         )
 
         # Очищаем активную ставку
-        with bet_lock:
-            if user_id in active_bets:
-                del active_bets[user_id]
+        with balance_service.user_lock(user_id):
+            active_bets.discard(user_id)
 
     except Exception as e:
         logging.error(f"Ошибка в игре в кости: {e}")
         try:
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 "❌ Произошла ошибка во время игры. Попробуйте еще раз.",
                 call.message.chat.id,
                 call.message.message_id
@@ -175,17 +179,16 @@ def get_basketball_selection_keyboard():
     )
     return markup
 
-def play_basketball_game(bot, call, bet_type, bet_amount, user_id):
+async def play_basketball_game(bot, call, bet_type, bet_amount, user_id):
     try:
         # Показываем анимацию броска
-        basketball_msg = bot.send_dice(call.message.chat.id, emoji='🏀')
+        basketball_msg = await bot.send_dice(call.message.chat.id, emoji='🏀')
 
         # Ждем 3 секунды
-        time.sleep(3)
+        await asyncio.sleep(3)
 
         # Получаем результат (значение кости баскетбола)
         dice_value = basketball_msg.dice.value
-        users_data = load_users_data()
 
         # Определяем результат по значению кости
         # В баскетболе: 1-2 = мимо, 3-4 = гол, 5 = 3-очковый
@@ -214,34 +217,31 @@ def play_basketball_game(bot, call, bet_type, bet_amount, user_id):
 
         # Обновляем баланс
         if win:
-            win_amount = bet_amount * multiplier
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
+            win_amount = payout(bet_amount, multiplier)
+            balance_service.credit(user_id, win_amount, game='basketball')
             result_text = f"""<b>🏀 Баскетбол</b>
 
 🎉 Победа!
 
 <blockquote>🎯 Ставка: {get_basketball_bet_name(bet_type)}
 🏀 Результат: {get_basketball_result_name(result)}
-💰 Выигрыш: ${round(win_amount, 2)}</blockquote>"""
+💰 Выигрыш: ${format_money(win_amount)}</blockquote>"""
         else:
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0), 2)
             result_text = f"""<b>🏀 Баскетбол</b>
 
 ❌ Проигрыш!
 
 <blockquote>🎯 Ставка: {get_basketball_bet_name(bet_type)}
 🏀 Результат: {get_basketball_result_name(result)}
-💸 Ставка: ${bet_amount}</blockquote>"""
-
-        save_users_data(users_data)
+💸 Ставка: ${format_money(bet_amount)}</blockquote>"""
 
         # Удаляем сообщение с броском и показываем результат
         try:
-            bot.delete_message(call.message.chat.id, basketball_msg.message_id)
+            await bot.delete_message(call.message.chat.id, basketball_msg.message_id)
         except Exception as e:
             logging.warning(f"Не удалось удалить сообщение с баскетболом: {e}")
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             result_text,
             call.message.chat.id,
             call.message.message_id,
@@ -252,14 +252,13 @@ def play_basketball_game(bot, call, bet_type, bet_amount, user_id):
         )
 
         # Очищаем активную ставку
-        with bet_lock:
-            if user_id in active_bets:
-                del active_bets[user_id]
+        with balance_service.user_lock(user_id):
+            active_bets.discard(user_id)
 
     except Exception as e:
         logging.error(f"Ошибка в игре в баскетбол: {e}")
         try:
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 "❌ Произошла ошибка во время игры. Попробуйте еще раз.",
                 call.message.chat.id,
                 call.message.message_id
@@ -292,17 +291,16 @@ def get_football_selection_keyboard():
     )
     return markup
 
-def play_football_game(bot, call, bet_type, bet_amount, user_id):
+async def play_football_game(bot, call, bet_type, bet_amount, user_id):
     try:
         # Показываем анимацию удара
-        football_msg = bot.send_dice(call.message.chat.id, emoji='⚽')
+        football_msg = await bot.send_dice(call.message.chat.id, emoji='⚽')
 
         # Ждем 3 секунды
-        time.sleep(3)
+        await asyncio.sleep(3)
 
         # Получаем результат (значение кости футбола)
         dice_value = football_msg.dice.value
-        users_data = load_users_data()
 
         # В футболе: 1-3 = мимо, 4-5 = гол
         result = "goal" if dice_value >= 4 else "miss"
@@ -320,34 +318,31 @@ def play_football_game(bot, call, bet_type, bet_amount, user_id):
 
         # Обновляем баланс
         if win:
-            win_amount = bet_amount * multiplier
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
+            win_amount = payout(bet_amount, multiplier)
+            balance_service.credit(user_id, win_amount, game='football')
             result_text = f"""<b>⚽ Футбол</b>
 
 🎉 Победа!
 
 <blockquote>🎯 Ставка: {get_football_bet_name(bet_type)}
 ⚽ Результат: {get_football_result_name(result)}
-💰 Выигрыш: ${round(win_amount, 2)}</blockquote>"""
+💰 Выигрыш: ${format_money(win_amount)}</blockquote>"""
         else:
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0), 2)
             result_text = f"""<b>⚽ Футбол</b>
 
 ❌ Проигрыш!
 
 <blockquote>🎯 Ставка: {get_football_bet_name(bet_type)}
 ⚽ Результат: {get_football_result_name(result)}
-💸 Ставка: ${bet_amount}</blockquote>"""
-
-        save_users_data(users_data)
+💸 Ставка: ${format_money(bet_amount)}</blockquote>"""
 
         # Удаляем сообщение с ударом и показываем результат
         try:
-            bot.delete_message(call.message.chat.id, football_msg.message_id)
+            await bot.delete_message(call.message.chat.id, football_msg.message_id)
         except Exception as e:
             logging.warning(f"Не удалось удалить сообщение с футболом: {e}")
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             result_text,
             call.message.chat.id,
             call.message.message_id,
@@ -358,14 +353,13 @@ def play_football_game(bot, call, bet_type, bet_amount, user_id):
         )
 
         # Очищаем активную ставку
-        with bet_lock:
-            if user_id in active_bets:
-                del active_bets[user_id]
+        with balance_service.user_lock(user_id):
+            active_bets.discard(user_id)
 
     except Exception as e:
         logging.error(f"Ошибка в игре в футбол: {e}")
         try:
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 "❌ Произошла ошибка во время игры. Попробуйте еще раз.",
                 call.message.chat.id,
                 call.message.message_id
@@ -398,17 +392,16 @@ def get_darts_selection_keyboard():
     )
     return markup
 
-def play_darts_game(bot, call, bet_type, bet_amount, user_id):
+async def play_darts_game(bot, call, bet_type, bet_amount, user_id):
     try:
         # Показываем анимацию броска
-        darts_msg = bot.send_dice(call.message.chat.id, emoji='🎯')
+        darts_msg = await bot.send_dice(call.message.chat.id, emoji='🎯')
 
         # Ждем 3 секунды
-        time.sleep(3)
+        await asyncio.sleep(3)
 
         # Получаем результат (значение кости дартса)
         dice_value = darts_msg.dice.value
-        users_data = load_users_data()
 
         # ПРАВИЛЬНАЯ СТРУКТУРА МИШЕНИ ДАРТСА:
         # Центр (красный) -> Белое кольцо -> Красное кольцо -> Белое кольцо -> Красное кольцо (внешнее)
@@ -456,34 +449,31 @@ def play_darts_game(bot, call, bet_type, bet_amount, user_id):
 
         # Обновляем баланс
         if win:
-            win_amount = bet_amount * multiplier
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
+            win_amount = payout(bet_amount, multiplier)
+            balance_service.credit(user_id, win_amount, game='darts')
             result_text = f"""<b>🎯 Дартс</b>
 
 🎉 Победа!
 
 <blockquote>🎯 Ставка: {get_darts_bet_name(bet_type)}
 🎯 Результат: {get_darts_result_name(result)}
-💰 Выигрыш: ${round(win_amount, 2)}</blockquote>"""
+💰 Выигрыш: ${format_money(win_amount)}</blockquote>"""
         else:
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0), 2)
             result_text = f"""<b>🎯 Дартс</b>
 
 ❌ Проигрыш!
 
 <blockquote>🎯 Ставка: {get_darts_bet_name(bet_type)}
 🎯 Результат: {get_darts_result_name(result)}
-💸 Ставка: ${bet_amount}</blockquote>"""
-
-        save_users_data(users_data)
+💸 Ставка: ${format_money(bet_amount)}</blockquote>"""
 
         # Удаляем сообщение с броском и показываем результат
         try:
-            bot.delete_message(call.message.chat.id, darts_msg.message_id)
+            await bot.delete_message(call.message.chat.id, darts_msg.message_id)
         except Exception as e:
             logging.warning(f"Не удалось удалить сообщение с дартсом: {e}")
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             result_text,
             call.message.chat.id,
             call.message.message_id,
@@ -494,14 +484,13 @@ def play_darts_game(bot, call, bet_type, bet_amount, user_id):
         )
 
         # Очищаем активную ставку
-        with bet_lock:
-            if user_id in active_bets:
-                del active_bets[user_id]
+        with balance_service.user_lock(user_id):
+            active_bets.discard(user_id)
 
     except Exception as e:
         logging.error(f"Ошибка в игре в дартс: {e}")
         try:
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 "❌ Произошла ошибка во время игры. Попробуйте еще раз.",
                 call.message.chat.id,
                 call.message.message_id
@@ -529,103 +518,87 @@ def get_darts_result_name(result):
 
 def register_games_handlers(bot):
 
-    def process_custom_bet_games(message):
+    async def process_custom_bet_games(message):
         try:
             user_id = str(message.from_user.id)
 
             # Проверяем ограничение по времени
             if not rate_limit(user_id):
-                bot.send_message(message.chat.id, "❌ Слишком быстро! Подождите 0.4 секунды.")
+                await bot.send_message(message.chat.id, "❌ Слишком быстро! Подождите 0.4 секунды.")
                 return
 
-            bet_amount = float(message.text)
-            users_data = load_users_data()
-
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-
-            balance = users_data[user_id].get('balance', 0)
+            bet_amount = parse_amount(message.text)
 
             # Проверяем минимальную и максимальную ставку
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}!")
                 return
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}!")
-                return
-            if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}!")
                 return
 
-            # Списываем ставку
-            users_data[user_id]['balance'] = round(balance - bet_amount, 2)
-            save_users_data(users_data)
+            # Списываем ставку в выбранную игру
+            game_type, error = place_bet(user_id, bet_amount)
+            if error:
+                await bot.send_message(message.chat.id, error)
+                return
 
             # Показываем выбор для выбранной игры
-            with bet_lock:
-                if user_id in active_bets:
-                    game_type = active_bets[user_id]['game_type']
-                    active_bets[user_id]['bet_amount'] = bet_amount
-
-                    if game_type == "dice":
-                        bot.send_message(message.chat.id,
-                                       f"""<b>🎲 Кости</b>
+            if game_type == "dice":
+                await bot.send_message(message.chat.id,
+                               f"""<b>🎲 Кости</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите исход:""",
-                                       parse_mode='HTML', reply_markup=get_dice_selection_keyboard())
-                    elif game_type == "basketball":
-                        bot.send_message(message.chat.id,
-                                       f"""<b>🏀 Баскетбол</b>
+                               parse_mode='HTML', reply_markup=get_dice_selection_keyboard())
+            elif game_type == "basketball":
+                await bot.send_message(message.chat.id,
+                               f"""<b>🏀 Баскетбол</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите исход:""",
-                                       parse_mode='HTML', reply_markup=get_basketball_selection_keyboard())
-                    elif game_type == "football":
-                        bot.send_message(message.chat.id,
-                                       f"""<b>⚽ Футбол</b>
+                               parse_mode='HTML', reply_markup=get_basketball_selection_keyboard())
+            elif game_type == "football":
+                await bot.send_message(message.chat.id,
+                               f"""<b>⚽ Футбол</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите исход:""",
-                                       parse_mode='HTML', reply_markup=get_football_selection_keyboard())
-                    elif game_type == "darts":
-                        bot.send_message(message.chat.id,
-                                       f"""<b>🎯 Дартс</b>
+                               parse_mode='HTML', reply_markup=get_football_selection_keyboard())
+            elif game_type == "darts":
+                await bot.send_message(message.chat.id,
+                               f"""<b>🎯 Дартс</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите исход:""",
-                                       parse_mode='HTML', reply_markup=get_darts_selection_keyboard())
+                               parse_mode='HTML', reply_markup=get_darts_selection_keyboard())
 
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
         except Exception as e:
             logging.error(f"Ошибка в process_custom_bet_games: {e}")
-            bot.send_message(message.chat.id, "❌ Произошла ошибка!")
+            await bot.send_message(message.chat.id, "❌ Произошла ошибка!")
 
     @bot.message_handler(func=lambda message: message.text in ["🎲 Кости", "🏀 Баскетбол", "🎯 Дартс", "⚽ Футбол"])
-    def games_start(message):
+    async def games_start(message):
         try:
             user_id = str(message.from_user.id)
 
             # Проверяем ограничение по времени
             if not rate_limit(user_id):
-                bot.send_message(message.chat.id, "❌ Слишком быстро! Подождите 0.4 секунды.")
+                await bot.send_message(message.chat.id, "❌ Слишком быстро! Подождите 0.4 секунды.")
                 return
 
-            users_data = load_users_data()
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
-
-            with bet_lock:
+            with balance_service.user_lock(user_id):
                 if message.text == "🎲 Кости":
                     active_bets[user_id] = {'game_type': 'dice'}
                     game_name = "🎲 Кости"
@@ -639,7 +612,7 @@ def register_games_handlers(bot):
                     active_bets[user_id] = {'game_type': 'darts'}
                     game_name = "🎯 Дартс"
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"""<b>{game_name}</b>
 
@@ -651,45 +624,33 @@ def register_games_handlers(bot):
             )
         except Exception as e:
             logging.error(f"Ошибка в games_start: {e}")
-            bot.send_message(message.chat.id, "❌ Произошла ошибка при запуске игры!")
+            await bot.send_message(message.chat.id, "❌ Произошла ошибка при запуске игры!")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('games_'))
-    def games_callback_handler(call):
+    async def games_callback_handler(call):
         try:
             user_id = str(call.from_user.id)
 
             # Проверяем ограничение по времени
             if not rate_limit(user_id):
-                bot.answer_callback_query(call.id, "❌ Слишком быстро! Подождите 0.4 секунды.", show_alert=True)
+                await bot.answer_callback_query(call.id, "❌ Слишком быстро! Подождите 0.4 секунды.", show_alert=True)
                 return
 
-            users_data = load_users_data()
-
             if call.data.startswith("games_bet_"):
-                bet_amount = float(call.data.split("_")[2])
+                bet_amount = parse_amount(call.data.split("_")[2])
 
-                balance = users_data[user_id].get('balance', 0)
-                if bet_amount > balance:
-                    bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                # Списываем ставку в выбранную игру (только если игра ещё выбрана)
+                game_type, error = place_bet(user_id, bet_amount)
+                if error:
+                    await bot.answer_callback_query(call.id, error)
                     return
 
-                # Сохраняем сумму ставки
-                with bet_lock:
-                    active_bets[user_id]['bet_amount'] = bet_amount
-
-                # Списываем ставку
-                users_data[user_id]['balance'] = round(balance - bet_amount, 2)
-                save_users_data(users_data)
-
                 # Показываем выбор для выбранной игры
-                with bet_lock:
-                    game_type = active_bets[user_id]['game_type']
-
                 if game_type == "dice":
-                    bot.edit_message_text(
+                    await bot.edit_message_text(
                         f"""<b>🎲 Кости</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите исход:""",
                         call.message.chat.id,
@@ -698,10 +659,10 @@ def register_games_handlers(bot):
                         reply_markup=get_dice_selection_keyboard()
                     )
                 elif game_type == "basketball":
-                    bot.edit_message_text(
+                    await bot.edit_message_text(
                         f"""<b>🏀 Баскетбол</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите исход:""",
                         call.message.chat.id,
@@ -710,10 +671,10 @@ def register_games_handlers(bot):
                         reply_markup=get_basketball_selection_keyboard()
                     )
                 elif game_type == "football":
-                    bot.edit_message_text(
+                    await bot.edit_message_text(
                         f"""<b>⚽ Футбол</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите исход:""",
                         call.message.chat.id,
@@ -722,10 +683,10 @@ def register_games_handlers(bot):
                         reply_markup=get_football_selection_keyboard()
                     )
                 elif game_type == "darts":
-                    bot.edit_message_text(
+                    await bot.edit_message_text(
                         f"""<b>🎯 Дартс</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите исход:""",
                         call.message.chat.id,
@@ -736,23 +697,23 @@ def register_games_handlers(bot):
                 return
 
             elif call.data == "games_custom_bet":
-                bot.send_message(call.message.chat.id,
+                await bot.send_message(call.message.chat.id,
                                """<b>📝 Ввод суммы</b>
 
 <blockquote>Введите сумму ставки:</blockquote>""",
                                parse_mode='HTML')
-                bot.register_next_step_handler(call.message, process_custom_bet_games)
+                pending_inputs.register(call.message, process_custom_bet_games)
                 return
 
             elif call.data.startswith("games_again_"):
                 # Играть снова - возвращаем к выбору суммы ставки для конкретной игры
                 game_type = call.data.split("_")[2]
 
-                with bet_lock:
+                with balance_service.user_lock(user_id):
                     active_bets[user_id] = {'game_type': game_type}
 
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
                 if game_type == "dice":
                     game_name = "🎲 Кости"
@@ -763,7 +724,7 @@ def register_games_handlers(bot):
                 elif game_type == "darts":
                     game_name = "🎯 Дартс"
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""<b>{game_name}</b>
 
 <blockquote>💵 Баланс: ${balance_rounded}</blockquote>
@@ -779,51 +740,66 @@ def register_games_handlers(bot):
         except Exception as e:
             logging.error(f"Ошибка в games_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Произошла ошибка!")
+                await bot.answer_callback_query(call.id, "❌ Произошла ошибка!")
             except:
                 pass
 
     # ОБРАБОТЧИКИ ДЛЯ ВЫБОРА РЕЖИМОВ В ИГРАХ
     @bot.callback_query_handler(func=lambda call: call.data.startswith(('dice_', 'basketball_', 'football_', 'darts_')))
-    def games_mode_callback_handler(call):
+    async def games_mode_callback_handler(call):
         try:
             user_id = str(call.from_user.id)
 
             # Проверяем ограничение по времени
             if not rate_limit(user_id):
-                bot.answer_callback_query(call.id, "❌ Слишком быстро! Подождите 0.4 секунды.", show_alert=True)
+                await bot.answer_callback_query(call.id, "❌ Слишком быстро! Подождите 0.4 секунды.", show_alert=True)
                 return
 
-            with bet_lock:
-                if user_id not in active_bets or 'bet_amount' not in active_bets[user_id]:
-                    bot.answer_callback_query(call.id, "❌ Сначала сделайте ставку!")
-                    return
-
-                bet_amount = active_bets[user_id]['bet_amount']
+            # Забираем ставку, чтобы повторное нажатие не запустило вторую игру на неё же
+            with balance_service.user_lock(user_id):
+                bet = active_bets.get(user_id)
+                bet_amount = bet.pop('bet_amount', None) if bet else None
+                game_type = bet['game_type'] if bet else None
+            if bet_amount is None:
+                await bot.answer_callback_query(call.id, "❌ Сначала сделайте ставку!")
+                return
 
             # Обработка выбора в играх
+            started = False
             if call.data.startswith("dice_"):
                 bet_type = call.data.split("_")[1]
-                threading.Thread(target=play_dice_game, args=(bot, call, bet_type, bet_amount, user_id), daemon=True).start()
+                started = game_executor.submit(play_dice_game(bot, call, bet_type, bet_amount, user_id))
 
             elif call.data.startswith("basketball_"):
                 bet_type = call.data.split("_")[1]
-                threading.Thread(target=play_basketball_game, args=(bot, call, bet_type, bet_amount, user_id), daemon=True).start()
+                started = game_executor.submit(play_basketball_game(bot, call, bet_type, bet_amount, user_id))
 
             elif call.data.startswith("football_"):
                 bet_type = call.data.split("_")[1]
-                threading.Thread(target=play_football_game, args=(bot, call, bet_type, bet_amount, user_id), daemon=True).start()
+                started = game_executor.submit(play_football_game(bot, call, bet_type, bet_amount, user_id))
 
             elif call.data.startswith("darts_"):
                 bet_type = call.data.split("_")[1]
-                threading.Thread(target=play_darts_game, args=(bot, call, bet_type, bet_amount, user_id), daemon=True).start()
+                started = game_executor.submit(play_darts_game(bot, call, bet_type, bet_amount, user_id))
+
+            if not started:
+                # Очередь розыгрышей заполнена - возвращаем ставку на выбор исхода,
+                # а если её уже заменили новой - на баланс
+                with balance_service.user_lock(user_id):
+                    bet = active_bets.get(user_id)
+                    if bet is not None and 'bet_amount' not in bet:
+                        bet['bet_amount'] = bet_amount
+                    else:
+                        balance_service.credit(user_id, bet_amount, reason='refund', game=game_type)
+                await bot.answer_callback_query(call.id, SERVER_BUSY_TEXT, show_alert=True)
+                return
 
             # Показываем загрузку
-            bot.answer_callback_query(call.id, "🎮 Запускаем игру...")
+            await bot.answer_callback_query(call.id, "🎮 Запускаем игру...")
 
         except Exception as e:
             logging.error(f"Ошибка в games_mode_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Ошибка запуска игры")
+                await bot.answer_callback_query(call.id, "❌ Ошибка запуска игры")
             except:
                 pass
\ No newline at end of file
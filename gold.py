@@ -1,7 +1,11 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, INPUT_TTL, CLICK_TTL
+from pending_input import pending_inputs
 import time
 
 class GoldGame:
@@ -43,23 +47,16 @@ class GoldGame:
             return self.multipliers[10]
         return self.multipliers[self.floor + 1]
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+def cash_out_abandoned(user_id, game):
+    """Брошенная игра закрывается выплатой текущего выигрыша (без подъёма - ставкой)"""
+    balance_service.credit(user_id, payout(game.bet_amount, game.get_current_multiplier()), game='gold')
 
-def save_users_data(data):
-    with open('users_data.json', 'w') as f:
-        json.dump(data, f)
+active_gold_games = SessionStore('gold', GAME_TTL, on_evict=cash_out_abandoned)
+user_temp_data_gold = SessionStore('gold_input', INPUT_TTL)
+user_last_click_time_gold = SessionStore('gold_clicks', CLICK_TTL)
 
-active_gold_games = {}
-user_temp_data_gold = {}
-user_last_click_time_gold = {}
-
-MIN_BET = 0.2
-MAX_BET = 1000
+MIN_BET = 20
+MAX_BET = 100000
 
 def get_bet_selection_keyboard():
     markup = types.InlineKeyboardMarkup(row_width=5)
@@ -124,7 +121,7 @@ def get_gold_keyboard(game, show_dynamite=False):
     if game.floor > 0 and not show_dynamite:
         current_mult = game.get_current_multiplier()
         markup.row(types.InlineKeyboardButton(
-            f"💵 Забрать ${round(game.bet_amount * current_mult, 2)}",
+            f"💵 Забрать ${format_money(payout(game.bet_amount, current_mult))}",
             callback_data="gold_cashout"
         ))
 
@@ -132,24 +129,22 @@ def get_gold_keyboard(game, show_dynamite=False):
 
 def register_gold_handlers(bot):
 
-    def process_custom_bet_gold(message):
+    async def process_custom_bet_gold(message):
         try:
-            bet_amount = float(message.text)
+            bet_amount = parse_amount(message.text)
 
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}")
                 return
 
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}")
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            balance = users_data[user_id].get('balance', 0)
-            if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+            if not balance_service.debit(user_id, bet_amount, game='gold'):
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             user_temp_data_gold[user_id] = {'bet_amount': bet_amount}
@@ -158,37 +153,30 @@ def register_gold_handlers(bot):
             game = GoldGame(user_id, bet_amount)
             active_gold_games[user_id] = game
 
-            # Списываем ставку
-            users_data[user_id]['balance'] = round(balance - bet_amount, 2)
-            save_users_data(users_data)
-
             if user_id in user_temp_data_gold:
                 del user_temp_data_gold[user_id]
 
             # ТОЧНО КАК В СКРИНЕ 2 - ход игры
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"💰 Золото\n\n<blockquote>📌Текущий этаж: 0/10\n🌿Множитель: x1.00\n📈Следующий: x1.90</blockquote>",
                 parse_mode='HTML',
                 reply_markup=get_gold_keyboard(game)
             )
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
 
     @bot.message_handler(func=lambda message: message.text == "💰 Золото")
-    def gold_start(message):
-        users_data = load_users_data()
+    async def gold_start(message):
         user_id = str(message.from_user.id)
 
-        if user_id not in users_data:
-            users_data[user_id] = {'balance': 0}
-            save_users_data(users_data)
+        account_store.ensure_account(user_id, message.from_user.username)
 
-        balance = users_data[user_id].get('balance', 0)
-        balance_rounded = round(balance, 2)
+        balance = account_store.get_balance(user_id)
+        balance_rounded = format_money(balance)
 
         # ТОЧНО КАК В СКРИНЕ 1 - выбор ставки
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             f"💰 Золото\n\n<blockquote>💎Баланс: ${balance_rounded}\nСумма ставки👇</blockquote>",
             parse_mode='HTML',
@@ -196,26 +184,24 @@ def register_gold_handlers(bot):
         )
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('gold_'))
-    def gold_callback_handler(call):
+    async def gold_callback_handler(call):
         user_id = str(call.from_user.id)
-        users_data = load_users_data()
 
         # Проверка задержки между нажатиями
         current_time = time.time()
         if user_id in user_last_click_time_gold:
             time_diff = current_time - user_last_click_time_gold[user_id]
             if time_diff < 0.4:
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
         user_last_click_time_gold[user_id] = current_time
 
         if call.data.startswith("gold_bet_"):
-            bet_amount = float(call.data.split("_")[2])
+            bet_amount = parse_amount(call.data.split("_")[2])
 
-            balance = users_data[user_id].get('balance', 0)
-            if bet_amount > balance:
-                bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+            if not balance_service.debit(user_id, bet_amount, game='gold'):
+                await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                 return
 
             user_temp_data_gold[user_id] = {'bet_amount': bet_amount}
@@ -224,15 +210,11 @@ def register_gold_handlers(bot):
             game = GoldGame(user_id, bet_amount)
             active_gold_games[user_id] = game
 
-            # Списываем ставку
-            users_data[user_id]['balance'] = round(balance - bet_amount, 2)
-            save_users_data(users_data)
-
             if user_id in user_temp_data_gold:
                 del user_temp_data_gold[user_id]
 
             # ТОЧНО КАК В СКРИНЕ 2 - ход игры
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"💰 Золото\n\n<blockquote>📌Текущий этаж: 0/10\n🌿Множитель: x1.00\n📈Следующий: x1.90</blockquote>",
                 call.message.chat.id,
                 call.message.message_id,
@@ -242,13 +224,13 @@ def register_gold_handlers(bot):
             return
 
         elif call.data == "gold_custom_bet":
-            msg = bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-            bot.register_next_step_handler(msg, process_custom_bet_gold)
+            msg = await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+            pending_inputs.register(msg, process_custom_bet_gold)
             return
 
         elif call.data.startswith("gold_climb_"):
             if user_id not in active_gold_games:
-                bot.answer_callback_query(call.id, "❌ Игра не найдена")
+                await bot.answer_callback_query(call.id, "❌ Игра не найдена")
                 return
 
             game = active_gold_games[user_id]
@@ -258,42 +240,52 @@ def register_gold_handlers(bot):
             floor_num = int(parts[2])
             cell_num = int(parts[3])
 
-            # Сохраняем выбранную ячейку
-            game.add_selected_cell(floor_num, cell_num)
-
-            success = game.climb_floor(cell_num)
+            win_amount = None
+            with balance_service.user_lock(user_id):
+                if active_gold_games.get(user_id) is not game:
+                    success = None
+                else:
+                    # Сохраняем выбранную ячейку
+                    game.add_selected_cell(floor_num, cell_num)
+
+                    success = game.climb_floor(cell_num)
+                    if not success:
+                        # Динамит - ставка проиграна, снимаем игру до ответа
+                        active_gold_games.pop(user_id, None)
+                    elif game.floor == 10:
+                        # Последний этаж - игру снимаем и сразу выплачиваем
+                        active_gold_games.pop(user_id, None)
+                        win_amount = payout(game.bet_amount, game.get_current_multiplier())
+                        balance_service.credit(user_id, win_amount, game='gold')
+
+            if success is None:
+                await bot.answer_callback_query(call.id, "❌ Игра не найдена")
+                return
 
             if not success:
-                users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0), 2)
-                save_users_data(users_data)
-
                 # ТОЧНО КАК В СКРИНЕ 4 - проигрыш
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"💰 Золото\n\n"
                     f"<blockquote><b>Проигрыш..❌ Динамит 🧨на {game.floor} этаже!</b>\n\n"
-                    f"💰Ставка: ${game.bet_amount}\n"
-                    f"📌Мог забрать: ${round(game.bet_amount * game.get_current_multiplier(), 2)}\n"
-                    f"💎Баланс: ${users_data[user_id]['balance']}</blockquote>",
+                    f"💰Ставка: ${format_money(game.bet_amount)}\n"
+                    f"📌Мог забрать: ${format_money(payout(game.bet_amount, game.get_current_multiplier()))}\n"
+                    f"💎Баланс: ${format_money(account_store.get_balance(user_id))}</blockquote>",
                     call.message.chat.id,
                     call.message.message_id,
                     parse_mode='HTML',
                     reply_markup=get_gold_keyboard(game, show_dynamite=True)
                 )
-                # Не удаляем игру сразу, показываем где был динамит
+                # Игра уже снята, показываем где был динамит
                 return
             else:
-                if game.floor == 10:
-                    win_amount = game.bet_amount * game.get_current_multiplier()
-                    users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
-                    save_users_data(users_data)
-
+                if win_amount is not None:
                     # ТОЧНО КАК В СКРИНЕ 3 - победа
-                    bot.edit_message_text(
+                    await bot.edit_message_text(
                         f"💰 Золото\n\n"
                         f"<blockquote><b>Победа!🥳 Забрали выигрыш!</b>\n\n"
-                        f"💰Ставка: ${game.bet_amount}\n"
-                        f"🍀Выигрыш: ${round(win_amount, 2)}\n"
-                        f"💎Баланс: ${users_data[user_id]['balance']}</blockquote>",
+                        f"💰Ставка: ${format_money(game.bet_amount)}\n"
+                        f"🍀Выигрыш: ${format_money(win_amount)}\n"
+                        f"💎Баланс: ${format_money(account_store.get_balance(user_id))}</blockquote>",
                         call.message.chat.id,
                         call.message.message_id,
                         parse_mode='HTML',
@@ -301,7 +293,7 @@ def register_gold_handlers(bot):
                     )
                 else:
                     # ТОЧНО КАК В СКРИНЕ 2 - ход игры
-                    bot.edit_message_text(
+                    await bot.edit_message_text(
                         f"💰 Золото\n\n"
                         f"<blockquote>📌Текущий этаж: {game.floor}/10\n"
                         f"🌿Множитель: x{game.get_current_multiplier():.2f}\n"
@@ -314,23 +306,24 @@ def register_gold_handlers(bot):
                 return
 
         elif call.data == "gold_cashout":
-            if user_id not in active_gold_games:
-                bot.answer_callback_query(call.id, "❌ Игра не найдена")
+            # Игру снимаем до выплаты: повторное нажатие её уже не найдёт
+            with balance_service.user_lock(user_id):
+                game = active_gold_games.pop(user_id, None)
+                if game is not None:
+                    win_amount = payout(game.bet_amount, game.get_current_multiplier())
+                    balance_service.credit(user_id, win_amount, game='gold')
+
+            if game is None:
+                await bot.answer_callback_query(call.id, "❌ Игра не найдена")
                 return
 
-            game = active_gold_games[user_id]
-
-            win_amount = game.bet_amount * game.get_current_multiplier()
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
-            save_users_data(users_data)
-
             # ТОЧНО КАК В СКРИНЕ 3 - победа
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"💰 Золото\n\n"
                 f"<blockquote><b>Победа!🥳 Забрали выигрыш!</b>\n\n"
-                f"💰Ставка: ${game.bet_amount}\n"
-                f"🍀Выигрыш: ${round(win_amount, 2)}\n"
-                f"💎Баланс: ${users_data[user_id]['balance']}</blockquote>",
+                f"💰Ставка: ${format_money(game.bet_amount)}\n"
+                f"🍀Выигрыш: ${format_money(win_amount)}\n"
+                f"💎Баланс: ${format_money(account_store.get_balance(user_id))}</blockquote>",
                 call.message.chat.id,
                 call.message.message_id,
                 parse_mode='HTML',
@@ -339,15 +332,14 @@ def register_gold_handlers(bot):
             return
 
         elif call.data == "gold_again":
-            if user_id in active_gold_games:
-                del active_gold_games[user_id]
+            active_gold_games.discard(user_id)
             if user_id in user_temp_data_gold:
                 del user_temp_data_gold[user_id]
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"💰 Золото\n\n<blockquote>💎Баланс: ${balance_rounded}\nСумма ставки👇</blockquote>",
                 call.message.chat.id,
                 call.message.message_id,
@@ -357,5 +349,5 @@ def register_gold_handlers(bot):
             return
 
         elif call.data == "gold_ignore":
-            bot.answer_callback_query(call.id)
+            await bot.answer_callback_query(call.id)
             return
\ No newline at end of file
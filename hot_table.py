@@ -0,0 +1,137 @@
+import os
+import mmap
+import fcntl
+import struct
+import threading
+
+HOT_TABLE_FILE = 'hot_users.bin'
+
+# Заголовок: сигнатура формата и число занятых слотов
+HEADER = struct.Struct('<8sQ')
+MAGIC = b'HOTUSR01'
+
+# Слот: user_id, баланс в центах, first_seen (epoch, секунды), уровень
+SLOT = struct.Struct('<qqqi4x')
+USER_ID = struct.Struct('<q')
+BALANCE = struct.Struct('<q')
+PROFILE = struct.Struct('<qi')
+
+INITIAL_SLOTS = 1024
+
+
+class HotTable:
+    """Горячие поля пользователей в memory-mapped файле фиксированной ширины.
+
+    Чтение поля - это распаковка нескольких байт по смещению слота, без
+    разбора JSON и запросов к БД. Индекс user_id -> слот живёт в памяти и
+    достраивается, если слоты добавил другой процесс, открывший тот же файл;
+    если тот процесс увеличил файл, отображение обновляется. Новые слоты
+    выделяются под flock файла, поэтому процессы не занимают один слот.
+    """
+
+    def __init__(self, path=HOT_TABLE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = {}
+        self._scanned = 0
+
+        self.created = not os.path.exists(path) or os.path.getsize(path) < HEADER.size
+        if self.created:
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, 0))
+                f.truncate(HEADER.size + INITIAL_SLOTS * SLOT.size)
+
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: неизвестный формат таблицы")
+        self._scan()
+
+    def _count(self):
+        return HEADER.unpack_from(self._map, 0)[1]
+
+    def _offset(self, slot):
+        return HEADER.size + slot * SLOT.size
+
+    def _remap(self, count):
+        """Заново отображает файл, если другой процесс увеличил его под count слотов"""
+        if self._offset(count) > len(self._map):
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _scan(self):
+        """Добавляет в индекс слоты, появившиеся с прошлого просмотра"""
+        count = self._count()
+        self._remap(count)
+        for slot in range(self._scanned, count):
+            user_id = USER_ID.unpack_from(self._map, self._offset(slot))[0]
+            self._index[user_id] = slot
+        self._scanned = count
+
+    def _grow(self):
+        """Увеличивает файл вдвое и заново отображает его в память"""
+        size = max(len(self._map), os.fstat(self._file.fileno()).st_size)
+        self._map.close()
+        self._file.truncate(HEADER.size + (size - HEADER.size) * 2)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _slot(self, user_id, create=False):
+        slot = self._index.get(user_id)
+        if slot is None and self._count() > self._scanned:
+            # Слот мог добавить другой процесс
+            self._scan()
+            slot = self._index.get(user_id)
+        if slot is None and create:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                # Под блокировкой файла число слотов не изменится, но до неё
+                # другой процесс мог успеть добавить и этого пользователя
+                self._scan()
+                slot = self._index.get(user_id)
+                if slot is None:
+                    slot = self._count()
+                    if self._offset(slot + 1) > len(self._map):
+                        self._grow()
+                    SLOT.pack_into(self._map, self._offset(slot), user_id, 0, 0, 0)
+                    HEADER.pack_into(self._map, 0, MAGIC, slot + 1)
+                    self._index[user_id] = slot
+                    self._scanned = slot + 1
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        return slot
+
+    def get_balance_cents(self, user_id):
+        """Баланс в центах или None, если пользователя нет"""
+        with self._lock:
+            slot = self._slot(int(user_id))
+            if slot is None:
+                return None
+            return BALANCE.unpack_from(self._map, self._offset(slot) + 8)[0]
+
+    def set_balance_cents(self, user_id, cents):
+        with self._lock:
+            slot = self._slot(int(user_id), create=True)
+            BALANCE.pack_into(self._map, self._offset(slot) + 8, cents)
+
+    def get_profile(self, user_id):
+        """(first_seen, уровень) или None, если пользователя нет"""
+        with self._lock:
+            slot = self._slot(int(user_id))
+            if slot is None:
+                return None
+            return PROFILE.unpack_from(self._map, self._offset(slot) + 16)
+
+    def set_profile(self, user_id, first_seen, level):
+        with self._lock:
+            slot = self._slot(int(user_id), create=True)
+            PROFILE.pack_into(self._map, self._offset(slot) + 16, int(first_seen), int(level))
+
+    def flush(self):
+        """Сбрасывает изменённые страницы на диск"""
+        with self._lock:
+            self._map.flush()
+
+
+# Глобальная таблица, общая для хранилищ балансов и записей
+hot_table = HotTable()
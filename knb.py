@@ -1,38 +1,27 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, CLICK_TTL
+from pending_input import pending_inputs
+from records import RpsSession
 import time
+import asyncio
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        logging.error(f"Ошибка загрузки данных: {e}")
-        return {}
-
-def save_users_data(data):
-    try:
-        with open('users_data.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка сохранения данных: {e}")
-
 # Активные игры КНБ
-active_rps_games = {}
+active_rps_games = SessionStore('rps', GAME_TTL, on_evict=balance_service.refund_on_evict('rps'))
 
-# Минимальная и максимальная ставка
-MIN_BET = 0.2
-MAX_BET = 1000
+# Минимальная и максимальная ставка (в центах)
+MIN_BET = 20
+MAX_BET = 100000
 
 # Задержка между нажатиями
-last_click_time = {}
+last_click_time = SessionStore('rps_clicks', CLICK_TTL)
 
 def rate_limit(user_id):
     """Проверка ограничения по времени между нажатиями (0.4 секунды)"""
@@ -75,8 +64,8 @@ def get_rps_rules():
 • Проигрыш: потеря ставки
 
 ⚡ <b>Ставки:</b>
-• Минимальная: ${MIN_BET}
-• Максимальная: ${MAX_BET}
+• Минимальная: ${format_money(MIN_BET)}
+• Максимальная: ${format_money(MAX_BET)}
 </blockquote>
 
 🎮 <i>Удачи в игре!</i>
@@ -136,55 +125,53 @@ def get_choice_name(choice):
     }
     return names.get(choice, "Неизвестно")
 
-def play_rps_game(bot, call, bet_amount, user_id):
+async def play_rps_game(bot, call, bet_amount, user_id):
     """Основная логика игры в КНБ"""
     try:
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
-
         # Списываем ставку
-        users_data[user_id]['balance'] = round(current_balance - bet_amount, 2)
-        save_users_data(users_data)
+        if not balance_service.debit(user_id, bet_amount, game='rps'):
+            await bot.send_message(call.message.chat.id, "❌ Недостаточно средств!")
+            return
 
         # Сохраняем состояние игры
-        active_rps_games[user_id] = {
-            'bet_amount': bet_amount,
-            'chat_id': call.message.chat.id,
-            'message_id': call.message.message_id
-        }
+        active_rps_games[user_id] = RpsSession(
+            bet_amount=bet_amount,
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id
+        )
 
         # Сразу показываем выбор фигуры (без кнопки "Начать игру")
-        show_rps_choice_screen(bot, user_id)
+        await show_rps_choice_screen(bot, user_id)
 
     except Exception as e:
         logging.error(f"Ошибка запуска игры в КНБ: {e}")
-        bot.edit_message_text(
+        await bot.edit_message_text(
             "❌ Произошла ошибка при запуске игры",
             call.message.chat.id,
             call.message.message_id
         )
 
-def show_rps_choice_screen(bot, user_id):
+async def show_rps_choice_screen(bot, user_id):
     """Показывает экран выбора фигуры"""
     try:
         if user_id not in active_rps_games:
             return
 
         game_data = active_rps_games[user_id]
-        bet_amount = game_data['bet_amount']
+        bet_amount = game_data.bet_amount
 
         display = f"""<b>🎮 КАМЕНЬ-НОЖНИЦЫ-БУМАГА</b>
 
-<blockquote>💰 Ставка: ${bet_amount}</blockquote>
+<blockquote>💰 Ставка: ${format_money(bet_amount)}</blockquote>
 
 <b>Выберите вашу фигуру:</b>"""
 
         keyboard = get_rps_choice_keyboard()
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=keyboard
         )
@@ -192,15 +179,16 @@ def show_rps_choice_screen(bot, user_id):
     except Exception as e:
         logging.error(f"Ошибка показа выбора КНБ: {e}")
 
-def process_rps_choice(bot, call, player_choice, user_id):
+async def process_rps_choice(bot, call, player_choice, user_id):
     """Обрабатывает выбор игрока"""
     try:
-        if user_id not in active_rps_games:
-            bot.answer_callback_query(call.id, "❌ Игра не найдена")
+        # Забираем игру до розыгрыша: повторный выбор её уже не найдёт
+        with balance_service.user_lock(user_id):
+            game_data = active_rps_games.pop(user_id, None)
+        if game_data is None:
+            await bot.answer_callback_query(call.id, "❌ Игра не найдена")
             return
-
-        game_data = active_rps_games[user_id]
-        bet_amount = game_data['bet_amount']
+        bet_amount = game_data.bet_amount
 
         # Бот выбирает случайную фигуру
         choices = ["rock", "scissors", "paper"]
@@ -210,20 +198,15 @@ def process_rps_choice(bot, call, player_choice, user_id):
         result = determine_rps_winner(player_choice, bot_choice)
 
         # Показываем анимацию с двумя эмоджи одновременно
-        show_rps_double_emoji_animation(bot, user_id, player_choice, bot_choice, result, bet_amount)
+        await show_rps_double_emoji_animation(bot, user_id, game_data, player_choice, bot_choice, result, bet_amount)
 
     except Exception as e:
         logging.error(f"Ошибка обработки выбора КНБ: {e}")
-        bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+        await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
 
-def show_rps_double_emoji_animation(bot, user_id, player_choice, bot_choice, result, bet_amount):
+async def show_rps_double_emoji_animation(bot, user_id, game_data, player_choice, bot_choice, result, bet_amount):
     """Показывает анимацию с двумя эмоджи одновременно"""
     try:
-        if user_id not in active_rps_games:
-            return
-
-        game_data = active_rps_games[user_id]
-
         # Получаем анимационные кадры для обоих игроков
         player_frames = get_hand_animation_frames(player_choice)
         bot_frames = get_hand_animation_frames(bot_choice)
@@ -234,7 +217,7 @@ def show_rps_double_emoji_animation(bot, user_id, player_choice, bot_choice, res
         for i in range(3):
             display = f"""<b>🎮 КАМЕНЬ-НОЖНИЦЫ-БУМАГА</b>
 
-<blockquote>💰 Ставка: ${bet_amount}</blockquote>
+<blockquote>💰 Ставка: ${format_money(bet_amount)}</blockquote>
 
 <b>Игра начинается через...</b>
 
@@ -243,13 +226,13 @@ def show_rps_double_emoji_animation(bot, user_id, player_choice, bot_choice, res
 👤 ВАШ ХОД          🤖 ХОД БОТА
 {player_frames[i]}                            {bot_frames[i]}"""
 
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 display,
-                game_data['chat_id'],
-                game_data['message_id'],
+                game_data.chat_id,
+                game_data.message_id,
                 parse_mode='HTML'
             )
-            time.sleep(1)
+            await asyncio.sleep(1)
 
         # Этап 2: Финальный показ с результатами
         player_hand = player_frames[-1]
@@ -261,7 +244,7 @@ def show_rps_double_emoji_animation(bot, user_id, player_choice, bot_choice, res
 
         display = f"""<b>🎮 КАМЕНЬ-НОЖНИЦЫ-БУМАГА</b>
 
-<blockquote>💰 Ставка: ${bet_amount}</blockquote>
+<blockquote>💰 Ставка: ${format_money(bet_amount)}</blockquote>
 
 <b>ФИНАЛЬНЫЙ РАУНД!</b>
 
@@ -271,31 +254,25 @@ def show_rps_double_emoji_animation(bot, user_id, player_choice, bot_choice, res
 
 ⏳ <i>Определяем победителя...</i>"""
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML'
         )
 
         # Ждем 2 секунды для драматизма
-        time.sleep(2)
+        await asyncio.sleep(2)
 
         # Показываем финальный результат
-        show_rps_final_result(bot, user_id, player_choice, bot_choice, result, bet_amount)
+        await show_rps_final_result(bot, user_id, game_data, player_choice, bot_choice, result, bet_amount)
 
     except Exception as e:
         logging.error(f"Ошибка анимации КНБ: {e}")
 
-def show_rps_final_result(bot, user_id, player_choice, bot_choice, result, bet_amount):
+async def show_rps_final_result(bot, user_id, game_data, player_choice, bot_choice, result, bet_amount):
     """Показывает финальный результат"""
     try:
-        if user_id not in active_rps_games:
-            return
-
-        game_data = active_rps_games[user_id]
-        users_data = load_users_data()
-
         player_hand = get_hand_animation_frames(player_choice)[-1]
         bot_hand = get_hand_animation_frames(bot_choice)[-1]
         player_item = get_choice_emoji(player_choice)
@@ -305,7 +282,7 @@ def show_rps_final_result(bot, user_id, player_choice, bot_choice, result, bet_a
 
         display = f"""<b>🎮 КАМЕНЬ-НОЖНИЦЫ-БУМАГА - РЕЗУЛЬТАТ</b>
 
-<blockquote>💰 Ставка: ${bet_amount}</blockquote>
+<blockquote>💰 Ставка: ${format_money(bet_amount)}</blockquote>
 
 <b>ИТОГ РАУНДА:</b>
 
@@ -321,32 +298,31 @@ def show_rps_final_result(bot, user_id, player_choice, bot_choice, result, bet_a
 
         if result == "player":
             # Победа игрока
-            win_amount = round(bet_amount * 2, 2)
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
+            win_amount = payout(bet_amount, 2)
+            balance_service.credit(user_id, win_amount, game='rps')
             result_emoji = "🎉"
             result_text = f"<b>✅ ВЫ ПОБЕДИЛИ!</b>"
-            display += f"\n{result_emoji} {result_text}\n\n<blockquote>💰 Ставка: ${bet_amount}\n🏆 Выигрыш: ${win_amount}\n💵 Прибыль: ${win_amount - bet_amount:.2f}</blockquote>"
+            display += f"\n{result_emoji} {result_text}\n\n<blockquote>💰 Ставка: ${format_money(bet_amount)}\n🏆 Выигрыш: ${format_money(win_amount)}\n💵 Прибыль: ${format_money(win_amount - bet_amount)}</blockquote>"
 
         elif result == "bot":
             # Победа бота
             win_amount = 0
             result_emoji = "❌"
             result_text = f"<b>❌ ВЫ ПРОИГРАЛИ!</b>"
-            display += f"\n{result_emoji} {result_text}\n\n<blockquote>💰 Ставка: ${bet_amount}\n💸 Потеряно: ${bet_amount}</blockquote>"
+            display += f"\n{result_emoji} {result_text}\n\n<blockquote>💰 Ставка: ${format_money(bet_amount)}\n💸 Потеряно: ${format_money(bet_amount)}</blockquote>"
 
         else:
             # Ничья
             win_amount = bet_amount
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
+            # Ничья - сыгранный раунд с выплатой 1x, а не возврат ставки
+            balance_service.credit(user_id, win_amount, game='rps')
             result_emoji = "🤝"
             result_text = f"<b>🤝 НИЧЬЯ!</b>"
-            display += f"\n{result_emoji} {result_text}\n\n<blockquote>💰 Ставка: ${bet_amount}\n↩️ Возврат: ${bet_amount}</blockquote>"
+            display += f"\n{result_emoji} {result_text}\n\n<blockquote>💰 Ставка: ${format_money(bet_amount)}\n↩️ Возврат: ${format_money(bet_amount)}</blockquote>"
 
         # Показываем текущий баланс
-        current_balance = users_data[user_id].get('balance', 0)
-        display += f"\n💎 <b>Текущий баланс:</b> ${current_balance:.2f}"
-
-        save_users_data(users_data)
+        current_balance = account_store.get_balance(user_id)
+        display += f"\n💎 <b>Текущий баланс:</b> ${format_money(current_balance)}"
 
         # Клавиатура после игры
         markup = types.InlineKeyboardMarkup()
@@ -355,76 +331,66 @@ def show_rps_final_result(bot, user_id, player_choice, bot_choice, result, bet_a
             types.InlineKeyboardButton("🎮 ДРУГИЕ ИГРЫ", callback_data="rps_other_games")
         )
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=markup
         )
 
-        # Удаляем игру из активных
-        if user_id in active_rps_games:
-            del active_rps_games[user_id]
-
     except Exception as e:
         logging.error(f"Ошибка показа результата КНБ: {e}")
 
 def register_rps_handlers(bot):
     """Регистрация обработчиков для игры в КНБ"""
 
-    def process_custom_bet_rps(message):
+    async def process_custom_bet_rps(message):
         """Обработка ручного ввода ставки для КНБ"""
         try:
-            bet_amount = float(message.text)
-            users_data = load_users_data()
+            bet_amount = parse_amount(message.text)
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
 
             # Проверяем минимальную и максимальную ставку
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}!")
                 return
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}!")
                 return
             if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             # Сразу запускаем игру (без кнопки "Начать игру")
-            play_rps_game(bot, types.CallbackQuery(message=message, data=f"rps_start_{bet_amount}", from_user=message.from_user, id=""), bet_amount, user_id)
+            await play_rps_game(bot, types.CallbackQuery(message=message, data=f"rps_start_{format_money(bet_amount)}", from_user=message.from_user, id=""), bet_amount, user_id)
 
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
         except Exception as e:
             logging.error(f"Ошибка в process_custom_bet_rps: {e}")
-            bot.send_message(message.chat.id, "❌ Произошла ошибка!")
+            await bot.send_message(message.chat.id, "❌ Произошла ошибка!")
 
     @bot.message_handler(func=lambda message: message.text == "🎮 КНБ")
-    def rps_start(message):
+    async def rps_start(message):
         """Начало игры в КНБ"""
         try:
             # Проверяем задержку
             if not rate_limit(str(message.from_user.id)):
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"""<b>🎮 КАМЕНЬ-НОЖНИЦЫ-БУМАГА</b>
 
@@ -436,37 +402,36 @@ def register_rps_handlers(bot):
             )
         except Exception as e:
             logging.error(f"Ошибка в rps_start: {e}")
-            bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
+            await bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('rps_'))
-    def rps_callback_handler(call):
+    async def rps_callback_handler(call):
         """Обработчик колбэков КНБ"""
         try:
             user_id = str(call.from_user.id)
 
             # Проверяем задержку
             if not rate_limit(user_id):
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
             if call.data.startswith("rps_bet_"):
-                bet_amount = float(call.data.split("_")[2])
-                users_data = load_users_data()
+                bet_amount = parse_amount(call.data.split("_")[2])
 
-                balance = users_data[user_id].get('balance', 0)
+                balance = account_store.get_balance(user_id)
                 if bet_amount > balance:
-                    bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                    await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                     return
 
                 # Сразу запускаем игру (без кнопки "Начать игру")
-                play_rps_game(bot, call, bet_amount, user_id)
+                await play_rps_game(bot, call, bet_amount, user_id)
 
             elif call.data == "rps_custom_bet":
-                bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-                bot.register_next_step_handler(call.message, process_custom_bet_rps)
+                await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+                pending_inputs.register(call.message, process_custom_bet_rps)
 
             elif call.data == "rps_rules":
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     get_rps_rules(),
                     call.message.chat.id,
                     call.message.message_id,
@@ -477,11 +442,10 @@ def register_rps_handlers(bot):
                 )
 
             elif call.data == "rps_back_to_bet":
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""<b>🎮 КАМЕНЬ-НОЖНИЦЫ-БУМАГА</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -495,18 +459,16 @@ def register_rps_handlers(bot):
 
             elif call.data.startswith("rps_choice_"):
                 choice = call.data.split("_")[2]  # rock, scissors, paper
-                process_rps_choice(bot, call, choice, user_id)
+                await process_rps_choice(bot, call, choice, user_id)
 
             elif call.data == "rps_play_again":
                 # Очищаем предыдущую игру
-                if user_id in active_rps_games:
-                    del active_rps_games[user_id]
+                active_rps_games.discard(user_id)
 
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""<b>🎮 КАМЕНЬ-НОЖНИЦЫ-БУМАГА</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -520,10 +482,9 @@ def register_rps_handlers(bot):
 
             elif call.data == "rps_other_games":
                 # Возврат к основным играм
-                if user_id in active_rps_games:
-                    del active_rps_games[user_id]
+                active_rps_games.discard(user_id)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     "🎮 <b>Выберите игру:</b>",
                     call.message.chat.id,
                     call.message.message_id,
@@ -533,6 +494,6 @@ def register_rps_handlers(bot):
         except Exception as e:
             logging.error(f"Ошибка в rps_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+                await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
             except:
                 pass
\ No newline at end of file
@@ -0,0 +1,384 @@
+import heapq
+import bisect
+import threading
+from datetime import date
+
+from user_store import user_store
+
+# Показатели таблицы лидеров и размер топа
+LEADER_KEYS = ('deposit', 'turnover', 'wins')
+TOP_SIZE = 10
+
+# Окна таблиц лидеров в днях и глубина кольца дневных корзин
+WINDOWS = {'day': 1, 'week': 7, 'month': 30}
+RING_DAYS = 30
+
+
+class TopK:
+    """Первые size пользователей по показателю.
+
+    Записи (-значение, user_id, username) хранятся отсортированными, позиция
+    ищется бинарным поиском. Показатели почти всегда растут, поэтому
+    вытесненный пользователь может вернуться в топ лишь через новое
+    обновление - хранить всех остальных не нужно. Если значение участника
+    топа уменьшилось (возврат ставки), владелец топа собирает его заново
+    через top_of.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = []
+        self._members = {}
+
+    def update(self, user_id, username, value):
+        """Обновляет значение пользователя. True, если топ изменился"""
+        old = self._members.get(user_id)
+        entry = (-value, user_id, username)
+        if old == entry:
+            return False
+        if old is not None:
+            del self._entries[bisect.bisect_left(self._entries, old)]
+            del self._members[user_id]
+        elif len(self._entries) >= self.size and entry > self._entries[-1]:
+            return False
+
+        bisect.insort(self._entries, entry)
+        self._members[user_id] = entry
+        if len(self._entries) > self.size:
+            dropped = self._entries.pop()
+            del self._members[dropped[1]]
+        return True
+
+    def items(self):
+        """Список (user_id, username, значение) по убыванию значения"""
+        return [(user_id, username, -value) for value, user_id, username in self._entries]
+
+    def __contains__(self, user_id):
+        return user_id in self._members
+
+
+def top_of(size, values, names=None):
+    """TopK, собранный заново по словарю user_id -> значение"""
+    top = TopK(size)
+    names = names or {}
+    for user_id, value in heapq.nlargest(size, values.items(), key=lambda item: (item[1], -item[0])):
+        top.update(user_id, names.get(user_id), value)
+    return top
+
+
+# Значения ниже этой границы лежат каждое в своей корзине
+EXACT_BUCKETS = 32
+
+
+def value_bucket(value):
+    """Номер корзины значения: значения до 32 - точно, дальше 32 корзины на каждую степень двойки"""
+    if value < EXACT_BUCKETS:
+        return max(int(value), 0)
+    exponent = int(value).bit_length() - 1
+    return 32 + (exponent - 5) * 32 + ((int(value) >> (exponent - 5)) & 31)
+
+
+# Корзин хватает для любых значений int64
+BUCKETS = value_bucket((1 << 63) - 1) + 1
+
+
+class RankIndex:
+    """Место пользователя по показателю за O(log n).
+
+    Дерево Фенвика хранит число пользователей в каждой корзине значений
+    (логарифмическая шкала), поэтому число пользователей выше корзины -
+    это префиксная сумма. Внутри логарифмической корзины значения лежат
+    отсортированными, что даёт точное место с учётом соседей по корзине.
+    В точных корзинах (значения до 32, в том числе все нули) значения
+    одинаковы, и хватает счётчика в самом дереве.
+    """
+
+    def __init__(self):
+        self._tree = [0] * (BUCKETS + 1)
+        self._buckets = {}
+        self._values = {}
+
+    def _add(self, bucket, delta):
+        index = bucket + 1
+        while index <= BUCKETS:
+            self._tree[index] += delta
+            index += index & -index
+
+    def _count_upto(self, bucket):
+        """Число пользователей в корзинах 0..bucket"""
+        index, count = bucket + 1, 0
+        while index > 0:
+            count += self._tree[index]
+            index -= index & -index
+        return count
+
+    def update(self, user_id, value):
+        old = self._values.get(user_id)
+        if old == value:
+            return
+        if old is not None:
+            bucket = value_bucket(old)
+            if bucket >= EXACT_BUCKETS:
+                values = self._buckets[bucket]
+                del values[bisect.bisect_left(values, old)]
+            self._add(bucket, -1)
+
+        bucket = value_bucket(value)
+        if bucket >= EXACT_BUCKETS:
+            bisect.insort(self._buckets.setdefault(bucket, []), value)
+        self._add(bucket, 1)
+        self._values[user_id] = value
+
+    def rank(self, user_id):
+        """(место, значение) или None; равные значения делят место"""
+        value = self._values.get(user_id)
+        if value is None:
+            return None
+        bucket = value_bucket(value)
+        higher = len(self._values) - self._count_upto(bucket)
+        if bucket >= EXACT_BUCKETS:
+            values = self._buckets[bucket]
+            higher += len(values) - bisect.bisect_right(values, value)
+        return higher + 1, value
+
+    def __len__(self):
+        return len(self._values)
+
+    def values(self):
+        """Словарь user_id -> значение (только для чтения)"""
+        return self._values
+
+
+class Leaderboard:
+    """Топы и места по депозиту, обороту и выигрышам, обновляемые при сохранении записей"""
+
+    def __init__(self, store, keys=LEADER_KEYS, size=TOP_SIZE):
+        self._lock = threading.Lock()
+        self._tops = {key: TopK(size) for key in keys}
+        self._ranks = {key: RankIndex() for key in keys}
+        # Растёт при каждом изменении топа - по ней сбрасываются готовые доски
+        self._versions = dict.fromkeys(keys, 0)
+        # Имена нужны, чтобы собрать топ заново, если значение участника уменьшилось
+        self._names = {}
+        for user_id, record in store.iter_users():
+            self.on_user_saved(user_id, record)
+        store.add_listener(self.on_user_saved)
+
+    def on_user_saved(self, user_id, record):
+        user_id = int(user_id)
+        with self._lock:
+            self._names[user_id] = record.username
+            for key, top in self._tops.items():
+                value = getattr(record, key, 0) or 0
+                ranks = self._ranks[key]
+                old = ranks.values().get(user_id)
+                ranks.update(user_id, value)
+                if old is not None and value < old and user_id in top:
+                    # Участник топа опустился - его место может занять кто-то вне топа
+                    rebuilt = top_of(top.size, ranks.values(), self._names)
+                    changed = rebuilt.items() != top.items()
+                    self._tops[key] = top = rebuilt
+                elif top.update(user_id, record.username, value):
+                    changed = True
+                else:
+                    changed = False
+                if changed:
+                    self._versions[key] += 1
+
+    def top(self, key):
+        """Готовый топ по показателю: список (user_id, username, значение)"""
+        top = self._tops.get(key)
+        if top is None:
+            return []
+        with self._lock:
+            return top.items()
+
+    def version(self, key):
+        """Версия топа показателя: меняется, только когда меняется топ"""
+        return self._versions.get(key)
+
+    def rank(self, key, user_id):
+        """Место пользователя: (место, значение, всего участников) или None"""
+        ranks = self._ranks.get(key)
+        if ranks is None:
+            return None
+        with self._lock:
+            found = ranks.rank(int(user_id))
+            return (*found, len(ranks)) if found else None
+
+
+class DayRing:
+    """Кольцо дневных корзин одного пользователя по одному показателю.
+
+    Корзина дня d лежит в ячейке d % size. Если в ячейке записан другой
+    день, корзина устарела и переиспользуется - без отдельной очистки.
+    """
+
+    __slots__ = ('days', 'amounts')
+
+    def __init__(self, size=RING_DAYS):
+        self.days = [-1] * size
+        self.amounts = [0] * size
+
+    def add(self, day, amount):
+        slot = day % len(self.days)
+        if self.days[slot] != day:
+            self.days[slot] = day
+            self.amounts[slot] = 0
+        self.amounts[slot] += amount
+
+    def take(self, today, amount):
+        """Снимает amount с корзин начиная с today и назад, не уводя их в минус.
+
+        Возвращает список (день, -снятое)
+        """
+        taken = []
+        for day in range(today, today - len(self.days), -1):
+            slot = day % len(self.days)
+            if self.days[slot] != day or self.amounts[slot] <= 0:
+                continue
+            part = min(amount, self.amounts[slot])
+            self.amounts[slot] -= part
+            taken.append((day, -part))
+            amount -= part
+            if not amount:
+                break
+        return taken
+
+
+class WindowedLeaderboard:
+    """Топы за день, неделю и месяц на кольцах дневных корзин.
+
+    Для каждого окна хранится текущая сумма каждого пользователя и TopK,
+    которые add обновляет на месте: в пределах дня суммы растут, а если
+    сумма участника топа уменьшилась (возврат ставки), топ окна собирается
+    заново по суммам.
+    При смене дня из сумм вычитаются корзины дня, вышедшего из окна, - это
+    затрагивает только пользователей, активных в тот день, - и топ окна
+    один раз выбирается заново. Дни старше кольца выбрасываются вместе с
+    кольцами пользователей, не активных ни в одном из оставшихся дней.
+    """
+
+    def __init__(self, keys=LEADER_KEYS, ring_days=RING_DAYS, size=TOP_SIZE):
+        self.ring_days = ring_days
+        self.size = size
+        self._lock = threading.Lock()
+        # показатель -> user_id -> DayRing
+        self._rings = {key: {} for key in keys}
+        # день -> активные пользователи
+        self._active = {}
+        # (показатель, окно) -> user_id -> сумма за окно на день self._day
+        self._sums = {(key, window): {} for key in keys for window in WINDOWS}
+        # (показатель, окно) -> TopK по этим суммам
+        self._tops = {(key, window): TopK(size) for key in keys for window in WINDOWS}
+        self._day = None
+        # Растёт, только когда меняется топ окна - по ней сбрасываются готовые доски
+        self._versions = dict.fromkeys(self._sums, 0)
+
+    def _expire(self, today):
+        oldest = today - self.ring_days + 1
+        expired = [day for day in self._active if day < oldest]
+        if not expired:
+            return
+        dropped = set()
+        for day in expired:
+            dropped |= self._active.pop(day)
+        for users in self._active.values():
+            dropped -= users
+        for rings in self._rings.values():
+            for user_id in dropped:
+                rings.pop(user_id, None)
+
+    def _roll(self, today):
+        """Сдвигает окна на новый день: вычитает выбывшие дни и выбирает топы заново"""
+        previous = self._day
+        if today == previous:
+            return
+        self._day = today
+        for (key, window), sums in self._sums.items():
+            days = WINDOWS[window]
+            rings = self._rings[key]
+            if previous is None or today < previous or today - previous >= days:
+                # Окно сдвинулось целиком (или назад) - считаем суммы по кольцам заново
+                sums.clear()
+                for day in range(today - days + 1, today + 1):
+                    for user_id in self._active.get(day, ()):
+                        ring = rings.get(user_id)
+                        if ring is not None and ring.days[day % self.ring_days] == day:
+                            sums[user_id] = sums.get(user_id, 0) + ring.amounts[day % self.ring_days]
+            else:
+                # Из окна выбыли дни previous - days + 1 .. today - days
+                for day in range(previous - days + 1, today - days + 1):
+                    for user_id in self._active.get(day, ()):
+                        ring = rings.get(user_id)
+                        if ring is None or ring.days[day % self.ring_days] != day:
+                            continue
+                        left = sums.get(user_id, 0) - ring.amounts[day % self.ring_days]
+                        if left > 0:
+                            sums[user_id] = left
+                        else:
+                            sums.pop(user_id, None)
+            self._tops[(key, window)] = top_of(self.size, sums)
+            self._versions[(key, window)] += 1
+        self._expire(today)
+
+    def add(self, user_id, key, amount, today=None):
+        rings = self._rings.get(key)
+        if rings is None:
+            return
+        today = today if today is not None else date.today().toordinal()
+        user_id = int(user_id)
+        with self._lock:
+            self._roll(today)
+            ring = rings.get(user_id)
+            if amount < 0:
+                # Возврат снимается с корзин тех дней, когда были ставки
+                if ring is None:
+                    return
+                parts = ring.take(today, -amount)
+            else:
+                if ring is None:
+                    ring = rings[user_id] = DayRing(self.ring_days)
+                ring.add(today, amount)
+                self._active.setdefault(today, set()).add(user_id)
+                parts = [(today, amount)]
+            for window, days in WINDOWS.items():
+                delta = sum(part for day, part in parts if today - day < days)
+                if not delta:
+                    continue
+                sums = self._sums[(key, window)]
+                top = self._tops[(key, window)]
+                total = sums.get(user_id, 0) + delta
+                if total > 0:
+                    sums[user_id] = total
+                else:
+                    sums.pop(user_id, None)
+                if delta < 0 and user_id in top:
+                    rebuilt = self._tops[(key, window)] = top_of(self.size, sums)
+                    changed = rebuilt.items() != top.items()
+                else:
+                    changed = total > 0 and top.update(user_id, None, total)
+                if changed:
+                    self._versions[(key, window)] += 1
+
+    def version(self, key, window, today=None):
+        """Версия топа окна: меняется, только когда меняется сам топ"""
+        today = today if today is not None else date.today().toordinal()
+        with self._lock:
+            self._roll(today)
+            return self._versions.get((key, window))
+
+    def top(self, key, window, today=None):
+        """Топ показателя за окно: список (user_id, сумма) по убыванию суммы"""
+        today = today if today is not None else date.today().toordinal()
+        with self._lock:
+            self._roll(today)
+            top = self._tops.get((key, window))
+            if top is None:
+                return []
+            return [(user_id, total) for user_id, _, total in top.items()]
+
+
+# Глобальные таблицы лидеров: за всё время и по окнам
+leaderboard = Leaderboard(user_store)
+windowed_leaderboard = WindowedLeaderboard()
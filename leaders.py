@@ -1,65 +1,136 @@
 from telebot import types
-import json
+from leaderboard import leaderboard, windowed_leaderboard, LEADER_KEYS, WINDOWS
+from user_store import get_user
+from money import format_money
+from sessions import SessionStore, INPUT_TTL
+from metrics import metrics
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+# Готовые доски: (показатель, период) -> (версия топа, текст)
+board_cache = {}
+# Клавиатуры не меняются: (показатель, период) -> (разметка, её JSON)
+keyboard_cache = {}
+# Что сейчас показано в сообщении: (chat_id, message_id) -> (текст, JSON разметки)
+rendered_boards = SessionStore('leaders_rendered', INPUT_TTL)
 
 def register_leaders_handlers(bot):
     # Клавиатура с кнопками переключения
-    def leaders_keyboard(selected: str = 'deposit'):
+    def build_leaders_keyboard(selected, period):
         buttons = [
-            types.InlineKeyboardButton("📥 Депозит", callback_data="leader_deposit"),
-            types.InlineKeyboardButton("💱 Оборот", callback_data="leader_turnover"),
-            types.InlineKeyboardButton("🥳 Выигрыши", callback_data="leader_wins"),
+            types.InlineKeyboardButton("📥 Депозит", callback_data=f"leader_deposit_{period}"),
+            types.InlineKeyboardButton("💱 Оборот", callback_data=f"leader_turnover_{period}"),
+            types.InlineKeyboardButton("🥳 Выигрыши", callback_data=f"leader_wins_{period}"),
         ]
         keyboard = types.InlineKeyboardMarkup(row_width=3)
         for btn in buttons:
-            if btn.callback_data == f"leader_{selected}":
+            if btn.callback_data == f"leader_{selected}_{period}":
                 btn.text = "✅ " + btn.text
             keyboard.add(btn)
+
+        periods = [
+            types.InlineKeyboardButton("Всё время", callback_data=f"leader_{selected}_all"),
+            types.InlineKeyboardButton("День", callback_data=f"leader_{selected}_day"),
+            types.InlineKeyboardButton("Неделя", callback_data=f"leader_{selected}_week"),
+            types.InlineKeyboardButton("Месяц", callback_data=f"leader_{selected}_month"),
+        ]
+        for btn in periods:
+            if btn.callback_data == f"leader_{selected}_{period}":
+                btn.text = "✅ " + btn.text
+        keyboard.row(*periods)
         return keyboard
 
-    def format_leaderboard(users_data, key):
-        sorted_leaders = sorted(
-            users_data.items(),
-            key=lambda item: item[1].get(key, 0),
-            reverse=True
-        )[:10]
+    def leaders_keyboard(selected: str = 'deposit', period: str = 'all'):
+        """Клавиатура и её JSON из кэша"""
+        cached = keyboard_cache.get((selected, period))
+        if cached is None:
+            keyboard = build_leaders_keyboard(selected, period)
+            cached = keyboard_cache[(selected, period)] = (keyboard, keyboard.to_json())
+        return cached
+
+    def get_leaders(key, period):
+        """Топ за период: список (user_id, username, значение)"""
+        if period == 'all':
+            return leaderboard.top(key)
+        leaders = []
+        for user_id, value in windowed_leaderboard.top(key, period):
+            user = get_user(user_id)
+            leaders.append((user_id, user.username if user else None, value))
+        return leaders
+
+    def render_board(key, period):
+        """Текст топа; пересобирается, только если топ изменился"""
+        if period == 'all':
+            version = leaderboard.version(key)
+        else:
+            version = windowed_leaderboard.version(key, period)
+        cached = board_cache.get((key, period))
+        if cached and cached[0] == version:
+            metrics.inc("leaders.cache_hits")
+            return cached[1]
+
+        sorted_leaders = get_leaders(key, period)
 
         if not sorted_leaders:
-            return "Данные отсутствуют."
+            text = "Данные отсутствуют."
+            board_cache[(key, period)] = (version, text)
+            return text
 
         titles = {
             'deposit': "🏆Топ 10 по депозиту📥",
             'turnover': "🏆Топ 10 по обороту💱",
             'wins': "🏆Топ 10 по выигрышам🥳"
         }
+        periods = {
+            'day': " за сегодня",
+            'week': " за неделю",
+            'month': " за месяц"
+        }
+
+        text = f"{titles.get(key, '')}{periods.get(period, '')}:\n\n"
+        for i, (leader_id, username, value) in enumerate(sorted_leaders, 1):
+            username = username or f"User {leader_id}"
+            text += f"{i}. @{username} — ${format_money(value)}\n"
+
+        board_cache[(key, period)] = (version, text)
+        return text
 
-        text = f"{titles.get(key, '')}:\n\n"
-        for i, (user_id, data) in enumerate(sorted_leaders, 1):
-            username = data.get('username') or f"User {user_id}"
-            value = data.get(key, 0)
-            text += f"{i}. @{username} — {value}\n"
+    def format_leaderboard(key, period='all', user_id=None):
+        text = render_board(key, period)
+        if user_id is not None and period == 'all':
+            found = leaderboard.rank(key, user_id)
+            if found:
+                rank, value, total = found
+                text += f"\nВаше место: {rank} из {total} — ${format_money(value)}\n"
 
         return text
 
     @bot.message_handler(func=lambda m: m.text == "🏆 Лидерство")
-    def show_leaders(message):
-        users_data = load_users_data()
-        text = format_leaderboard(users_data, 'deposit')
-        bot.send_message(message.chat.id, text, reply_markup=leaders_keyboard('deposit'))
+    async def show_leaders(message):
+        text = format_leaderboard('deposit', user_id=message.from_user.id)
+        keyboard, keyboard_json = leaders_keyboard('deposit')
+        sent = await bot.send_message(message.chat.id, text, reply_markup=keyboard)
+        rendered_boards[(message.chat.id, sent.message_id)] = (text, keyboard_json)
 
     @bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("leader_"))
-    def callback_leaders(call):
-        users_data = load_users_data()
-        key = call.data.replace("leader_", "")
-        text = format_leaderboard(users_data, key)
-        bot.edit_message_text(chat_id=call.message.chat.id,
+    async def callback_leaders(call):
+        # leader_<показатель>[_<период>]; старые кнопки без периода - за всё время
+        key, _, period = call.data.replace("leader_", "").partition("_")
+        period = period or 'all'
+        if key not in LEADER_KEYS or (period != 'all' and period not in WINDOWS):
+            await bot.answer_callback_query(call.id)
+            return
+        text = format_leaderboard(key, period, call.from_user.id)
+        keyboard, keyboard_json = leaders_keyboard(key, period)
+
+        # Содержимое не изменилось - не редактируем, иначе Telegram ответит "message is not modified"
+        message_key = (call.message.chat.id, call.message.message_id)
+        if rendered_boards.get(message_key) == (text, keyboard_json):
+            metrics.inc("leaders.edits_skipped")
+            await bot.answer_callback_query(call.id)
+            return
+
+        await bot.edit_message_text(chat_id=call.message.chat.id,
                               message_id=call.message.message_id,
                               text=text,
-                              reply_markup=leaders_keyboard(key))
-        bot.answer_callback_query(call.id)
+                              reply_markup=keyboard)
+        rendered_boards[message_key] = (text, keyboard_json)
+        await bot.answer_callback_query(call.id)
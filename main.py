@@ -1,6 +1,13 @@
-import telebot
+import asyncio
 from telebot import types
-import json
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_handler_backends import BaseMiddleware
+from user_store import update_user
+from accounts import account_store
+from money import format_money
+from hot_table import hot_table
+from activity import activity_tracker
+from pending_input import register_pending_input_handler
 from datetime import datetime
 from types import SimpleNamespace
 
@@ -11,6 +18,7 @@ import tower
 import gold
 import games
 from states import register_stats_handlers, stats_manager
+from scheduler import scheduler
 from balloon import register_balloon_handlers
 from knb import register_rps_handlers
 from coin import register_coin_handlers
@@ -19,7 +27,12 @@ from tomb import register_tomb_handlers
 from roulette import register_roulette_handlers
 import admin_commands
 
-bot = telebot.TeleBot("8073627025:AAFOQnnP9UBrS3blo4MhgetJVwC9XYEbvWk")
+# Все обработчики - корутины в одном цикле событий: анимации ждут через
+# asyncio.sleep и не занимают потоки
+bot = AsyncTeleBot("8073627025:AAFOQnnP9UBrS3blo4MhgetJVwC9XYEbvWk")
+
+# Ожидаемый ввод (ставки, суммы) проверяется раньше остальных обработчиков
+register_pending_input_handler(bot)
 
 # Регистрируем хендлеры из модулей
 leaders.register_leaders_handlers(bot)
@@ -28,6 +41,7 @@ tower.register_tower_handlers(bot)
 gold.register_gold_handlers(bot)
 games.register_games_handlers(bot)
 register_stats_handlers(bot, stats_manager)
+stats_manager.schedule_rollups(scheduler)
 register_balloon_handlers(bot)
 register_rps_handlers(bot)
 register_coin_handlers(bot)
@@ -36,16 +50,21 @@ register_tomb_handlers(bot)
 register_roulette_handlers(bot)
 admin_commands.register_admin_handlers(bot)
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+class ActivityMiddleware(BaseMiddleware):
+    """Отмечает активность пользователя на каждом обновлении"""
+
+    def __init__(self):
+        super().__init__()
+        self.update_types = ['message', 'callback_query']
+
+    async def pre_process(self, update, data):
+        if update.from_user:
+            activity_tracker.record(update.from_user.id)
 
-def save_users_data(data):
-    with open('users_data.json', 'w') as f:
-        json.dump(data, f)
+    async def post_process(self, update, data, exception):
+        pass
+
+bot.setup_middleware(ActivityMiddleware())
 
 def main_menu():
     markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
@@ -84,19 +103,21 @@ def games_inline_menu():
     return markup
 
 @bot.message_handler(commands=['start'])
-def start_message(message):
-    users_data = load_users_data()
+async def start_message(message):
     user_id = str(message.from_user.id)
+    username = message.from_user.username
+
+    def set_username(record):
+        record.username = username
+
+    # Имя обновляем всегда: запись могла создаться раньше при расчёте игры
+    _, created = update_user(user_id, set_username)
+    if created:
+        stats_manager.record_new_user()
 
-    if user_id not in users_data:
-        users_data[user_id] = {
-            'first_seen': datetime.now().isoformat(),
-            'balance': 0,
-            'level': 1
-        }
-        save_users_data(users_data)
+    account_store.ensure_account(user_id, message.from_user.username)
 
-    bot.send_message(
+    await bot.send_message(
         message.chat.id,
         f"👋 Добро пожаловать в казино бот!\n\n"
         f"💵 Баланс отображается в долларах ($)\n"
@@ -105,13 +126,13 @@ def start_message(message):
     )
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('game_'))
-def game_callback_handler(call):
+async def game_callback_handler(call):
     print(f"[DEBUG] Нажата игра: {call.data}")
 
     game_type = call.data.split('_')[1]
     chat_id = call.message.chat.id
     user = call.from_user
-    bot.answer_callback_query(call.id)
+    await bot.answer_callback_query(call.id)
 
     # создаем фейковое сообщение для запуска обработчиков игр
     fake_message = SimpleNamespace(
@@ -146,7 +167,7 @@ def game_callback_handler(call):
         for handler in bot.message_handlers:
             try:
                 if handler['function'].__name__ == func_name:
-                    handler['function'](fake_message)
+                    await handler['function'](fake_message)
                     found = True
                     break
             except Exception as e:
@@ -158,33 +179,32 @@ def game_callback_handler(call):
             for handler in bot.message_handlers:
                 try:
                     if hasattr(handler, 'filters') and handler.filters and handler.filters(fake_message):
-                        handler['function'](fake_message)
+                        await handler['function'](fake_message)
                         found = True
                         break
                 except:
                     continue
             
             if not found:
-                bot.send_message(chat_id, f"❌ Обработчик игры '{text}' не найден.")
+                await bot.send_message(chat_id, f"❌ Обработчик игры '{text}' не найден.")
     else:
-        bot.send_message(chat_id, f"❌ Неизвестная игра '{game_type}'.")
+        await bot.send_message(chat_id, f"❌ Неизвестная игра '{game_type}'.")
 
 @bot.message_handler(content_types=['text'])
-def menu_handler(message):
+async def menu_handler(message):
     text = message.text
     user = message.from_user
     user_id = str(user.id)
-    users_data = load_users_data()
 
     if text == "👤 Профиль":
-        if user_id in users_data:
-            user_info = users_data[user_id]
+        # Уровень, first_seen и баланс читаются из горячей таблицы
+        profile = hot_table.get_profile(user_id)
+        if profile and profile[0]:
+            first_seen, level = profile
             username = user.username if user.username else user.first_name
-            level = user_info.get('level', 1)
-            balance = user_info.get('balance', 0)
-            balance_rounded = round(balance, 2)
-            first_seen = datetime.fromisoformat(user_info['first_seen'])
-            days_in_project = (datetime.now() - first_seen).days
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
+            days_in_project = (datetime.now() - datetime.fromtimestamp(first_seen)).days
 
             profile_text = (
                 "👤Ваш профиль⬇️:\n"
@@ -204,26 +224,26 @@ def menu_handler(message):
             types.InlineKeyboardButton("📥 Пополнить", callback_data="profile_deposit"),
             types.InlineKeyboardButton("📤 Вывести", callback_data="profile_withdraw")
         )
-        bot.send_message(message.chat.id, profile_text, reply_markup=markup)
+        await bot.send_message(message.chat.id, profile_text, reply_markup=markup)
 
     elif text == "📊 Статистика":
-        bot.send_message(message.chat.id, "📊 Твоя статистика: пока что пусто.")
+        await bot.send_message(message.chat.id, "📊 Твоя статистика: пока что пусто.")
 
     elif text == "ℹ️ Информация":
-        bot.send_message(message.chat.id, "ℹ️ Это тестовая версия казино бота.")
+        await bot.send_message(message.chat.id, "ℹ️ Это тестовая версия казино бота.")
 
     elif text == "🎮 Игры":
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             "🎮 Меню игр:",
             reply_markup=games_inline_menu()
         )
 
     elif text == "⬅️ Назад":
-        bot.send_message(message.chat.id, "⬅️ Возврат в главное меню.", reply_markup=main_menu())
+        await bot.send_message(message.chat.id, "⬅️ Возврат в главное меню.", reply_markup=main_menu())
 
     else:
-        bot.send_message(message.chat.id, "❌ Неизвестная команда.", reply_markup=main_menu())
+        await bot.send_message(message.chat.id, "❌ Неизвестная команда.", reply_markup=main_menu())
 
 print("Бот запущен...")
-bot.infinity_polling()
\ No newline at end of file
+asyncio.run(bot.infinity_polling())
\ No newline at end of file
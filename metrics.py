@@ -0,0 +1,50 @@
+import threading
+
+
+class Metrics:
+    """Простой реестр метрик процесса: счётчики, текущие значения и замеры"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timings = {}
+
+    def inc(self, name, value=1):
+        """Увеличивает счётчик"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Запоминает текущее значение"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        """Добавляет замер: количество, сумма, максимум и последнее значение"""
+        with self._lock:
+            timing = self.timings.setdefault(name, {'count': 0, 'total': 0, 'max': 0, 'last': 0})
+            timing['count'] += 1
+            timing['total'] += value
+            timing['max'] = max(timing['max'], value)
+            timing['last'] = value
+
+    def format_report(self):
+        """Текстовый отчёт для админ-команды /metrics"""
+        with self._lock:
+            lines = []
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name}: {value}")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"{name}: {value}")
+            for name, timing in sorted(self.timings.items()):
+                avg = timing['total'] / timing['count'] if timing['count'] else 0
+                lines.append(
+                    f"{name}: avg {avg:.2f}, max {timing['max']:.2f}, "
+                    f"last {timing['last']:.2f} (n={timing['count']})"
+                )
+        return "\n".join(lines) if lines else "Метрик пока нет"
+
+
+# Глобальный реестр метрик
+metrics = Metrics()
@@ -0,0 +1,268 @@
+"""Перенос users_data.json в casino.db.
+
+Файл читается потоково, без json.load целиком. Записи пишутся в таблицы
+user_records и users большими транзакциями, прогресс сохраняется в той же
+транзакции, поэтому прерванный перенос продолжается с места остановки.
+В конце сверяются количество пользователей и сумма балансов.
+Баланс из файла перезаписывает существующую строку users, кроме строк,
+которые бот уже менял после запуска (journal_seq > 0): такой баланс живой.
+
+Запуск вручную (в окно обслуживания, при остановленном боте):
+    python migrate_users.py [users_data.json] [casino.db]
+"""
+import os
+import re
+import sys
+import json
+import logging
+
+from db import shared_connection
+from records import UserAccount
+from money import to_cents, format_money
+from balance_journal import JOURNAL_FILE
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+USERS_FILE = 'users_data.json'
+
+# Размер блока чтения файла и число записей в одной транзакции
+CHUNK_SIZE = 1 << 20
+BATCH_SIZE = 10000
+
+WHITESPACE = re.compile(r'\s*')
+
+
+def _parse_pair(decoder, buf, pos, eof):
+    """Разбирает пару "ключ": значение. None - если в буфере не хватает данных"""
+    try:
+        key, pos = decoder.raw_decode(buf, pos)
+        pos = WHITESPACE.match(buf, pos).end()
+        if pos >= len(buf):
+            return None
+        if buf[pos] != ':':
+            raise ValueError(f"Ожидалось ':' в позиции {pos}")
+        pos = WHITESPACE.match(buf, pos + 1).end()
+        value, pos = decoder.raw_decode(buf, pos)
+    except json.JSONDecodeError:
+        if eof:
+            raise
+        return None
+    # Число в самом конце буфера могло оборваться на границе блока
+    if pos >= len(buf) and not eof:
+        return None
+    return key, value, pos
+
+
+def iter_json_object(path, chunk_size=CHUNK_SIZE):
+    """Потоково читает JSON-объект верхнего уровня, выдавая пары (ключ, значение)"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf, pos, eof = '', 0, False
+        started = False
+        while True:
+            pos = WHITESPACE.match(buf, pos).end()
+            if pos < len(buf):
+                char = buf[pos]
+                if not started:
+                    if char != '{':
+                        raise ValueError("Ожидался JSON-объект")
+                    started = True
+                    pos += 1
+                    continue
+                if char == '}':
+                    return
+                if char == ',':
+                    pos += 1
+                    continue
+                pair = _parse_pair(decoder, buf, pos, eof)
+                if pair:
+                    key, value, pos = pair
+                    yield key, value
+                    continue
+
+            if eof:
+                raise ValueError("Неожиданный конец файла")
+            chunk = f.read(chunk_size)
+            buf, pos = buf[pos:] + chunk, 0
+            eof = not chunk
+
+
+def _init_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            balance INTEGER DEFAULT 1000,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_records (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            joined INTEGER,
+            data TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    # Перенесённые ID, баланс из файла и признак живой строки users - для сверки итогов
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS migration_ids (
+            user_id INTEGER PRIMARY KEY,
+            balance INTEGER NOT NULL,
+            live INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def _use_cents(conn, journal_path):
+    """Переводит таблицу users в центы до переноса, чтобы балансы из файла писались без float"""
+    units = conn.execute("SELECT value FROM meta WHERE key = 'balance_units'").fetchone()
+    if units and units[0] == 'cents':
+        return
+    if os.path.exists(journal_path) and os.path.getsize(journal_path):
+        # Записи журнала в долларах нельзя смешивать с балансами в центах
+        raise RuntimeError("Журнал балансов не свёрнут, перевод в центы невозможен")
+    conn.execute('UPDATE users SET balance = CAST(ROUND(balance * 100) AS INTEGER)')
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('balance_units', 'cents')")
+    conn.commit()
+    logging.info("Балансы переведены в центы")
+
+
+def _write_batch(conn, records, balances, progress):
+    conn.executemany(
+        'INSERT OR REPLACE INTO user_records (user_id, username, joined, data) VALUES (?, ?, ?, ?)', records
+    )
+    # Пока AccountStore не добавил journal_seq, бот балансы не менял - живых строк нет
+    live_check = ' WHERE COALESCE(users.journal_seq, 0) = 0' if 'journal_seq' in _columns(conn, 'users') else ''
+    written = []
+    for user_id, username, balance in balances:
+        cursor = conn.execute(f'''
+            INSERT INTO users (user_id, username, balance) VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                balance = excluded.balance,
+                username = COALESCE(excluded.username, users.username){live_check}
+        ''', (user_id, username, balance))
+        live = not cursor.rowcount
+        if live:
+            # Баланс живой строки не трогаем, только дописываем недостающее имя
+            conn.execute('UPDATE users SET username = COALESCE(username, ?) WHERE user_id = ?', (username, user_id))
+            progress['kept'] += 1
+        written.append((user_id, balance, int(live)))
+        progress['total'] += balance
+    conn.executemany('INSERT OR REPLACE INTO migration_ids (user_id, balance, live) VALUES (?, ?, ?)', written)
+    conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrate_progress', ?)", (json.dumps(progress),)
+    )
+    conn.commit()
+
+
+def _verify(conn, progress):
+    """Сверяет количество пользователей и балансы с прочитанными из файла.
+
+    Сумма по всем перенесённым ID должна совпасть с суммой файла, а каждая
+    строка users, кроме живых, - хранить баланс из файла
+    """
+    count, total, mismatched = conn.execute('''
+        SELECT COUNT(*), COALESCE(SUM(m.balance), 0),
+               COALESCE(SUM(m.live = 0 AND u.balance != m.balance), 0)
+        FROM migration_ids m JOIN users u ON u.user_id = m.user_id
+    ''').fetchone()
+    records = conn.execute('''
+        SELECT COUNT(*) FROM migration_ids m JOIN user_records r ON r.user_id = m.user_id
+    ''').fetchone()[0]
+
+    if count != progress['count'] or records != progress['count'] or total != progress['total'] or mismatched:
+        raise RuntimeError(
+            f"Итоги переноса не сходятся: пользователей {count}/{records} из {progress['count']}, "
+            f"сумма балансов {format_money(total)} вместо {format_money(progress['total'])}, "
+            f"балансов не из файла: {mismatched}"
+        )
+
+
+def migrate(conn, lock, path=USERS_FILE, batch_size=BATCH_SIZE, journal_path=JOURNAL_FILE):
+    """Переносит users_data.json в casino.db. Возвращает число записей, перенесённых за этот запуск"""
+    with lock:
+        _init_tables(conn)
+        if conn.execute("SELECT value FROM meta WHERE key = 'users_migrated'").fetchone():
+            return 0
+
+        _use_cents(conn, journal_path)
+
+        row = conn.execute("SELECT value FROM meta WHERE key = 'migrate_progress'").fetchone()
+        progress = json.loads(row[0]) if row else None
+        if 'live' not in _columns(conn, 'migration_ids') or (progress and progress.get('units') != 'cents'):
+            # Прогресс прежней версии переноса считал суммы иначе - начинаем заново
+            if progress:
+                logging.info("Прогресс прежней версии переноса отброшен, перенос начнётся заново")
+            conn.execute('DROP TABLE migration_ids')
+            _init_tables(conn)
+            progress = None
+        if progress is None:
+            progress = {'records': 0, 'count': 0, 'total': 0, 'kept': 0, 'units': 'cents'}
+        if progress['records']:
+            logging.info(f"Продолжаем перенос пользователей с записи {progress['records'] + 1}")
+
+        migrated = 0
+        if os.path.exists(path):
+            records, balances = [], []
+            skip = progress['records']
+            for joined, (user_id, user_data) in enumerate(iter_json_object(path), 1):
+                if joined <= skip:
+                    continue
+                # Баланс уходит в users, а временное состояние игр (mines_game,
+                # waiting_* и т.п.) отбрасывается - в UserAccount для него нет полей
+                record = UserAccount.from_dict(user_data)
+                balance = to_cents(user_data.get('balance', 0))
+                records.append((int(user_id), record.username, joined, record.to_json()))
+                balances.append((int(user_id), record.username, balance))
+
+                progress['records'] = joined
+                progress['count'] += 1
+
+                if len(records) >= batch_size:
+                    _write_batch(conn, records, balances, progress)
+                    migrated += len(records)
+                    records, balances = [], []
+                    logging.info(f"Перенесено пользователей: {progress['records']}")
+
+            if records:
+                _write_batch(conn, records, balances, progress)
+                migrated += len(records)
+
+        try:
+            _verify(conn, progress)
+        except RuntimeError:
+            # Следующий запуск начнёт перенос заново и перезапишет балансы из файла
+            conn.execute("DELETE FROM meta WHERE key = 'migrate_progress'")
+            conn.execute('DELETE FROM migration_ids')
+            conn.commit()
+            raise
+
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('users_migrated', '1')")
+        conn.execute("DELETE FROM meta WHERE key = 'migrate_progress'")
+        conn.execute('DROP TABLE migration_ids')
+        conn.commit()
+
+    logging.info(
+        f"Перенос пользователей завершён: {progress['count']} записей, "
+        f"сумма балансов {format_money(progress['total'])}, сохранено живых балансов: {progress['kept']}"
+    )
+    return migrated
+
+
+if __name__ == '__main__':
+    users_file = sys.argv[1] if len(sys.argv) > 1 else USERS_FILE
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'casino.db'
+    conn, lock = shared_connection(db_path)
+    migrate(conn, lock, users_file)
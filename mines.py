@@ -1,7 +1,11 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, INPUT_TTL, CLICK_TTL
+from pending_input import pending_inputs
 import time
 
 class MinesGame:
@@ -82,23 +86,16 @@ class MinesGame:
         next_opened = self.opened_cells + 1
         return self.get_multiplier_for_opened_cells(next_opened)
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+def cash_out_abandoned(user_id, game):
+    """Брошенная игра закрывается выплатой текущего выигрыша (без ходов - ставкой)"""
+    balance_service.credit(user_id, payout(game.bet_amount, game.multiplier), game='mines')
 
-def save_users_data(data):
-    with open('users_data.json', 'w') as f:
-        json.dump(data, f)
+active_games = SessionStore('mines', GAME_TTL, on_evict=cash_out_abandoned)
+user_temp_data = SessionStore('mines_input', INPUT_TTL)
+user_last_click_time = SessionStore('mines_clicks', CLICK_TTL)
 
-active_games = {}
-user_temp_data = {}
-user_last_click_time = {}
-
-MIN_BET = 0.2
-MAX_BET = 1000
+MIN_BET = 20
+MAX_BET = 100000
 
 def get_bet_selection_keyboard():
     markup = types.InlineKeyboardMarkup(row_width=5)
@@ -159,7 +156,7 @@ def get_game_keyboard(game, game_over=False):
 
     if not game_over and game.opened_cells > 0:
         markup.row(types.InlineKeyboardButton(
-            f"💵 Забрать ${round(game.bet_amount * game.multiplier, 2)}",
+            f"💵 Забрать ${format_money(payout(game.bet_amount, game.multiplier))}",
             callback_data="mine_cashout"
         ))
 
@@ -167,19 +164,16 @@ def get_game_keyboard(game, game_over=False):
 
 def register_mines_handlers(bot):
     @bot.message_handler(func=lambda message: message.text == "💣 Мины")
-    def mines_start(message):
-        users_data = load_users_data()
+    async def mines_start(message):
         user_id = str(message.from_user.id)
 
-        if user_id not in users_data:
-            users_data[user_id] = {'balance': 0}
-            save_users_data(users_data)
+        account_store.ensure_account(user_id, message.from_user.username)
 
-        balance = users_data[user_id].get('balance', 0)
-        balance_rounded = round(balance, 2)
+        balance = account_store.get_balance(user_id)
+        balance_rounded = format_money(balance)
 
         # ТОЧНО КАК В СКРИНЕ 1 - выбор ставки
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             f"💣 Мины\n\n<blockquote>💎Баланс: ${balance_rounded}</blockquote>\nСумма ставки👇",
             parse_mode='HTML',
@@ -187,33 +181,32 @@ def register_mines_handlers(bot):
         )
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('mine_'))
-    def mines_callback_handler(call):
+    async def mines_callback_handler(call):
         user_id = str(call.from_user.id)
-        users_data = load_users_data()
 
         # Проверка задержки между нажатиями
         current_time = time.time()
         if user_id in user_last_click_time:
             time_diff = current_time - user_last_click_time[user_id]
             if time_diff < 0.4:
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
         user_last_click_time[user_id] = current_time
 
         if call.data.startswith("mine_bet_"):
-            bet_amount = float(call.data.split("_")[2])
+            bet_amount = parse_amount(call.data.split("_")[2])
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
             if bet_amount > balance:
-                bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                 return
 
             user_temp_data[user_id] = {'bet_amount': bet_amount}
 
             # ТОЧНО КАК В СКРИНЕ 4 - выбор количества мин
-            bot.edit_message_text(
-                f"💣 Мины · ${bet_amount}\n\n<blockquote>Выберите количество мин💣 (2-24):</blockquote>",
+            await bot.edit_message_text(
+                f"💣 Мины · ${format_money(bet_amount)}\n\n<blockquote>Выберите количество мин💣 (2-24):</blockquote>",
                 call.message.chat.id,
                 call.message.message_id,
                 parse_mode='HTML',
@@ -225,29 +218,25 @@ def register_mines_handlers(bot):
             mines_count = int(call.data.split("_")[2])
 
             if user_id not in user_temp_data or 'bet_amount' not in user_temp_data[user_id]:
-                bot.answer_callback_query(call.id, "❌ Ошибка данных!")
+                await bot.answer_callback_query(call.id, "❌ Ошибка данных!")
                 return
 
             bet_amount = user_temp_data[user_id]['bet_amount']
 
-            balance = users_data[user_id].get('balance', 0)
-            if bet_amount > balance:
-                bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+            if not balance_service.debit(user_id, bet_amount, game='mines'):
+                await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                 return
 
             game = MinesGame(user_id, mines_count, bet_amount)
             active_games[user_id] = game
 
-            users_data[user_id]['balance'] = round(balance - bet_amount, 2)
-            save_users_data(users_data)
-
             if user_id in user_temp_data:
                 del user_temp_data[user_id]
 
             next_mult = game.get_next_multiplier()
 
             # ТОЧНО КАК В СКРИНЕ 2 - игровое поле
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"💣 Мины · {mines_count} мин\n\n"
                 f"<blockquote>          📊Прошлый: x{game.previous_multiplier:.2f}\n"
                 f"          💰Текущий: x{game.multiplier:.2f}\n"
@@ -260,30 +249,29 @@ def register_mines_handlers(bot):
             return
 
         elif call.data == "mine_custom_bet":
-            bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-            bot.register_next_step_handler(call.message, process_custom_bet)
+            await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+            pending_inputs.register(call.message, process_custom_bet)
             return
 
         elif call.data == "mine_custom_count":
             message_text = call.message.text
             if "· $" in message_text:
-                bet_amount = float(message_text.split("· $")[1].split("\n")[0])
+                bet_amount = parse_amount(message_text.split("· $")[1].split("\n")[0])
                 user_temp_data[user_id] = {'bet_amount': bet_amount}
 
-            bot.send_message(call.message.chat.id, "📝 Введите количество мин (2-24):")
-            bot.register_next_step_handler(call.message, process_custom_mines)
+            await bot.send_message(call.message.chat.id, "📝 Введите количество мин (2-24):")
+            pending_inputs.register(call.message, process_custom_mines)
             return
 
         elif call.data == "mine_again":
-            if user_id in active_games:
-                del active_games[user_id]
+            active_games.discard(user_id)
             if user_id in user_temp_data:
                 del user_temp_data[user_id]
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"💣 Мины\n\n<blockquote>💎Баланс: ${balance_rounded}</blockquote>\nСумма ставки👇",
                 call.message.chat.id,
                 call.message.message_id,
@@ -292,8 +280,12 @@ def register_mines_handlers(bot):
             )
             return
 
+        elif call.data == "mine_ignore":
+            await bot.answer_callback_query(call.id)
+            return
+
         if user_id not in active_games:
-            bot.answer_callback_query(call.id, "❌ Игра не найдена")
+            await bot.answer_callback_query(call.id, "❌ Игра не найдена")
             return
 
         game = active_games[user_id]
@@ -303,23 +295,31 @@ def register_mines_handlers(bot):
             x, y = int(parts[2]), int(parts[3])
 
             if game.revealed[x][y]:
-                bot.answer_callback_query(call.id, "❌ Уже открыто!")
+                await bot.answer_callback_query(call.id, "❌ Уже открыто!")
                 return
 
-            success = game.reveal_cell(x, y)
+            with balance_service.user_lock(user_id):
+                if active_games.get(user_id) is not game:
+                    success = None
+                else:
+                    success = game.reveal_cell(x, y)
+                    if not success:
+                        # Мина - ставка проиграна, снимаем игру до ответа
+                        active_games.pop(user_id, None)
+
+            if success is None:
+                await bot.answer_callback_query(call.id, "❌ Игра не найдена")
+                return
 
             if not success:
-                users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0), 2)
-                save_users_data(users_data)
-
                 # ТОЧНО КАК В СКРИНЕ 3 - проигрыш
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"💣 Мины · {game.mines_count} мин\n\n"
                     f"💥 Вы попали на мину!\n\n"
                     f"<blockquote>"
-                    f"          💰Ставка: ${game.bet_amount}\n"
-                    f"         📌Мог забрать: ${round(game.bet_amount * game.multiplier, 2)}\n"
-                    f"          💎Баланс: ${users_data[user_id]['balance']}"
+                    f"          💰Ставка: ${format_money(game.bet_amount)}\n"
+                    f"         📌Мог забрать: ${format_money(payout(game.bet_amount, game.multiplier))}\n"
+                    f"          💎Баланс: ${format_money(account_store.get_balance(user_id))}"
                     f"</blockquote>",
                     call.message.chat.id,
                     call.message.message_id,
@@ -330,7 +330,7 @@ def register_mines_handlers(bot):
             else:
                 next_mult = game.get_next_multiplier()
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"💣 Мины · {game.mines_count} мин\n\n"
                     f"<blockquote>          📊Прошлый: x{game.previous_multiplier:.2f}\n"
                     f"          💰Текущий: x{game.multiplier:.2f}\n"
@@ -343,18 +343,25 @@ def register_mines_handlers(bot):
                 return
 
         elif call.data == "mine_cashout":
-            win_amount = game.bet_amount * game.multiplier
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
-            save_users_data(users_data)
+            # Игру снимаем до выплаты: повторное нажатие её уже не найдёт
+            with balance_service.user_lock(user_id):
+                game = active_games.pop(user_id, None)
+                if game is not None:
+                    win_amount = payout(game.bet_amount, game.multiplier)
+                    balance_service.credit(user_id, win_amount, game='mines')
+
+            if game is None:
+                await bot.answer_callback_query(call.id, "❌ Игра не найдена")
+                return
 
             # ТОЧНО КАК В СКРИНЕ 5 - победа
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"💣 Мины · {game.mines_count} мин\n\n"
                 f"Победа! 🎉\n\n"
                 f"<blockquote>"
-                f"          💰Ставка: ${game.bet_amount}\n"
-                f"         🍀Выигрыш: ${round(win_amount, 2)}\n"
-                f"          💎Баланс: ${users_data[user_id]['balance']}"
+                f"          💰Ставка: ${format_money(game.bet_amount)}\n"
+                f"         🍀Выигрыш: ${format_money(win_amount)}\n"
+                f"          💎Баланс: ${format_money(account_store.get_balance(user_id))}"
                 f"</blockquote>",
                 call.message.chat.id,
                 call.message.message_id,
@@ -363,71 +370,65 @@ def register_mines_handlers(bot):
             )
             return
 
-    def process_custom_bet(message):
+    async def process_custom_bet(message):
         try:
-            bet_amount = float(message.text)
+            bet_amount = parse_amount(message.text)
 
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}")
                 return
 
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}")
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
             if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             user_temp_data[user_id] = {'bet_amount': bet_amount}
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
-                f"💣 Мины · ${bet_amount}\n\n<blockquote>Выберите количество мин💣 (2-24):</blockquote>",
+                f"💣 Мины · ${format_money(bet_amount)}\n\n<blockquote>Выберите количество мин💣 (2-24):</blockquote>",
                 parse_mode='HTML',
                 reply_markup=get_mines_selection_keyboard()
             )
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
 
-    def process_custom_mines(message):
+    async def process_custom_mines(message):
         try:
             mines_count = int(message.text)
             if not 2 <= mines_count <= 24:
-                bot.send_message(message.chat.id, "❌ Введите число от 2 до 24!")
+                await bot.send_message(message.chat.id, "❌ Введите число от 2 до 24!")
                 return
 
             user_id = str(message.from_user.id)
-            users_data = load_users_data()
 
             if user_id not in user_temp_data or 'bet_amount' not in user_temp_data[user_id]:
-                bot.send_message(message.chat.id, "❌ Ошибка данных! Начните заново.")
+                await bot.send_message(message.chat.id, "❌ Ошибка данных! Начните заново.")
                 return
 
             bet_amount = user_temp_data[user_id]['bet_amount']
 
-            balance = users_data[user_id].get('balance', 0)
-            if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+            if not balance_service.debit(user_id, bet_amount, game='mines'):
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             game = MinesGame(user_id, mines_count, bet_amount)
             active_games[user_id] = game
 
-            users_data[user_id]['balance'] = round(balance - bet_amount, 2)
-            save_users_data(users_data)
-
             next_mult = game.get_next_multiplier()
 
             if user_id in user_temp_data:
                 del user_temp_data[user_id]
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"💣 Мины · {mines_count} мин\n\n"
                 f"<blockquote>          📊Прошлый: x{game.previous_multiplier:.2f}\n"
@@ -438,7 +439,7 @@ def register_mines_handlers(bot):
             )
 
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректное число!")
+            await bot.send_message(message.chat.id, "❌ Введите корректное число!")
 
     register_mines_handlers.process_custom_bet = process_custom_bet
     register_mines_handlers.process_custom_mines = process_custom_mines
\ No newline at end of file
@@ -0,0 +1,34 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Все суммы в боте хранятся и считаются в целых центах
+CENTS = 100
+
+
+def to_cents(amount):
+    """Сумма в долларах (число или строка) -> целые центы"""
+    try:
+        value = Decimal(str(amount).strip().replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"Некорректная сумма: {amount}")
+    if not value.is_finite():
+        raise ValueError(f"Некорректная сумма: {amount}")
+    return int((value * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def parse_amount(text):
+    """Сумма, введённая пользователем, в центах. ValueError при неверном вводе"""
+    return to_cents(text)
+
+
+def payout(bet_cents, multiplier):
+    """Выплата в центах: ставка, умноженная на коэффициент, с округлением до цента"""
+    return int((Decimal(bet_cents) * Decimal(str(multiplier))).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_money(cents):
+    """Центы -> строка долларов для вывода: 1250 -> '12.5', 100 -> '1'"""
+    sign = '-' if cents < 0 else ''
+    dollars, rest = divmod(abs(int(cents)), CENTS)
+    if not rest:
+        return f"{sign}{dollars}"
+    return f"{sign}{dollars}.{rest:02d}".rstrip('0')
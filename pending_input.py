@@ -0,0 +1,40 @@
+from sessions import SessionStore, INPUT_TTL
+
+# Сообщения, которые может ждать обработчик ввода
+INPUT_CONTENT_TYPES = ['text', 'photo', 'sticker', 'document', 'audio', 'video', 'voice', 'animation']
+
+
+class PendingInputs:
+    """Ожидание следующего сообщения в чате (замена register_next_step_handler).
+
+    Обработчик запоминается по chat_id и один раз получает следующее
+    сообщение этого чата раньше обычных обработчиков. Брошенные ожидания
+    истекают через INPUT_TTL.
+    """
+
+    def __init__(self, ttl=INPUT_TTL):
+        self._handlers = SessionStore('pending_input', ttl)
+
+    def register(self, message, handler):
+        """Передать следующее сообщение чата в handler (корутину)"""
+        self._handlers[message.chat.id] = handler
+
+    def waiting(self, message):
+        return message.chat.id in self._handlers
+
+    def pop(self, message):
+        return self._handlers.pop(message.chat.id, None)
+
+
+def register_pending_input_handler(bot):
+    """Регистрирует раздачу ожидаемого ввода; вызывать до остальных обработчиков сообщений"""
+
+    @bot.message_handler(func=pending_inputs.waiting, content_types=INPUT_CONTENT_TYPES)
+    async def pending_input_handler(message):
+        handler = pending_inputs.pop(message)
+        if handler is not None:
+            await handler(message)
+
+
+# Глобальный реестр ожидаемого ввода
+pending_inputs = PendingInputs()
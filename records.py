@@ -0,0 +1,127 @@
+import json
+
+
+class Record:
+    """Базовый класс записей со __slots__.
+
+    Записи сериализуются компактно - списком значений в порядке полей,
+    без повторения имён ключей в каждой записи.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def fields(cls):
+        """Имена полей с учётом __slots__ базовых классов"""
+        return tuple(field for klass in reversed(cls.__mro__) for field in klass.__dict__.get('__slots__', ()))
+
+    def to_list(self):
+        return [getattr(self, field) for field in self.fields()]
+
+    @classmethod
+    def from_list(cls, values):
+        record = cls.__new__(cls)
+        for field, value in zip(cls.fields(), values):
+            setattr(record, field, value)
+        return record
+
+    @classmethod
+    def from_dict(cls, data):
+        """Из старой записи-словаря; неизвестные ключи отбрасываются"""
+        return cls(**{field: data[field] for field in cls.fields() if field in data})
+
+    def to_json(self):
+        return json.dumps(self.to_list(), ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls.from_dict(data) if isinstance(data, dict) else cls.from_list(data)
+
+    def __repr__(self):
+        fields = ', '.join(f"{field}={getattr(self, field)!r}" for field in self.fields())
+        return f"{type(self).__name__}({fields})"
+
+
+class UserAccount(Record):
+    """Постоянная запись пользователя (баланс хранится отдельно в AccountStore)"""
+
+    __slots__ = ('first_seen', 'username', 'level', 'deposit', 'turnover', 'wins')
+
+    def __init__(self, first_seen=None, username=None, level=1, deposit=0, turnover=0, wins=0):
+        self.first_seen = first_seen
+        self.username = username
+        self.level = level
+        self.deposit = deposit
+        self.turnover = turnover
+        self.wins = wins
+
+
+class BetSession(Record):
+    """Начатая игра: ставка и сообщение, в котором идёт игра"""
+
+    __slots__ = ('bet_amount', 'chat_id', 'message_id')
+
+    def __init__(self, bet_amount, chat_id, message_id):
+        self.bet_amount = bet_amount
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+
+class CoinSession(BetSession):
+    __slots__ = ()
+
+
+class RouletteSession(BetSession):
+    __slots__ = ()
+
+
+class RpsSession(BetSession):
+    __slots__ = ()
+
+
+class CrashSession(Record):
+    __slots__ = (
+        'bet_amount', 'crash_point', 'chat_id', 'message_id', 'current_multiplier',
+        'crashed', 'user_cashed_out', 'win_amount', 'start_time'
+    )
+
+    def __init__(self, bet_amount, crash_point, chat_id, message_id, current_multiplier=1.0,
+                 crashed=False, user_cashed_out=False, win_amount=0, start_time=None):
+        self.bet_amount = bet_amount
+        self.crash_point = crash_point
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.current_multiplier = current_multiplier
+        self.crashed = crashed
+        self.user_cashed_out = user_cashed_out
+        self.win_amount = win_amount
+        self.start_time = start_time
+
+
+class TombSession(Record):
+    __slots__ = (
+        'bet_amount', 'multipliers', 'chat_id', 'message_id',
+        'selected_positions', 'attempts_left', 'last_multiplier'
+    )
+
+    def __init__(self, bet_amount, multipliers, chat_id, message_id,
+                 selected_positions=None, attempts_left=2, last_multiplier=None):
+        self.bet_amount = bet_amount
+        self.multipliers = multipliers
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.selected_positions = selected_positions if selected_positions is not None else []
+        self.attempts_left = attempts_left
+        self.last_multiplier = last_multiplier
+
+
+class BalloonSession(Record):
+    __slots__ = ('bet_amount', 'chat_id', 'message_id', 'multiplier', 'game_active')
+
+    def __init__(self, bet_amount, chat_id, message_id, multiplier=1.0, game_active=True):
+        self.bet_amount = bet_amount
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.multiplier = multiplier
+        self.game_active = game_active
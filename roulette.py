@@ -1,39 +1,28 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, CLICK_TTL
+from pending_input import pending_inputs
+from records import RouletteSession
 import time
+import asyncio
 import logging
 import threading
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        logging.error(f"Ошибка загрузки данных: {e}")
-        return {}
-
-def save_users_data(data):
-    try:
-        with open('users_data.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка сохранения данных: {e}")
-
 # Активные игры Рулетка
-active_roulette_games = {}
+active_roulette_games = SessionStore('roulette', GAME_TTL, on_evict=balance_service.refund_on_evict('roulette'))
 
-# Минимальная и максимальная ставка
-MIN_BET = 0.2
-MAX_BET = 1000
+# Минимальная и максимальная ставка (в центах)
+MIN_BET = 20
+MAX_BET = 100000
 
 # Задержка между нажатиями
-last_click_time = {}
+last_click_time = SessionStore('roulette_clicks', CLICK_TTL)
 click_lock = threading.Lock()
 
 def rate_limit(user_id):
@@ -205,55 +194,53 @@ def get_multiplier(choice):
     else:
         return 1.8
 
-def play_roulette_game(bot, call, bet_amount, user_id):
+async def play_roulette_game(bot, call, bet_amount, user_id):
     """Основная логика игры в Рулетку"""
     try:
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
-
         # Списываем ставку
-        users_data[user_id]['balance'] = round(current_balance - bet_amount, 2)
-        save_users_data(users_data)
+        if not balance_service.debit(user_id, bet_amount, game='roulette'):
+            await bot.send_message(call.message.chat.id, "❌ Недостаточно средств!")
+            return
 
         # Сохраняем состояние игры
-        active_roulette_games[user_id] = {
-            'bet_amount': bet_amount,
-            'chat_id': call.message.chat.id,
-            'message_id': call.message.message_id
-        }
+        active_roulette_games[user_id] = RouletteSession(
+            bet_amount=bet_amount,
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id
+        )
 
         # Показываем выбор типа ставки
-        show_roulette_choice_screen(bot, user_id)
+        await show_roulette_choice_screen(bot, user_id)
 
     except Exception as e:
         logging.error(f"Ошибка запуска игры в Рулетку: {e}")
-        bot.edit_message_text(
+        await bot.edit_message_text(
             "❌ Произошла ошибка при запуске игры",
             call.message.chat.id,
             call.message.message_id
         )
 
-def show_roulette_choice_screen(bot, user_id):
+async def show_roulette_choice_screen(bot, user_id):
     """Показывает экран выбора типа ставки"""
     try:
         if user_id not in active_roulette_games:
             return
 
         game_data = active_roulette_games[user_id]
-        bet_amount = game_data['bet_amount']
+        bet_amount = game_data.bet_amount
 
         display = f"""🎰 <b>РУЛЕТКА</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите тип ставки:"""
 
         keyboard = get_roulette_choice_keyboard()
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=keyboard
         )
@@ -261,27 +248,27 @@ def show_roulette_choice_screen(bot, user_id):
     except Exception as e:
         logging.error(f"Ошибка показа выбора рулетки: {e}")
 
-def show_roulette_number_screen(bot, user_id):
+async def show_roulette_number_screen(bot, user_id):
     """Показывает экран выбора числа"""
     try:
         if user_id not in active_roulette_games:
             return
 
         game_data = active_roulette_games[user_id]
-        bet_amount = game_data['bet_amount']
+        bet_amount = game_data.bet_amount
 
         display = f"""🎰 <b>РУЛЕТКА</b>
 
-<blockquote>💵 Сумма ставки: ${bet_amount}</blockquote>
+<blockquote>💵 Сумма ставки: ${format_money(bet_amount)}</blockquote>
 
 Выберите число от 0 до 36:"""
 
         keyboard = get_roulette_number_keyboard()
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=keyboard
         )
@@ -289,15 +276,16 @@ def show_roulette_number_screen(bot, user_id):
     except Exception as e:
         logging.error(f"Ошибка показа выбора числа: {e}")
 
-def process_roulette_choice(bot, call, player_choice, user_id):
+async def process_roulette_choice(bot, call, player_choice, user_id):
     """Обрабатывает выбор игрока"""
     try:
-        if user_id not in active_roulette_games:
-            bot.answer_callback_query(call.id, "❌ Игра не найдена")
+        # Забираем игру до розыгрыша: повторный выбор её уже не найдёт
+        with balance_service.user_lock(user_id):
+            game_data = active_roulette_games.pop(user_id, None)
+        if game_data is None:
+            await bot.answer_callback_query(call.id, "❌ Игра не найдена")
             return
-
-        game_data = active_roulette_games[user_id]
-        bet_amount = game_data['bet_amount']
+        bet_amount = game_data.bet_amount
 
         # Крутим рулетку
         result_number = spin_roulette()
@@ -306,20 +294,15 @@ def process_roulette_choice(bot, call, player_choice, user_id):
         is_winner = determine_roulette_winner(player_choice, result_number)
 
         # Показываем анимацию вращения
-        show_roulette_animation(bot, user_id, player_choice, result_number, is_winner, bet_amount)
+        await show_roulette_animation(bot, user_id, game_data, player_choice, result_number, is_winner, bet_amount)
 
     except Exception as e:
         logging.error(f"Ошибка обработки выбора рулетки: {e}")
-        bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+        await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
 
-def show_roulette_animation(bot, user_id, player_choice, result_number, is_winner, bet_amount):
+async def show_roulette_animation(bot, user_id, game_data, player_choice, result_number, is_winner, bet_amount):
     """Показывает анимацию вращения рулетки"""
     try:
-        if user_id not in active_roulette_games:
-            return
-
-        game_data = active_roulette_games[user_id]
-
         # Первый этап - начало вращения
         display = f"""🎰 <b>РУЛЕТКА</b>
 
@@ -329,15 +312,15 @@ def show_roulette_animation(bot, user_id, player_choice, result_number, is_winne
 
 ⚪ Шар запущен..."""
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML'
         )
 
         # Ждем 1.5 секунды
-        time.sleep(1.5)
+        await asyncio.sleep(1.5)
 
         # Второй этап - шар крутится
         display = f"""🎰 <b>РУЛЕТКА</b>
@@ -348,31 +331,25 @@ def show_roulette_animation(bot, user_id, player_choice, result_number, is_winne
 
 🔄 Шар крутится..."""
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML'
         )
 
         # Ждем 1.5 секунды
-        time.sleep(1.5)
+        await asyncio.sleep(1.5)
 
         # Показываем финальный результат
-        show_roulette_final_result(bot, user_id, player_choice, result_number, is_winner, bet_amount)
+        await show_roulette_final_result(bot, user_id, game_data, player_choice, result_number, is_winner, bet_amount)
 
     except Exception as e:
         logging.error(f"Ошибка анимации рулетки: {e}")
 
-def show_roulette_final_result(bot, user_id, player_choice, result_number, is_winner, bet_amount):
+async def show_roulette_final_result(bot, user_id, game_data, player_choice, result_number, is_winner, bet_amount):
     """Показывает финальный результат"""
     try:
-        if user_id not in active_roulette_games:
-            return
-
-        game_data = active_roulette_games[user_id]
-        users_data = load_users_data()
-
         result_color = get_number_color(result_number)
         result_emoji = get_number_emoji(result_number)
         choice_name = get_choice_name(player_choice)
@@ -390,15 +367,15 @@ def show_roulette_final_result(bot, user_id, player_choice, result_number, is_wi
         if is_winner:
             # Победа
             multiplier = get_multiplier(player_choice)
-            win_amount = round(bet_amount * multiplier, 2)
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
+            win_amount = payout(bet_amount, multiplier)
+            balance_service.credit(user_id, win_amount, game='roulette')
             
             result_text = f"""🎉 <b>ВЫ ВЫИГРАЛИ!</b>
 
 <blockquote>
-💰 Ставка: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
 🎯 Множитель: {multiplier}x
-🏆 Выигрыш: ${win_amount:.2f}
+🏆 Выигрыш: ${format_money(win_amount)}
 </blockquote>"""
             display += "\n✅ <b>Результат: ПОБЕДА!</b>"
         else:
@@ -407,13 +384,11 @@ def show_roulette_final_result(bot, user_id, player_choice, result_number, is_wi
             result_text = f"""❌ <b>ВЫ ПРОИГРАЛИ!</b>
 
 <blockquote>
-💰 Ставка: ${bet_amount}
-💸 Потеряно: ${bet_amount}
+💰 Ставка: ${format_money(bet_amount)}
+💸 Потеряно: ${format_money(bet_amount)}
 </blockquote>"""
             display += "\n❌ <b>Результат: ПРОИГРЫШ</b>"
 
-        save_users_data(users_data)
-
         display += f"\n\n{result_text}"
 
         # Клавиатура после игры
@@ -423,76 +398,66 @@ def show_roulette_final_result(bot, user_id, player_choice, result_number, is_wi
             types.InlineKeyboardButton("🎮 Другие игры", callback_data="roulette_other_games")
         )
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=markup
         )
 
-        # Удаляем игру из активных
-        if user_id in active_roulette_games:
-            del active_roulette_games[user_id]
-
     except Exception as e:
         logging.error(f"Ошибка показа результата рулетки: {e}")
 
 def register_roulette_handlers(bot):
     """Регистрация обработчиков для игры в Рулетку"""
 
-    def process_custom_bet_roulette(message):
+    async def process_custom_bet_roulette(message):
         """Обработка ручного ввода ставки для Рулетки"""
         try:
-            bet_amount = float(message.text)
-            users_data = load_users_data()
+            bet_amount = parse_amount(message.text)
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
             
             # Проверяем минимальную и максимальную ставку
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}!")
                 return
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}!")
                 return
             if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             # Сразу запускаем игру без кнопки "Начать игру"
-            play_roulette_game(bot, message, bet_amount, user_id)
+            await play_roulette_game(bot, message, bet_amount, user_id)
 
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
         except Exception as e:
             logging.error(f"Ошибка в process_custom_bet_roulette: {e}")
-            bot.send_message(message.chat.id, "❌ Произошла ошибка!")
+            await bot.send_message(message.chat.id, "❌ Произошла ошибка!")
 
     @bot.message_handler(func=lambda message: message.text == "🎰 Рулетка")
-    def roulette_start(message):
+    async def roulette_start(message):
         """Начало игры в Рулетку"""
         try:
             # Проверяем задержку
             if not rate_limit(str(message.from_user.id)):
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"""🎰 <b>Игра "Рулетка"</b>
 
@@ -504,37 +469,36 @@ def register_roulette_handlers(bot):
             )
         except Exception as e:
             logging.error(f"Ошибка в roulette_start: {e}")
-            bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
+            await bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('roulette_'))
-    def roulette_callback_handler(call):
+    async def roulette_callback_handler(call):
         """Обработчик колбэков Рулетки"""
         try:
             user_id = str(call.from_user.id)
 
             # Проверяем задержку
             if not rate_limit(user_id):
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
             if call.data.startswith("roulette_bet_"):
-                bet_amount = float(call.data.split("_")[2])
-                users_data = load_users_data()
+                bet_amount = parse_amount(call.data.split("_")[2])
 
-                balance = users_data[user_id].get('balance', 0)
+                balance = account_store.get_balance(user_id)
                 if bet_amount > balance:
-                    bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                    await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                     return
 
                 # Сразу запускаем игру без кнопки "Начать игру"
-                play_roulette_game(bot, call, bet_amount, user_id)
+                await play_roulette_game(bot, call, bet_amount, user_id)
 
             elif call.data == "roulette_custom_bet":
-                bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-                bot.register_next_step_handler(call.message, process_custom_bet_roulette)
+                await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+                pending_inputs.register(call.message, process_custom_bet_roulette)
 
             elif call.data == "roulette_rules":
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     get_roulette_rules(),
                     call.message.chat.id,
                     call.message.message_id,
@@ -545,11 +509,10 @@ def register_roulette_handlers(bot):
                 )
 
             elif call.data == "roulette_back_to_bet":
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""🎰 <b>Игра "Рулетка"</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -562,29 +525,27 @@ def register_roulette_handlers(bot):
                 )
 
             elif call.data == "roulette_back_to_choice":
-                show_roulette_choice_screen(bot, user_id)
+                await show_roulette_choice_screen(bot, user_id)
 
             elif call.data.startswith("roulette_choice_"):
                 choice = call.data.split("_")[2]  # red, black, even, odd, number
                 if choice == "number":
-                    show_roulette_number_screen(bot, user_id)
+                    await show_roulette_number_screen(bot, user_id)
                 else:
-                    process_roulette_choice(bot, call, choice, user_id)
+                    await process_roulette_choice(bot, call, choice, user_id)
 
             elif call.data.startswith("roulette_number_"):
                 number = int(call.data.split("_")[2])
-                process_roulette_choice(bot, call, f"number_{number}", user_id)
+                await process_roulette_choice(bot, call, f"number_{number}", user_id)
 
             elif call.data == "roulette_play_again":
                 # Очищаем предыдущую игру
-                if user_id in active_roulette_games:
-                    del active_roulette_games[user_id]
+                active_roulette_games.discard(user_id)
 
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""🎰 <b>Игра "Рулетка"</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -598,10 +559,9 @@ def register_roulette_handlers(bot):
 
             elif call.data == "roulette_other_games":
                 # Возврат к основным играм
-                if user_id in active_roulette_games:
-                    del active_roulette_games[user_id]
+                active_roulette_games.discard(user_id)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     "🎮 <b>Выберите игру:</b>",
                     call.message.chat.id,
                     call.message.message_id,
@@ -611,6 +571,6 @@ def register_roulette_handlers(bot):
         except Exception as e:
             logging.error(f"Ошибка в roulette_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+                await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
             except:
                 pass
\ No newline at end of file
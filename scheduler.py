@@ -0,0 +1,65 @@
+import time
+import heapq
+import logging
+import threading
+
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class Scheduler:
+    """Периодические фоновые задачи в одном отдельном потоке.
+
+    Задачи лежат в куче по времени следующего запуска. Поток спит до
+    ближайшей задачи, выполняет её и ставит обратно в кучу. Задачи
+    выполняются по одной, потоки опроса Telegram их не ждут.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = []
+        self._seq = 0
+        self._wake = threading.Event()
+        self._thread = None
+
+    def every(self, interval, fn, name, delay=None):
+        """Запускает fn() каждые interval секунд; первый запуск через delay (по умолчанию interval)"""
+        with self._lock:
+            self._seq += 1
+            first_run = time.monotonic() + (interval if delay is None else delay)
+            heapq.heappush(self._jobs, (first_run, self._seq, interval, fn, name))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                wait = self._jobs[0][0] - time.monotonic() if self._jobs else None
+            if wait is None or wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+
+            with self._lock:
+                run_at, seq, interval, fn, name = heapq.heappop(self._jobs)
+            self._run(fn, name)
+            with self._lock:
+                # Пропущенные из-за долгой задачи запуски не догоняются
+                heapq.heappush(self._jobs, (max(run_at + interval, time.monotonic()), seq, interval, fn, name))
+
+    def _run(self, fn, name):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logging.error(f"Ошибка фоновой задачи {name}: {e}")
+            metrics.inc(f"scheduler.{name}.errors")
+            return
+        metrics.observe(f"scheduler.{name}.ms", (time.perf_counter() - start) * 1000)
+
+
+# Глобальный планировщик фоновых задач
+scheduler = Scheduler()
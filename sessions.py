@@ -0,0 +1,149 @@
+import time
+import logging
+import threading
+from collections.abc import MutableMapping
+
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Время жизни записей без обращений (секунды)
+GAME_TTL = 30 * 60      # начатая игра
+INPUT_TTL = 10 * 60     # выбранная ставка / ожидание ввода
+CLICK_TTL = 60          # время последнего нажатия для антиспама
+
+# Как часто фоновый поток удаляет просроченные записи (секунды)
+SWEEP_INTERVAL = 30
+
+_MISSING = object()
+
+_stores = []
+_stores_lock = threading.Lock()
+_sweeper = None
+
+
+class SessionStore(MutableMapping):
+    """Временное состояние в памяти с TTL на каждую запись.
+
+    Ведёт себя как dict. Срок записи продлевается при каждом чтении и
+    записи, брошенные записи удаляет фоновый поток.
+
+    on_evict(key, value) вызывается для записей, которые снял не владелец:
+    по истечении TTL, при перезаписи другим значением и через discard.
+    Хранилища со списанными ставками возвращают в нём деньги игроку.
+    Явные pop и del считаются расчётом и хук не вызывают.
+    """
+
+    def __init__(self, name, ttl, on_evict=None):
+        self.name = name
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        # key -> [значение, момент истечения, ttl]
+        self._data = {}
+        _register(self)
+
+    def set(self, key, value, ttl=None):
+        """Сохраняет значение со своим TTL (по умолчанию - TTL хранилища)"""
+        ttl = ttl or self.ttl
+        with self._lock:
+            old = self._data.get(key)
+            self._data[key] = [value, time.monotonic() + ttl, ttl]
+        if old is not None and old[0] is not value:
+            self._evicted([(key, old[0])])
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __getitem__(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data[key]
+            if entry[1] >= now:
+                entry[1] = now + entry[2]
+                return entry[0]
+            del self._data[key]
+        self._evicted([(key, entry[0])])
+        raise KeyError(key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def pop(self, key, default=_MISSING):
+        """Атомарно забирает запись: из двух одновременных pop значение получит один"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is not None and entry[1] < time.monotonic():
+            self._evicted([(key, entry[0])])
+            entry = None
+        if entry is None:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        return entry[0]
+
+    def discard(self, key):
+        """Снимает брошенную запись (если она есть) с вызовом on_evict"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is not None:
+            self._evicted([(key, entry[0])])
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] >= time.monotonic()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def sweep(self):
+        """Удаляет просроченные записи"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [(key, entry[0]) for key, entry in self._data.items() if entry[1] < now]
+            for key, _ in expired:
+                del self._data[key]
+            size = len(self._data)
+
+        if expired:
+            metrics.inc(f"sessions.{self.name}.evicted", len(expired))
+            self._evicted(expired)
+        metrics.set_gauge(f"sessions.{self.name}.size", size)
+
+    def _evicted(self, items):
+        """Передаёт снятые записи в on_evict (вне блокировки хранилища)"""
+        if self.on_evict is None:
+            return
+        for key, value in items:
+            try:
+                self.on_evict(key, value)
+                metrics.inc(f"sessions.{self.name}.settled_on_evict")
+            except Exception as e:
+                logging.error(f"Ошибка расчёта снятой сессии {self.name} ({key}): {e}")
+
+
+def _register(store):
+    global _sweeper
+    with _stores_lock:
+        _stores.append(store)
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_loop, name="session-sweeper", daemon=True)
+            _sweeper.start()
+
+
+def _sweep_loop():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        with _stores_lock:
+            stores = list(_stores)
+        for store in stores:
+            try:
+                store.sweep()
+            except Exception as e:
+                logging.error(f"Ошибка очистки сессий {store.name}: {e}")
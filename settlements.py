@@ -0,0 +1,98 @@
+import threading
+
+from user_store import user_store
+from write_behind import WriteBehindQueue
+from metrics import metrics
+from leaderboard import windowed_leaderboard
+from states import stats_manager
+
+# Какой накопитель записи пользователя увеличивает операция с балансом
+REASON_TOTALS = {
+    'bet': 'turnover',
+    'win': 'wins',
+    'admin_give': 'deposit',
+}
+
+# Операции, которые отменяют ранее учтённую операцию: возврат ставки уменьшает оборот
+REASON_REVERSALS = {
+    'refund': 'turnover',
+}
+
+# Сброс накоплений в записи: не реже чем раз в FLUSH_INTERVAL секунд или каждые FLUSH_BATCH пользователей
+FLUSH_INTERVAL = 1.0
+FLUSH_BATCH = 200
+
+
+class SettlementStage:
+    """Потоковая агрегация расчётов игр в накопители пользователя.
+
+    Событие (ставка, выигрыш, пополнение) только прибавляется к счётчику
+    в памяти, к дневной корзине оконных топов и к буферу дневной
+    статистики. Фоновый поток пачками
+    переносит суммы в записи UserAccount, а сохранение записи обновляет
+    таблицу лидеров.
+    """
+
+    def __init__(self, store, flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH):
+        self.store = store
+        self._lock = threading.Lock()
+        # user_id -> {накопитель: сумма в центах}
+        self._pending = {}
+        self._queue = WriteBehindQueue(self._flush, "settlements", flush_interval, flush_batch)
+
+    def record(self, user_id, reason, amount, game=None):
+        """Учитывает операцию с балансом; операции без накопителя пропускаются"""
+        if amount <= 0:
+            return
+        if reason in REASON_REVERSALS:
+            # Возврат не разыгранной ставки: игра не состоялась, ставку вычитаем
+            stats_manager.record_refund(amount, user_id, game)
+            total, amount = REASON_REVERSALS[reason], -amount
+        else:
+            total = REASON_TOTALS.get(reason)
+            if total is None:
+                return
+            if reason == 'bet':
+                stats_manager.record_bet(amount, user_id, game)
+            elif reason == 'win':
+                stats_manager.record_win(amount, user_id, game)
+        user_id = int(user_id)
+        windowed_leaderboard.add(user_id, total, amount)
+        with self._lock:
+            totals = self._pending.setdefault(user_id, {})
+            totals[total] = totals.get(total, 0) + amount
+        metrics.inc("settlements.events")
+        self._queue.mark(user_id)
+
+    def _flush(self, user_ids):
+        for user_id in user_ids:
+            with self._lock:
+                totals = self._pending.pop(user_id, None)
+            if not totals:
+                continue
+
+            def apply(record):
+                for total, amount in totals.items():
+                    setattr(record, total, max(0, (getattr(record, total) or 0) + amount))
+
+            try:
+                # Чтение и запись под блокировкой хранилища - не гоняемся с /start
+                _, created = self.store.update_user(user_id, apply)
+            except Exception:
+                # Вернём суммы - очередь повторит сброс
+                with self._lock:
+                    pending = self._pending.setdefault(user_id, {})
+                    for total, amount in totals.items():
+                        pending[total] = pending.get(total, 0) + amount
+                raise
+            if created:
+                # Запись появилась раньше /start - пользователь новый с этого момента
+                stats_manager.record_new_user()
+
+    def flush(self):
+        """Немедленно переносит накопленные суммы в записи"""
+        self._queue.flush()
+
+
+# Глобальная стадия агрегации расчётов
+settlement_stage = SettlementStage(user_store)
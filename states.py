@@ -1,82 +1,248 @@
-import json
 import time
-import sqlite3
+import threading
 from datetime import datetime, timedelta
 import logging
 from telebot import types
+from db import shared_connection
+from write_behind import WriteBehindQueue
+from sessions import SessionStore, GAME_TTL
+from user_store import user_store
+from activity import activity_tracker
+from money import format_money
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Запросы статистики. Текст каждого запроса неизменен, поэтому sqlite3 берёт
+# подготовленное выражение из кэша соединения, а не разбирает его заново
+PROJECT_START_SQL = 'SELECT project_start_date FROM bot_stats WHERE id = 1'
+
+# Экран статистики: дата старта проекта и все три окна одним проходом по daily_stats
+STATS_SCREEN_SQL = '''
+    SELECT
+        (SELECT project_start_date FROM bot_stats WHERE id = 1),
+        SUM(CASE WHEN date = :today THEN new_users ELSE 0 END),
+        SUM(CASE WHEN date = :today THEN games_played ELSE 0 END),
+        SUM(CASE WHEN date = :today THEN bets_amount ELSE 0 END),
+        SUM(CASE WHEN date = :today THEN wins_amount ELSE 0 END),
+        SUM(CASE WHEN date >= :week_ago THEN new_users ELSE 0 END),
+        SUM(CASE WHEN date >= :week_ago THEN games_played ELSE 0 END),
+        SUM(CASE WHEN date >= :week_ago THEN bets_amount ELSE 0 END),
+        SUM(CASE WHEN date >= :week_ago THEN wins_amount ELSE 0 END),
+        SUM(new_users),
+        SUM(games_played),
+        SUM(bets_amount),
+        SUM(wins_amount)
+    FROM daily_stats
+    WHERE date >= :month_ago
+'''
+
+# Прибавляет накопленные события к строке часа, не затирая уже записанное
+HOURLY_INCREMENT_SQL = '''
+    INSERT INTO hourly_stats (hour, new_users, games_played, bets_amount, wins_amount)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(hour) DO UPDATE SET
+        new_users = new_users + excluded.new_users,
+        games_played = games_played + excluded.games_played,
+        bets_amount = bets_amount + excluded.bets_amount,
+        wins_amount = wins_amount + excluded.wins_amount
+'''
+
+# Свёртка по играм за день. hist_* - выигрыши по коэффициенту выплаты:
+# до 1x, 1-2x, 2-5x, 5-10x, от 10x; проигрыши = rounds - сумма hist_*
+GAME_HIST_EDGES = (1, 2, 5, 10)
+GAME_HIST_LABELS = ('<1x', '1-2x', '2-5x', '5-10x', '10x+')
+
+GAME_INCREMENT_SQL = '''
+    INSERT INTO game_daily_stats (date, game, rounds, staked, paid, biggest_win,
+                                  hist_0, hist_1, hist_2, hist_3, hist_4)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(date, game) DO UPDATE SET
+        rounds = rounds + excluded.rounds,
+        staked = staked + excluded.staked,
+        paid = paid + excluded.paid,
+        biggest_win = MAX(biggest_win, excluded.biggest_win),
+        hist_0 = hist_0 + excluded.hist_0,
+        hist_1 = hist_1 + excluded.hist_1,
+        hist_2 = hist_2 + excluded.hist_2,
+        hist_3 = hist_3 + excluded.hist_3,
+        hist_4 = hist_4 + excluded.hist_4
+'''
+
+GAME_STATS_SQL = '''
+    SELECT game, SUM(rounds), SUM(staked), SUM(paid), MAX(biggest_win),
+           SUM(hist_0), SUM(hist_1), SUM(hist_2), SUM(hist_3), SUM(hist_4)
+    FROM game_daily_stats
+    WHERE date >= ?
+    GROUP BY game
+    ORDER BY SUM(staked) DESC
+'''
+
+GAME_NAMES = {
+    'dice': '🎲 Кости', 'basketball': '🏀 Баскетбол', 'football': '⚽ Футбол',
+    'darts': '🎯 Дартс', 'mines': '💣 Мины', 'tower': '🏰 Башня', 'gold': '💰 Золото',
+    'crash': '🚀 Краш', 'tomb': '⚰️ Гробница', 'balloon': '🎈 Шарик', 'coin': '🪙 Орел-Решка',
+    'rps': '🎮 КНБ', 'roulette': '🎰 Рулетка',
+}
+
+# Сброс буфера событий в hourly_stats: раз в STATS_FLUSH_INTERVAL секунд
+STATS_FLUSH_INTERVAL = 5.0
+STATS_FLUSH_BATCH = 1000
+
+# Свёртки: часы -> дни -> месяцы. Строка свёртки пересчитывается целиком,
+# поэтому повторный запуск ничего не удваивает
+DAILY_ROLLUP_SQL = '''
+    INSERT INTO daily_stats (date, new_users, games_played, bets_amount, wins_amount)
+    SELECT substr(hour, 1, 10), SUM(new_users), SUM(games_played), SUM(bets_amount), SUM(wins_amount)
+    FROM hourly_stats
+    WHERE hour >= ?
+    GROUP BY substr(hour, 1, 10)
+    ON CONFLICT(date) DO UPDATE SET
+        new_users = excluded.new_users,
+        games_played = excluded.games_played,
+        bets_amount = excluded.bets_amount,
+        wins_amount = excluded.wins_amount
+'''
+
+MONTHLY_ROLLUP_SQL = '''
+    INSERT INTO monthly_stats (month, new_users, games_played, bets_amount, wins_amount)
+    SELECT substr(date, 1, 7), SUM(new_users), SUM(games_played), SUM(bets_amount), SUM(wins_amount)
+    FROM daily_stats
+    WHERE date >= ?
+    GROUP BY substr(date, 1, 7)
+    ON CONFLICT(month) DO UPDATE SET
+        new_users = excluded.new_users,
+        games_played = excluded.games_played,
+        bets_amount = excluded.bets_amount,
+        wins_amount = excluded.wins_amount
+'''
+
+MONTHLY_STATS_SQL = '''
+    SELECT month, new_users, games_played, bets_amount, wins_amount
+    FROM monthly_stats ORDER BY month DESC LIMIT ?
+'''
+
+# Расписание свёрток (секунды) и сроки хранения сырых строк (дни).
+# Дневные строки удаляются, только когда их месяц уже свёрнут
+DAILY_ROLLUP_INTERVAL = 60.0
+MONTHLY_ROLLUP_INTERVAL = 600.0
+PRUNE_INTERVAL = 6 * 3600.0
+HOURLY_RETENTION_DAYS = 7
+DAILY_RETENTION_DAYS = 400
+
 class BotStats:
     def __init__(self, db_path='bot_stats.db'):
         self.db_path = db_path
+        # Одно долгоживущее соединение (WAL) на все чтения и записи статистики
+        self.conn, self._lock = shared_connection(db_path)
         self.init_database()
+        # Буфер событий: час -> [новые пользователи, игры, ставки, выигрыши]
+        self._events = {}
+        # Буфер по играм: (дата, игра) -> [раунды, ставки, выплаты, макс. выигрыш, hist_0..hist_4]
+        self._game_events = {}
+        # Последняя ставка пользователя в игре - для коэффициента выплаты
+        self._open_stakes = SessionStore('stats_stakes', GAME_TTL)
+        self._events_lock = threading.Lock()
+        self._flusher = WriteBehindQueue(self._flush_events, "daily_stats", STATS_FLUSH_INTERVAL, STATS_FLUSH_BATCH)
         
     def init_database(self):
         """Инициализация базы данных для статистики"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Таблица общей статистики
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS bot_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    total_users INTEGER DEFAULT 0,
-                    total_games INTEGER DEFAULT 0,
-                    total_bets REAL DEFAULT 0,
-                    total_wins REAL DEFAULT 0,
-                    project_start_date TEXT,
-                    last_update TEXT
-                )
-            ''')
-            
-            # Таблица ежедневной статистики
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS daily_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT UNIQUE,
-                    new_users INTEGER DEFAULT 0,
-                    games_played INTEGER DEFAULT 0,
-                    bets_amount REAL DEFAULT 0,
-                    wins_amount REAL DEFAULT 0
-                )
-            ''')
-            
-            # Инициализируем общую статистику если её нет
-            cursor.execute('SELECT COUNT(*) FROM bot_stats')
-            if cursor.fetchone()[0] == 0:
+            with self._lock:
+                cursor = self.conn.cursor()
+                
+                # Таблица общей статистики
                 cursor.execute('''
-                    INSERT INTO bot_stats (project_start_date, last_update) 
-                    VALUES (?, ?)
-                ''', (datetime.now().isoformat(), datetime.now().isoformat()))
-            
-            conn.commit()
-            conn.close()
+                    CREATE TABLE IF NOT EXISTS bot_stats (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        total_users INTEGER DEFAULT 0,
+                        total_games INTEGER DEFAULT 0,
+                        total_bets REAL DEFAULT 0,
+                        total_wins REAL DEFAULT 0,
+                        project_start_date TEXT,
+                        last_update TEXT
+                    )
+                ''')
+                
+                # Таблица ежедневной статистики
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS daily_stats (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        date TEXT UNIQUE,
+                        new_users INTEGER DEFAULT 0,
+                        games_played INTEGER DEFAULT 0,
+                        bets_amount INTEGER DEFAULT 0,
+                        wins_amount INTEGER DEFAULT 0
+                    )
+                ''')
+                
+                # Почасовые события - нижний уровень свёрток. При первом создании
+                # таблицы переносим в неё уже накопленные дни, чтобы свёртка их не обнулила
+                hourly_exists = cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'hourly_stats'"
+                ).fetchone()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS hourly_stats (
+                        hour TEXT PRIMARY KEY,
+                        new_users INTEGER DEFAULT 0,
+                        games_played INTEGER DEFAULT 0,
+                        bets_amount INTEGER DEFAULT 0,
+                        wins_amount INTEGER DEFAULT 0
+                    )
+                ''')
+                if not hourly_exists:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO hourly_stats (hour, new_users, games_played, bets_amount, wins_amount)
+                        SELECT date || ' 00', new_users, games_played, bets_amount, wins_amount FROM daily_stats
+                    ''')
+                
+                # Помесячная свёртка дней
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monthly_stats (
+                        month TEXT PRIMARY KEY,
+                        new_users INTEGER DEFAULT 0,
+                        games_played INTEGER DEFAULT 0,
+                        bets_amount INTEGER DEFAULT 0,
+                        wins_amount INTEGER DEFAULT 0
+                    )
+                ''')
+                
+                # Свёртка по играм за день (первичный ключ покрывает выборку по дате)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS game_daily_stats (
+                        date TEXT NOT NULL,
+                        game TEXT NOT NULL,
+                        rounds INTEGER DEFAULT 0,
+                        staked INTEGER DEFAULT 0,
+                        paid INTEGER DEFAULT 0,
+                        biggest_win INTEGER DEFAULT 0,
+                        hist_0 INTEGER DEFAULT 0,
+                        hist_1 INTEGER DEFAULT 0,
+                        hist_2 INTEGER DEFAULT 0,
+                        hist_3 INTEGER DEFAULT 0,
+                        hist_4 INTEGER DEFAULT 0,
+                        PRIMARY KEY (date, game)
+                    )
+                ''')
+                
+                # Инициализируем общую статистику если её нет
+                cursor.execute('SELECT COUNT(*) FROM bot_stats')
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute('''
+                        INSERT INTO bot_stats (project_start_date, last_update) 
+                        VALUES (?, ?)
+                    ''', (datetime.now().isoformat(), datetime.now().isoformat()))
+                
+                self.conn.commit()
             logging.info("База данных статистики инициализирована")
             
         except Exception as e:
             logging.error(f"Ошибка инициализации БД: {e}")
 
-    def load_users_data(self):
-        """Загрузка данных пользователей"""
-        try:
-            with open('users_data.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
-        except Exception as e:
-            logging.error(f"Ошибка загрузки users_data: {e}")
-            return {}
-
     def get_project_days(self):
         """Получить количество дней с начала проекта"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT project_start_date FROM bot_stats WHERE id = 1')
-            result = cursor.fetchone()
-            conn.close()
+            with self._lock:
+                result = self.conn.execute(PROJECT_START_SQL).fetchone()
             
             if result and result[0]:
                 start_date = datetime.fromisoformat(result[0])
@@ -89,175 +255,220 @@ class BotStats:
 
     def get_total_users(self):
         """Общее количество пользователей"""
-        users_data = self.load_users_data()
-        return len(users_data)
+        return user_store.count_users()
 
     def get_active_users_count(self, days=30):
-        """Количество активных пользователей за период"""
+        """Количество активных пользователей за последние days дней (оценка по дневным скетчам)"""
         try:
-            users_data = self.load_users_data()
-            if not users_data:
-                return 0
-                
-            cutoff_date = datetime.now() - timedelta(days=days)
-            active_count = 0
-            
-            for user_id, user_data in users_data.items():
-                # Если у пользователя есть баланс или он играл недавно
-                if user_data.get('balance', 0) > 0:
-                    active_count += 1
-                # Можно добавить проверку по последней активности если будет такое поле
-                
-            return active_count
+            return activity_tracker.count_active(days)
         except Exception as e:
             logging.error(f"Ошибка получения активных пользователей: {e}")
             return 0
 
-    def get_daily_stats(self):
-        """Статистика за сегодня"""
-        try:
-            today = datetime.now().strftime('%Y-%m-%d')
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT new_users, games_played, bets_amount, wins_amount 
-                FROM daily_stats WHERE date = ?
-            ''', (today,))
-            
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                return {
-                    'new_users': result[0],
-                    'games_played': result[1],
-                    'bets_amount': result[2],
-                    'wins_amount': result[3]
-                }
-            else:
-                return {
-                    'new_users': 0,
-                    'games_played': 0,
-                    'bets_amount': 0,
-                    'wins_amount': 0
-                }
-                
-        except Exception as e:
-            logging.error(f"Ошибка получения дневной статистики: {e}")
-            return {'new_users': 0, 'games_played': 0, 'bets_amount': 0, 'wins_amount': 0}
+    def _add_event(self, new_users=0, games=0, bets=0, wins=0):
+        hour = datetime.now().strftime('%Y-%m-%d %H')
+        with self._events_lock:
+            counters = self._events.setdefault(hour, [0, 0, 0, 0])
+            counters[0] += new_users
+            counters[1] += games
+            counters[2] += bets
+            counters[3] += wins
+        self._flusher.mark(hour)
 
-    def get_weekly_stats(self):
-        """Статистика за последние 7 дней"""
-        try:
-            week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT 
-                    SUM(new_users) as new_users,
-                    SUM(games_played) as games_played,
-                    SUM(bets_amount) as bets_amount,
-                    SUM(wins_amount) as wins_amount
-                FROM daily_stats 
-                WHERE date >= ?
-            ''', (week_ago,))
-            
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result and result[0] is not None:
-                return {
-                    'new_users': result[0],
-                    'games_played': result[1],
-                    'bets_amount': result[2] or 0,
-                    'wins_amount': result[3] or 0
-                }
-            else:
-                return {
-                    'new_users': 0,
-                    'games_played': 0,
-                    'bets_amount': 0,
-                    'wins_amount': 0
-                }
-                
-        except Exception as e:
-            logging.error(f"Ошибка получения недельной статистики: {e}")
-            return {'new_users': 0, 'games_played': 0, 'bets_amount': 0, 'wins_amount': 0}
+    def record_new_user(self):
+        """Учитывает нового пользователя"""
+        self._add_event(new_users=1)
+
+    def _game_counters(self, today, game):
+        return self._game_events.setdefault((today, game), [0, 0, 0, 0, 0, 0, 0, 0, 0])
+
+    def record_bet(self, amount, user_id=None, game=None):
+        """Учитывает сыгранную игру и ставку в центах"""
+        self._add_event(games=1, bets=amount)
+        if game is None:
+            return
+        today = datetime.now().strftime('%Y-%m-%d')
+        if user_id is not None:
+            self._open_stakes[(int(user_id), game)] = amount
+        with self._events_lock:
+            counters = self._game_counters(today, game)
+            counters[0] += 1
+            counters[1] += amount
+        self._flusher.mark(today)
 
-    def get_monthly_stats(self):
-        """Статистика за последние 30 дней"""
+    def record_win(self, amount, user_id=None, game=None):
+        """Учитывает выигрыш в центах"""
+        self._add_event(wins=amount)
+        if game is None:
+            return
+        today = datetime.now().strftime('%Y-%m-%d')
+        stake = self._open_stakes.get((int(user_id), game)) if user_id is not None else None
+        with self._events_lock:
+            counters = self._game_counters(today, game)
+            counters[2] += amount
+            counters[3] = max(counters[3], amount)
+            if stake:
+                bucket = sum(1 for edge in GAME_HIST_EDGES if amount >= stake * edge)
+                counters[4 + bucket] += 1
+        self._flusher.mark(today)
+
+    def record_refund(self, amount, user_id=None, game=None):
+        """Отменяет учёт ставки, которая вернулась игроку не разыгранной"""
+        self._add_event(games=-1, bets=-amount)
+        if game is None:
+            return
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._events_lock:
+            counters = self._game_counters(today, game)
+            counters[0] -= 1
+            counters[1] -= amount
+        self._flusher.mark(today)
+
+    def _flush_events(self, keys):
+        """Прибавляет весь буфер событий к hourly_stats и game_daily_stats одним executemany"""
+        with self._events_lock:
+            rows = [(hour, *counters) for hour, counters in self._events.items()]
+            game_rows = [(*key, *counters) for key, counters in self._game_events.items()]
+            self._events = {}
+            self._game_events = {}
+        if not rows and not game_rows:
+            return
         try:
-            month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT 
-                    SUM(new_users) as new_users,
-                    SUM(games_played) as games_played,
-                    SUM(bets_amount) as bets_amount,
-                    SUM(wins_amount) as wins_amount
-                FROM daily_stats 
-                WHERE date >= ?
-            ''', (month_ago,))
-            
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result and result[0] is not None:
-                return {
-                    'new_users': result[0],
-                    'games_played': result[1],
-                    'bets_amount': result[2] or 0,
-                    'wins_amount': result[3] or 0
-                }
-            else:
-                return {
-                    'new_users': 0,
-                    'games_played': 0,
-                    'bets_amount': 0,
-                    'wins_amount': 0
-                }
-                
-        except Exception as e:
-            logging.error(f"Ошибка получения месячной статистики: {e}")
-            return {'new_users': 0, 'games_played': 0, 'bets_amount': 0, 'wins_amount': 0}
+            with self._lock:
+                self.conn.executemany(HOURLY_INCREMENT_SQL, rows)
+                self.conn.executemany(GAME_INCREMENT_SQL, game_rows)
+                self.conn.commit()
+        except Exception:
+            # Вернём события в буфер - очередь повторит сброс
+            with self._events_lock:
+                for hour, *values in rows:
+                    counters = self._events.setdefault(hour, [0, 0, 0, 0])
+                    for i, value in enumerate(values):
+                        counters[i] += value
+                for date, game, *values in game_rows:
+                    counters = self._game_counters(date, game)
+                    for i, value in enumerate(values):
+                        counters[i] = max(counters[i], value) if i == 3 else counters[i] + value
+            raise
+
+    def get_games_stats_message(self, days=30):
+        """Статистика по играм за последние days дней: раунды, ставки, выплаты, RTP, коэффициенты"""
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        with self._lock:
+            rows = self.conn.execute(GAME_STATS_SQL, (since,)).fetchall()
+
+        if not rows:
+            return "🎮 <b>Статистика игр</b>\n\nДанных пока нет."
+
+        message = f"🎮 <b>Статистика игр за {days} дней</b>\n"
+        for game, rounds, staked, paid, biggest_win, *hist in rows:
+            rtp = paid / staked * 100 if staked else 0
+            losses = max(rounds - sum(hist), 0)
+            histogram = ', '.join(
+                f"{label}: {count}" for label, count in zip(('0x',) + GAME_HIST_LABELS, [losses] + hist) if count
+            )
+            message += (
+                f"\n<b>{GAME_NAMES.get(game, game)}</b>\n"
+                f"├ Раундов: {rounds}\n"
+                f"├ Ставки: ${format_money(staked)} · Выплаты: ${format_money(paid)}\n"
+                f"├ RTP: {rtp:.1f}% · Крупнейший выигрыш: ${format_money(biggest_win)}\n"
+                f"└ Коэффициенты: {histogram or '—'}\n"
+            )
+        return message.strip()
 
     def update_daily_stats(self):
-        """Обновление ежедневной статистики"""
+        """Обновление ежедневной статистики: сбрасывает буфер событий и сворачивает часы в дни"""
         try:
-            today = datetime.now().strftime('%Y-%m-%d')
-            users_data = self.load_users_data()
-            
-            # Простая логика для демонстрации
-            new_users_today = 0
-            # Здесь можно добавить логику подсчета новых пользователей за день
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Обновляем или создаем запись за сегодня
-            cursor.execute('''
-                INSERT OR REPLACE INTO daily_stats 
-                (date, new_users, games_played, bets_amount, wins_amount)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (today, new_users_today, 0, 0, 0))
-            
-            conn.commit()
-            conn.close()
-            
+            self._flusher.flush()
+            self.rollup_daily()
         except Exception as e:
             logging.error(f"Ошибка обновления дневной статистики: {e}")
 
+    def rollup_daily(self):
+        """Пересчитывает строки daily_stats за вчера и сегодня из почасовых"""
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        with self._lock:
+            self.conn.execute(DAILY_ROLLUP_SQL, (yesterday,))
+            self.conn.commit()
+
+    def rollup_monthly(self):
+        """Пересчитывает строки monthly_stats за прошлый и текущий месяц (при первом запуске - за всё время)"""
+        with self._lock:
+            has_months = self.conn.execute('SELECT 1 FROM monthly_stats LIMIT 1').fetchone()
+            since = ''
+            if has_months:
+                since = (datetime.now().replace(day=1) - timedelta(days=1)).strftime('%Y-%m-01')
+            self.conn.execute(MONTHLY_ROLLUP_SQL, (since,))
+            self.conn.commit()
+
+    def prune(self):
+        """Удаляет почасовые и дневные строки старше срока хранения"""
+        self.rollup_monthly()
+        now = datetime.now()
+        hourly_cutoff = (now - timedelta(days=HOURLY_RETENTION_DAYS)).strftime('%Y-%m-%d')
+        daily_cutoff = (now - timedelta(days=DAILY_RETENTION_DAYS)).strftime('%Y-%m-%d')
+        with self._lock:
+            self.conn.execute('DELETE FROM hourly_stats WHERE hour < ?', (hourly_cutoff,))
+            self.conn.execute('DELETE FROM daily_stats WHERE date < ?', (daily_cutoff,))
+            self.conn.execute('DELETE FROM game_daily_stats WHERE date < ?', (daily_cutoff,))
+            self.conn.commit()
+
+    def schedule_rollups(self, scheduler):
+        """Ставит свёртки и очистку в фоновый планировщик"""
+        scheduler.every(DAILY_ROLLUP_INTERVAL, self.update_daily_stats, "stats_daily_rollup", delay=0)
+        scheduler.every(MONTHLY_ROLLUP_INTERVAL, self.rollup_monthly, "stats_monthly_rollup", delay=0)
+        scheduler.every(PRUNE_INTERVAL, self.prune, "stats_prune")
+
+    def get_monthly_stats_message(self, months=12):
+        """Помесячная статистика из свёртки monthly_stats"""
+        with self._lock:
+            rows = self.conn.execute(MONTHLY_STATS_SQL, (months,)).fetchall()
+
+        if not rows:
+            return "📊 <b>Подробная статистика</b>\n\nДанных пока нет."
+
+        message = "📊 <b>Статистика по месяцам</b>\n"
+        for month, new_users, games_played, bets_amount, wins_amount in rows:
+            message += (
+                f"\n<b>{month}</b>\n"
+                f"├ 👤 Новые пользователи: {new_users}\n"
+                f"├ 🎮 Игр сыграно: {games_played}\n"
+                f"├ 💰 Сумма ставок: ${format_money(bets_amount)}\n"
+                f"└ 🏆 Выигрыши: ${format_money(wins_amount)}\n"
+            )
+        return message.strip()
+
+    def get_screen_stats(self):
+        """Дни проекта и статистика за день, неделю и месяц одним запросом"""
+        now = datetime.now()
+        params = {
+            'today': now.strftime('%Y-%m-%d'),
+            'week_ago': (now - timedelta(days=7)).strftime('%Y-%m-%d'),
+            'month_ago': (now - timedelta(days=30)).strftime('%Y-%m-%d'),
+        }
+        with self._lock:
+            row = self.conn.execute(STATS_SCREEN_SQL, params).fetchone()
+
+        project_days = 1
+        if row[0]:
+            project_days = max(1, (now - datetime.fromisoformat(row[0])).days)
+
+        fields = ('new_users', 'games_played', 'bets_amount', 'wins_amount')
+        windows = [
+            {field: value or 0 for field, value in zip(fields, row[start:start + 4])}
+            for start in (1, 5, 9)
+        ]
+        return project_days, *windows
+
     def get_stats_message(self):
         """Генерирует сообщение со статистикой"""
-        project_days = self.get_project_days()
         total_users = self.get_total_users()
-        daily_stats = self.get_daily_stats()
-        weekly_stats = self.get_weekly_stats()
-        monthly_stats = self.get_monthly_stats()
+        try:
+            project_days, daily_stats, weekly_stats, monthly_stats = self.get_screen_stats()
+        except Exception as e:
+            logging.error(f"Ошибка получения статистики: {e}")
+            empty = {'new_users': 0, 'games_played': 0, 'bets_amount': 0, 'wins_amount': 0}
+            project_days, daily_stats, weekly_stats, monthly_stats = 1, empty, empty, empty
         
         message = f"""
 📊 <b>Статистика бота</b>
@@ -268,20 +479,20 @@ class BotStats:
 <b>📈 За сегодня:</b>
 ├ 👤 Новые пользователи: {daily_stats['new_users']}
 ├ 🎮 Игр сыграно: {daily_stats['games_played']}
-├ 💰 Сумма ставок: ${daily_stats['bets_amount']:.2f}
-└ 🏆 Выигрыши: ${daily_stats['wins_amount']:.2f}
+├ 💰 Сумма ставок: ${format_money(daily_stats['bets_amount'])}
+└ 🏆 Выигрыши: ${format_money(daily_stats['wins_amount'])}
 
 <b>📈 За неделю:</b>
 ├ 👤 Новые пользователи: {weekly_stats['new_users']}
 ├ 🎮 Игр сыграно: {weekly_stats['games_played']}
-├ 💰 Сумма ставок: ${weekly_stats['bets_amount']:.2f}
-└ 🏆 Выигрыши: ${weekly_stats['wins_amount']:.2f}
+├ 💰 Сумма ставок: ${format_money(weekly_stats['bets_amount'])}
+└ 🏆 Выигрыши: ${format_money(weekly_stats['wins_amount'])}
 
 <b>📈 За месяц:</b>
 ├ 👤 Новые пользователи: {monthly_stats['new_users']}
 ├ 🎮 Игр сыграно: {monthly_stats['games_played']}
-├ 💰 Сумма ставок: ${monthly_stats['bets_amount']:.2f}
-└ 🏆 Выигрыши: ${monthly_stats['wins_amount']:.2f}
+├ 💰 Сумма ставок: ${format_money(monthly_stats['bets_amount'])}
+└ 🏆 Выигрыши: ${format_money(monthly_stats['wins_amount'])}
         """
         
         return message.strip()
@@ -306,13 +517,13 @@ def register_stats_handlers(bot, stats_manager):
     """Регистрация обработчиков для статистики"""
     
     @bot.message_handler(func=lambda message: message.text == "📊 Статистика")
-    def stats_command(message):
+    async def stats_command(message):
         """Обработчик команды статистики"""
         try:
             stats_message = stats_manager.get_stats_message()
             keyboard = stats_manager.get_stats_keyboard()
             
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 stats_message,
                 reply_markup=keyboard,
@@ -320,33 +531,39 @@ def register_stats_handlers(bot, stats_manager):
             )
         except Exception as e:
             logging.error(f"Ошибка в stats_command: {e}")
-            bot.send_message(message.chat.id, "❌ Ошибка загрузки статистики")
+            await bot.send_message(message.chat.id, "❌ Ошибка загрузки статистики")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('stats_'))
-    def stats_callback_handler(call):
+    async def stats_callback_handler(call):
         """Обработчик колбэков статистики"""
         try:
             if call.data == "stats_refresh":
                 stats_message = stats_manager.get_stats_message()
                 keyboard = stats_manager.get_stats_keyboard()
                 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     stats_message,
                     call.message.chat.id,
                     call.message.message_id,
                     reply_markup=keyboard,
                     parse_mode='HTML'
                 )
-                bot.answer_callback_query(call.id, "✅ Статистика обновлена")
+                await bot.answer_callback_query(call.id, "✅ Статистика обновлена")
                 
             elif call.data == "stats_detailed":
-                # Здесь можно добавить подробную статистику
-                bot.answer_callback_query(call.id, "📊 Подробная статистика в разработке")
+                await bot.edit_message_text(
+                    stats_manager.get_monthly_stats_message(),
+                    call.message.chat.id,
+                    call.message.message_id,
+                    reply_markup=stats_manager.get_stats_keyboard(),
+                    parse_mode='HTML'
+                )
                 
             elif call.data == "stats_users":
                 total_users = stats_manager.get_total_users()
                 active_monthly = stats_manager.get_active_users_count(30)
                 active_weekly = stats_manager.get_active_users_count(7)
+                active_daily = stats_manager.get_active_users_count(1)
                 
                 users_message = f"""
 👥 <b>Статистика пользователей</b>
@@ -354,10 +571,11 @@ def register_stats_handlers(bot, stats_manager):
 📊 Всего пользователей: <b>{total_users}</b>
 📈 Активных за месяц: <b>{active_monthly}</b>
 📈 Активных за неделю: <b>{active_weekly}</b>
+📈 Активных за сегодня: <b>{active_daily}</b>
 📅 Проекту: <b>{stats_manager.get_project_days()}</b> дней
                 """
                 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     users_message.strip(),
                     call.message.chat.id,
                     call.message.message_id,
@@ -366,13 +584,18 @@ def register_stats_handlers(bot, stats_manager):
                 )
                 
             elif call.data == "stats_games":
-                # Здесь можно добавить статистику по играм
-                bot.answer_callback_query(call.id, "🎮 Статистика игр в разработке")
+                await bot.edit_message_text(
+                    stats_manager.get_games_stats_message(),
+                    call.message.chat.id,
+                    call.message.message_id,
+                    reply_markup=stats_manager.get_stats_keyboard(),
+                    parse_mode='HTML'
+                )
                 
         except Exception as e:
             logging.error(f"Ошибка в stats_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Ошибка обновления статистики")
+                await bot.answer_callback_query(call.id, "❌ Ошибка обновления статистики")
             except:
                 pass
 
@@ -1,38 +1,36 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, CLICK_TTL
+from pending_input import pending_inputs
+from records import TombSession
 import logging
 import time
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        logging.error(f"Ошибка загрузки данных: {e}")
-        return {}
+# Активные игры Гробница
+def tomb_win_amount(game_data, manual_take=False):
+    """Выигрыш по последнему множителю; без выбора - ставка при досрочном взятии, иначе 0"""
+    if game_data.last_multiplier is None:
+        return game_data.bet_amount if manual_take else 0
+    return payout(game_data.bet_amount, game_data.last_multiplier)
 
-def save_users_data(data):
-    try:
-        with open('users_data.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка сохранения данных: {e}")
+def take_abandoned_win(user_id, game_data):
+    """Брошенная игра закрывается как досрочное взятие выигрыша"""
+    balance_service.credit(user_id, tomb_win_amount(game_data, manual_take=True), game='tomb')
 
-# Активные игры Гробница
-active_tomb_games = {}
+active_tomb_games = SessionStore('tomb', GAME_TTL, on_evict=take_abandoned_win)
 
-# Минимальная и максимальная ставка
-MIN_BET = 0.2
-MAX_BET = 1000
+# Минимальная и максимальная ставка (в центах)
+MIN_BET = 20
+MAX_BET = 100000
 
 # Задержка между нажатиями
-last_click_time = {}
+last_click_time = SessionStore('tomb_clicks', CLICK_TTL)
 
 def rate_limit(user_id):
     """Проверка ограничения по времени между нажатиями (0.4 секунды)"""
@@ -76,8 +74,8 @@ def get_tomb_rules():
 • После 2 выборов игра автоматически завершается
 
 ⚡ <b>Ставки:</b>
-• Минимальная: ${MIN_BET}
-• Максимальная: ${MAX_BET}
+• Минимальная: ${format_money(MIN_BET)}
+• Максимальная: ${format_money(MAX_BET)}
 </blockquote>
 
 ⚰️ <i>Удачи в поисках сокровищ!</i>
@@ -161,65 +159,63 @@ def create_tomb_display(selected_positions, multipliers, bet_amount, attempts_le
                 display += f"💀 Ячейка {pos+1}: {multiplier}x\n"
         display += "\n"
 
-    display += f"<b>💰 Ставка:</b> ${bet_amount}\n"
+    display += f"<b>💰 Ставка:</b> ${format_money(bet_amount)}\n"
     display += f"<b>🎯 Попыток осталось:</b> {attempts_left}\n"
 
     if last_multiplier:
-        current_win = bet_amount * last_multiplier
+        current_win = payout(bet_amount, last_multiplier)
         display += f"<b>📈 Текущий множитель:</b> {last_multiplier}x\n"
-        display += f"<b>🏆 Можете забрать:</b> ${current_win:.2f}\n"
+        display += f"<b>🏆 Можете забрать:</b> ${format_money(current_win)}\n"
 
     display += f"\n<b>⚰️ Выберите гробницу для открытия:</b>"
 
     return display
 
-def play_tomb_game(bot, call, bet_amount, user_id):
+async def play_tomb_game(bot, call, bet_amount, user_id):
     """Основная логика игры в Гробницу"""
     try:
-        users_data = load_users_data()
-        current_balance = users_data[user_id].get('balance', 0)
-
         # Списываем ставку
-        users_data[user_id]['balance'] = round(current_balance - bet_amount, 2)
-        save_users_data(users_data)
+        if not balance_service.debit(user_id, bet_amount, game='tomb'):
+            await bot.send_message(call.message.chat.id, "❌ Недостаточно средств!")
+            return
 
         # Создаем множители
         multipliers = create_tomb_multipliers()
 
         # Сохраняем состояние игры
-        active_tomb_games[user_id] = {
-            'bet_amount': bet_amount,
-            'multipliers': multipliers,
-            'selected_positions': [],
-            'attempts_left': 2,
-            'last_multiplier': None,
-            'chat_id': call.message.chat.id,
-            'message_id': call.message.message_id
-        }
+        active_tomb_games[user_id] = TombSession(
+            bet_amount=bet_amount,
+            multipliers=multipliers,
+            selected_positions=[],
+            attempts_left=2,
+            last_multiplier=None,
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id
+        )
 
         # Сразу показываем игру (без кнопки "Начать игру")
-        show_tomb_game_state(bot, user_id)
+        await show_tomb_game_state(bot, user_id)
 
     except Exception as e:
         logging.error(f"Ошибка запуска игры в Гробницу: {e}")
-        bot.edit_message_text(
+        await bot.edit_message_text(
             "❌ Произошла ошибка при запуске игры",
             call.message.chat.id,
             call.message.message_id
         )
 
-def show_tomb_game_state(bot, user_id):
+async def show_tomb_game_state(bot, user_id):
     """Показывает текущее состояние игры"""
     try:
         if user_id not in active_tomb_games:
             return
 
         game_data = active_tomb_games[user_id]
-        multipliers = game_data['multipliers']
-        selected_positions = game_data['selected_positions']
-        bet_amount = game_data['bet_amount']
-        attempts_left = game_data['attempts_left']
-        last_multiplier = game_data['last_multiplier']
+        multipliers = game_data.multipliers
+        selected_positions = game_data.selected_positions
+        bet_amount = game_data.bet_amount
+        attempts_left = game_data.attempts_left
+        last_multiplier = game_data.last_multiplier
 
         # Создаем отображение игры
         display = create_tomb_display(selected_positions, multipliers, bet_amount, attempts_left, last_multiplier)
@@ -231,10 +227,10 @@ def show_tomb_game_state(bot, user_id):
         keyboard = get_tomb_keyboard(selected_positions, multipliers, can_take_win)
 
         # Обновляем сообщение
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=keyboard
         )
@@ -242,96 +238,90 @@ def show_tomb_game_state(bot, user_id):
     except Exception as e:
         logging.error(f"Ошибка показа состояния гробницы: {e}")
 
-def process_tomb_choice(bot, call, choice_index, user_id):
+async def process_tomb_choice(bot, call, choice_index, user_id):
     """Обрабатывает выбор ячейки в гробнице"""
     try:
-        if user_id not in active_tomb_games:
-            bot.answer_callback_query(call.id, "❌ Игра не найдена")
-            return
-
-        game_data = active_tomb_games[user_id]
-        multipliers = game_data['multipliers']
-        selected_positions = game_data['selected_positions']
-        attempts_left = game_data['attempts_left']
-
-        # Проверяем выбор
-        if choice_index in selected_positions:
-            bot.answer_callback_query(call.id, "❌ Эта ячейка уже открыта")
-            return
+        error = None
+        settled = None
+        with balance_service.user_lock(user_id):
+            game_data = active_tomb_games.get(user_id)
+
+            # Проверяем выбор
+            if game_data is None:
+                error = "❌ Игра не найдена"
+            elif choice_index in game_data.selected_positions:
+                error = "❌ Эта ячейка уже открыта"
+            elif game_data.attempts_left <= 0:
+                error = "❌ Попытки закончились"
+            else:
+                # Добавляем позицию в выбранные
+                game_data.selected_positions.append(choice_index)
 
-        if attempts_left <= 0:
-            bot.answer_callback_query(call.id, "❌ Попытки закончились")
-            return
+                # Уменьшаем количество попыток
+                game_data.attempts_left -= 1
 
-        # Добавляем позицию в выбранные
-        selected_positions.append(choice_index)
-        game_data['selected_positions'] = selected_positions
+                # Сохраняем последний множитель
+                last_multiplier = game_data.multipliers[choice_index]
+                game_data.last_multiplier = last_multiplier
 
-        # Уменьшаем количество попыток
-        game_data['attempts_left'] -= 1
+                # Автоматически завершаем игру после 2 выборов
+                if game_data.attempts_left <= 0:
+                    settled = settle_tomb_game(user_id)
 
-        # Сохраняем последний множитель
-        last_multiplier = multipliers[choice_index]
-        game_data['last_multiplier'] = last_multiplier
+        if error:
+            await bot.answer_callback_query(call.id, error)
+            return
 
         # Показываем результат выбора
         if last_multiplier >= 1:
-            bot.answer_callback_query(call.id, f"🎯 Нашли множитель {last_multiplier}x!")
+            await bot.answer_callback_query(call.id, f"🎯 Нашли множитель {last_multiplier}x!")
         else:
-            bot.answer_callback_query(call.id, f"💀 Множитель {last_multiplier}x")
+            await bot.answer_callback_query(call.id, f"💀 Множитель {last_multiplier}x")
 
         # Проверяем окончание игры
-        if game_data['attempts_left'] <= 0:
-            # Автоматически завершаем игру после 2 выборов
-            show_tomb_final_result(bot, user_id)
+        if settled is not None:
+            await show_tomb_final_result(bot, *settled)
         else:
             # Показываем обновленное состояние
-            show_tomb_game_state(bot, user_id)
+            await show_tomb_game_state(bot, user_id)
 
     except Exception as e:
         logging.error(f"Ошибка обработки выбора в гробнице: {e}")
-        bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+        await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+
+def settle_tomb_game(user_id, manual_take=False):
+    """Снимает игру и начисляет выигрыш. (игра, выигрыш) или None, если игра уже завершена"""
+    with balance_service.user_lock(user_id):
+        game_data = active_tomb_games.pop(user_id, None)
+        if game_data is None:
+            return None
 
-def take_tomb_win(bot, user_id):
+        # Начисляем выигрыш
+        win_amount = tomb_win_amount(game_data, manual_take)
+        balance_service.credit(user_id, win_amount, game='tomb')
+    return game_data, win_amount
+
+async def take_tomb_win(bot, user_id):
     """Забрать выигрыш досрочно"""
     try:
-        if user_id not in active_tomb_games:
+        # Игру снимаем до выплаты: повторное нажатие её уже не найдёт
+        settled = settle_tomb_game(user_id, manual_take=True)
+        if settled is None:
             return
 
-        game_data = active_tomb_games[user_id]
-        users_data = load_users_data()
-        bet_amount = game_data['bet_amount']
-        last_multiplier = game_data['last_multiplier']
-
-        if last_multiplier is None:
-            # Если еще не выбирали ячейки, возвращаем ставку
-            win_amount = bet_amount
-        else:
-            # Вычисляем выигрыш по последнему множителю
-            win_amount = round(bet_amount * last_multiplier, 2)
-
-        # Начисляем выигрыш
-        users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
-        save_users_data(users_data)
-
         # Показываем результат
-        show_tomb_final_result(bot, user_id, manual_take=True)
+        await show_tomb_final_result(bot, *settled, manual_take=True)
 
     except Exception as e:
         logging.error(f"Ошибка при взятии выигрыша гробницы: {e}")
 
-def show_tomb_final_result(bot, user_id, manual_take=False):
-    """Показывает финальный результат"""
+async def show_tomb_final_result(bot, game_data, win_amount, manual_take=False):
+    """Показывает финальный результат (игра уже снята и оплачена)"""
     try:
-        if user_id not in active_tomb_games:
-            return
-
-        game_data = active_tomb_games[user_id]
-        users_data = load_users_data()
-        bet_amount = game_data['bet_amount']
-        multipliers = game_data['multipliers']
-        selected_positions = game_data['selected_positions']
-        last_multiplier = game_data['last_multiplier']
+        bet_amount = game_data.bet_amount
+        multipliers = game_data.multipliers
+        selected_positions = game_data.selected_positions
+        last_multiplier = game_data.last_multiplier
 
         display = f"<b>⚰️ ГРОБНИЦА - РЕЗУЛЬТАТ</b>\n\n"
 
@@ -346,33 +336,25 @@ def show_tomb_final_result(bot, user_id, manual_take=False):
                     display += f"💀 Ячейка {pos+1}: {multiplier}x\n"
             display += "\n"
 
-        win_amount = 0
         result_text = ""
 
         if manual_take:
             # Игрок забрал досрочно
             if last_multiplier is None:
-                win_amount = bet_amount
-                result_text = f"<b>💰 ВЫ ЗАБРАЛИ СТАВКУ!</b>\n\n<blockquote>💰 Ставка: ${bet_amount}\n↩️ Возврат: ${bet_amount}</blockquote>"
+                result_text = f"<b>💰 ВЫ ЗАБРАЛИ СТАВКУ!</b>\n\n<blockquote>💰 Ставка: ${format_money(bet_amount)}\n↩️ Возврат: ${format_money(bet_amount)}</blockquote>"
             else:
-                win_amount = round(bet_amount * last_multiplier, 2)
                 profit = win_amount - bet_amount
-                result_text = f"<b>💰 ВЫ ЗАБРАЛИ ВЫИГРЫШ!</b>\n\n<blockquote>💰 Ставка: ${bet_amount}\n🎯 Множитель: {last_multiplier}x\n🏆 Выигрыш: ${win_amount:.2f}\n💵 Прибыль: ${profit:.2f}</blockquote>"
+                result_text = f"<b>💰 ВЫ ЗАБРАЛИ ВЫИГРЫШ!</b>\n\n<blockquote>💰 Ставка: ${format_money(bet_amount)}\n🎯 Множитель: {last_multiplier}x\n🏆 Выигрыш: ${format_money(win_amount)}\n💵 Прибыль: ${format_money(profit)}</blockquote>"
         else:
             # Автоматическое завершение после 2 выборов
             if last_multiplier is None:
-                win_amount = 0
-                result_text = f"<b>❌ ИГРА ЗАВЕРШЕНА!</b>\n\n<blockquote>💰 Ставка: ${bet_amount}\n💸 Потеряно: ${bet_amount}</blockquote>"
+                result_text = f"<b>❌ ИГРА ЗАВЕРШЕНА!</b>\n\n<blockquote>💰 Ставка: ${format_money(bet_amount)}\n💸 Потеряно: ${format_money(bet_amount)}</blockquote>"
             else:
-                win_amount = round(bet_amount * last_multiplier, 2)
-                users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
                 profit = win_amount - bet_amount
                 if profit >= 0:
-                    result_text = f"<b>🎯 ИГРА ЗАВЕРШЕНА!</b>\n\n<blockquote>💰 Ставка: ${bet_amount}\n🎯 Множитель: {last_multiplier}x\n🏆 Выигрыш: ${win_amount:.2f}\n💵 Прибыль: ${profit:.2f}</blockquote>"
+                    result_text = f"<b>🎯 ИГРА ЗАВЕРШЕНА!</b>\n\n<blockquote>💰 Ставка: ${format_money(bet_amount)}\n🎯 Множитель: {last_multiplier}x\n🏆 Выигрыш: ${format_money(win_amount)}\n💵 Прибыль: ${format_money(profit)}</blockquote>"
                 else:
-                    result_text = f"<b>🎯 ИГРА ЗАВЕРШЕНА!</b>\n\n<blockquote>💰 Ставка: ${bet_amount}\n🎯 Множитель: {last_multiplier}x\n🏆 Выигрыш: ${win_amount:.2f}\n💸 Убыток: ${-profit:.2f}</blockquote>"
-
-        save_users_data(users_data)
+                    result_text = f"<b>🎯 ИГРА ЗАВЕРШЕНА!</b>\n\n<blockquote>💰 Ставка: ${format_money(bet_amount)}\n🎯 Множитель: {last_multiplier}x\n🏆 Выигрыш: ${format_money(win_amount)}\n💸 Убыток: ${format_money(-profit)}</blockquote>"
 
         display += result_text
 
@@ -383,76 +365,66 @@ def show_tomb_final_result(bot, user_id, manual_take=False):
             types.InlineKeyboardButton("🎮 ДРУГИЕ ИГРЫ", callback_data="tomb_other_games")
         )
 
-        bot.edit_message_text(
+        await bot.edit_message_text(
             display,
-            game_data['chat_id'],
-            game_data['message_id'],
+            game_data.chat_id,
+            game_data.message_id,
             parse_mode='HTML',
             reply_markup=markup
         )
 
-        # Удаляем игру из активных
-        if user_id in active_tomb_games:
-            del active_tomb_games[user_id]
-
     except Exception as e:
         logging.error(f"Ошибка показа результата гробницы: {e}")
 
 def register_tomb_handlers(bot):
     """Регистрация обработчиков для игры в Гробницу"""
 
-    def process_custom_bet_tomb(message):
+    async def process_custom_bet_tomb(message):
         """Обработка ручного ввода ставки для Гробницы"""
         try:
-            bet_amount = float(message.text)
-            users_data = load_users_data()
+            bet_amount = parse_amount(message.text)
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
             
             # Проверяем минимальную и максимальную ставку
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}!")
                 return
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}!")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}!")
                 return
             if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             # Сразу запускаем игру (без кнопки "Начать игру")
-            play_tomb_game(bot, types.CallbackQuery(message=message, data=f"tomb_start_{bet_amount}", from_user=message.from_user, id=""), bet_amount, user_id)
+            await play_tomb_game(bot, types.CallbackQuery(message=message, data=f"tomb_start_{format_money(bet_amount)}", from_user=message.from_user, id=""), bet_amount, user_id)
 
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
         except Exception as e:
             logging.error(f"Ошибка в process_custom_bet_tomb: {e}")
-            bot.send_message(message.chat.id, "❌ Произошла ошибка!")
+            await bot.send_message(message.chat.id, "❌ Произошла ошибка!")
 
     @bot.message_handler(func=lambda message: message.text == "⚰️ Гробница")
-    def tomb_start(message):
+    async def tomb_start(message):
         """Начало игры в Гробницу"""
         try:
             # Проверяем задержку
             if not rate_limit(str(message.from_user.id)):
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            if user_id not in users_data:
-                users_data[user_id] = {'balance': 0}
-                save_users_data(users_data)
+            account_store.ensure_account(user_id, message.from_user.username)
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
                 f"""<b>⚰️ ИГРА "ГРОБНИЦА"</b>
 
@@ -464,37 +436,36 @@ def register_tomb_handlers(bot):
             )
         except Exception as e:
             logging.error(f"Ошибка в tomb_start: {e}")
-            bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
+            await bot.send_message(message.chat.id, "❌ Ошибка запуска игры")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('tomb_'))
-    def tomb_callback_handler(call):
+    async def tomb_callback_handler(call):
         """Обработчик колбэков Гробницы"""
         try:
             user_id = str(call.from_user.id)
 
             # Проверяем задержку
             if not rate_limit(user_id):
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
             if call.data.startswith("tomb_bet_"):
-                bet_amount = float(call.data.split("_")[2])
-                users_data = load_users_data()
+                bet_amount = parse_amount(call.data.split("_")[2])
 
-                balance = users_data[user_id].get('balance', 0)
+                balance = account_store.get_balance(user_id)
                 if bet_amount > balance:
-                    bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                    await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                     return
 
                 # Сразу запускаем игру (без кнопки "Начать игру")
-                play_tomb_game(bot, call, bet_amount, user_id)
+                await play_tomb_game(bot, call, bet_amount, user_id)
 
             elif call.data == "tomb_custom_bet":
-                bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-                bot.register_next_step_handler(call.message, process_custom_bet_tomb)
+                await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+                pending_inputs.register(call.message, process_custom_bet_tomb)
 
             elif call.data == "tomb_rules":
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     get_tomb_rules(),
                     call.message.chat.id,
                     call.message.message_id,
@@ -505,11 +476,10 @@ def register_tomb_handlers(bot):
                 )
 
             elif call.data == "tomb_back_to_bet":
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""<b>⚰️ ИГРА "ГРОБНИЦА"</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -523,21 +493,19 @@ def register_tomb_handlers(bot):
 
             elif call.data.startswith("tomb_choose_"):
                 choice_index = int(call.data.split("_")[2])
-                process_tomb_choice(bot, call, choice_index, user_id)
+                await process_tomb_choice(bot, call, choice_index, user_id)
 
             elif call.data == "tomb_take_win":
-                take_tomb_win(bot, user_id)
+                await take_tomb_win(bot, user_id)
 
             elif call.data == "tomb_play_again":
                 # Очищаем предыдущую игру
-                if user_id in active_tomb_games:
-                    del active_tomb_games[user_id]
+                active_tomb_games.discard(user_id)
 
-                users_data = load_users_data()
-                balance = users_data[user_id].get('balance', 0)
-                balance_rounded = round(balance, 2)
+                balance = account_store.get_balance(user_id)
+                balance_rounded = format_money(balance)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"""<b>⚰️ ИГРА "ГРОБНИЦА"</b>
 
 <blockquote>💎 Баланс: ${balance_rounded}</blockquote>
@@ -551,10 +519,9 @@ def register_tomb_handlers(bot):
 
             elif call.data == "tomb_other_games":
                 # Возврат к основным играм
-                if user_id in active_tomb_games:
-                    del active_tomb_games[user_id]
+                active_tomb_games.discard(user_id)
 
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     "🎮 <b>Выберите игру:</b>",
                     call.message.chat.id,
                     call.message.message_id,
@@ -564,6 +531,6 @@ def register_tomb_handlers(bot):
         except Exception as e:
             logging.error(f"Ошибка в tomb_callback_handler: {e}")
             try:
-                bot.answer_callback_query(call.id, "❌ Ошибка в игре")
+                await bot.answer_callback_query(call.id, "❌ Ошибка в игре")
             except:
                 pass
\ No newline at end of file
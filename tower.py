@@ -1,7 +1,11 @@
 import telebot
 from telebot import types
 import random
-import json
+from accounts import account_store
+from balance_service import balance_service
+from money import parse_amount, payout, format_money
+from sessions import SessionStore, GAME_TTL, INPUT_TTL, CLICK_TTL
+from pending_input import pending_inputs
 import time
 
 class TowerGame:
@@ -64,23 +68,16 @@ class TowerGame:
         dragon_index = self.dragons_count - 1
         return self.multipliers[self.floor + 1][dragon_index]
 
-def load_users_data():
-    try:
-        with open('users_data.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+def cash_out_abandoned(user_id, game):
+    """Брошенная игра закрывается выплатой текущего выигрыша (без подъёма - ставкой)"""
+    balance_service.credit(user_id, payout(game.bet_amount, game.get_current_multiplier()), game='tower')
 
-def save_users_data(data):
-    with open('users_data.json', 'w') as f:
-        json.dump(data, f)
+active_tower_games = SessionStore('tower', GAME_TTL, on_evict=cash_out_abandoned)
+user_temp_data_tower = SessionStore('tower_input', INPUT_TTL)
+user_last_click_time_tower = SessionStore('tower_clicks', CLICK_TTL)
 
-active_tower_games = {}
-user_temp_data_tower = {}
-user_last_click_time_tower = {}
-
-MIN_BET = 0.2
-MAX_BET = 1000
+MIN_BET = 20
+MAX_BET = 100000
 
 def get_bet_selection_keyboard():
     markup = types.InlineKeyboardMarkup(row_width=5)
@@ -166,7 +163,7 @@ def get_tower_keyboard(game, show_all=False, show_current_dragons=False):
     if (not show_all and game.floor > 0) or show_current_dragons:
         current_mult = game.get_current_multiplier()
         markup.row(types.InlineKeyboardButton(
-            f"💵 Забрать ${round(game.bet_amount * current_mult, 2)}",
+            f"💵 Забрать ${format_money(payout(game.bet_amount, current_mult))}",
             callback_data="tower_cashout"
         ))
 
@@ -174,19 +171,16 @@ def get_tower_keyboard(game, show_all=False, show_current_dragons=False):
 
 def register_tower_handlers(bot):
     @bot.message_handler(func=lambda message: message.text == "🏰 Башня")
-    def tower_start(message):
-        users_data = load_users_data()
+    async def tower_start(message):
         user_id = str(message.from_user.id)
 
-        if user_id not in users_data:
-            users_data[user_id] = {'balance': 0}
-            save_users_data(users_data)
+        account_store.ensure_account(user_id, message.from_user.username)
 
-        balance = users_data[user_id].get('balance', 0)
-        balance_rounded = round(balance, 2)
+        balance = account_store.get_balance(user_id)
+        balance_rounded = format_money(balance)
 
         # ТОЧНО КАК В СКРИНЕ 1 - выбор ставки
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             f"🏰 Башня\n\n<blockquote>💎Баланс: ${balance_rounded}\nСумма ставки👇</blockquote>",
             parse_mode='HTML',
@@ -194,33 +188,32 @@ def register_tower_handlers(bot):
         )
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('tower_'))
-    def tower_callback_handler(call):
+    async def tower_callback_handler(call):
         user_id = str(call.from_user.id)
-        users_data = load_users_data()
 
         # Проверка задержки между нажатиями
         current_time = time.time()
         if user_id in user_last_click_time_tower:
             time_diff = current_time - user_last_click_time_tower[user_id]
             if time_diff < 0.4:
-                bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
+                await bot.answer_callback_query(call.id, "⏳ Не так быстро!", show_alert=False)
                 return
 
         user_last_click_time_tower[user_id] = current_time
 
         if call.data.startswith("tower_bet_"):
-            bet_amount = float(call.data.split("_")[2])
+            bet_amount = parse_amount(call.data.split("_")[2])
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
             if bet_amount > balance:
-                bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+                await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                 return
 
             user_temp_data_tower[user_id] = {'bet_amount': bet_amount}
 
             # ТОЧНО КАК В СКРИНЕ 2 - выбор драконов
-            bot.edit_message_text(
-                f"🏰 Башня · ${bet_amount}\n\n<blockquote>Выберите количество драконов🐉 на каждом этаже👇:</blockquote>",
+            await bot.edit_message_text(
+                f"🏰 Башня · ${format_money(bet_amount)}\n\n<blockquote>Выберите количество драконов🐉 на каждом этаже👇:</blockquote>",
                 call.message.chat.id,
                 call.message.message_id,
                 parse_mode='HTML',
@@ -232,27 +225,23 @@ def register_tower_handlers(bot):
             dragons_count = int(call.data.split("_")[2])
 
             if user_id not in user_temp_data_tower or 'bet_amount' not in user_temp_data_tower[user_id]:
-                bot.answer_callback_query(call.id, "❌ Ошибка данных!")
+                await bot.answer_callback_query(call.id, "❌ Ошибка данных!")
                 return
 
             bet_amount = user_temp_data_tower[user_id]['bet_amount']
 
-            balance = users_data[user_id].get('balance', 0)
-            if bet_amount > balance:
-                bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
+            if not balance_service.debit(user_id, bet_amount, game='tower'):
+                await bot.answer_callback_query(call.id, "❌ Недостаточно средств!")
                 return
 
             game = TowerGame(user_id, dragons_count, bet_amount)
             active_tower_games[user_id] = game
 
-            users_data[user_id]['balance'] = round(balance - bet_amount, 2)
-            save_users_data(users_data)
-
             if user_id in user_temp_data_tower:
                 del user_temp_data_tower[user_id]
 
             # ТОЧНО КАК В СКРИНЕ 3 - начало игры
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"🏰 Башня · {dragons_count} драконов🐉 на этаж\n\n"
                 f"<blockquote>📌Текущий этаж: 0/10\n"
                 f"💰Множитель: x1.00\n"
@@ -265,13 +254,13 @@ def register_tower_handlers(bot):
             return
 
         elif call.data == "tower_custom_bet":
-            bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
-            bot.register_next_step_handler(call.message, process_custom_bet)
+            await bot.send_message(call.message.chat.id, "📝 Введите сумму ставки:")
+            pending_inputs.register(call.message, process_custom_bet)
             return
 
         elif call.data.startswith("tower_climb_"):
             if user_id not in active_tower_games:
-                bot.answer_callback_query(call.id, "❌ Игра не найдена")
+                await bot.answer_callback_query(call.id, "❌ Игра не найдена")
                 return
 
             game = active_tower_games[user_id]
@@ -280,24 +269,32 @@ def register_tower_handlers(bot):
             floor_num = int(parts[2])
             cell_num = int(parts[3])
 
-            # Добавляем выбранную ячейку
-            game.add_selected_cell(floor_num, cell_num)
+            with balance_service.user_lock(user_id):
+                if active_tower_games.get(user_id) is not game:
+                    success = None
+                else:
+                    # Добавляем выбранную ячейку
+                    game.add_selected_cell(floor_num, cell_num)
 
-            # Поднимаемся на этаж и проверяем результат
-            success = game.climb_floor(cell_num)
+                    # Поднимаемся на этаж и проверяем результат
+                    success = game.climb_floor(cell_num)
+                    if not success:
+                        # Дракон - ставка проиграна, снимаем игру до ответа
+                        active_tower_games.pop(user_id, None)
 
-            if not success:
-                users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0), 2)
-                save_users_data(users_data)
+            if success is None:
+                await bot.answer_callback_query(call.id, "❌ Игра не найдена")
+                return
 
+            if not success:
                 # ТОЧНО КАК В СКРИНЕ 5 - проигрыш
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"🏰 Башня · {game.dragons_count} драконов🐉 на этаж\n\n"
                     f"<blockquote><b>❌Проигрыш</b>\n\n"
                     f"Вы разбудили дракона🐉..\n\n"
-                    f"💰Ставка: ${game.bet_amount}\n"
-                    f"📌Мог забрать: ${round(game.bet_amount * game.get_current_multiplier(), 2)}\n"
-                    f"💎Баланс: ${users_data[user_id]['balance']}</blockquote>",
+                    f"💰Ставка: ${format_money(game.bet_amount)}\n"
+                    f"📌Мог забрать: ${format_money(payout(game.bet_amount, game.get_current_multiplier()))}\n"
+                    f"💎Баланс: ${format_money(account_store.get_balance(user_id))}</blockquote>",
                     call.message.chat.id,
                     call.message.message_id,
                     parse_mode='HTML',
@@ -306,7 +303,7 @@ def register_tower_handlers(bot):
                 return
             else:
                 # ТОЧНО КАК В СКРИНЕ 4 - успешный подъем
-                bot.edit_message_text(
+                await bot.edit_message_text(
                     f"🏰 Башня · {game.dragons_count} драконов на этаж\n\n"
                     f"<blockquote>📌Текущий этаж: {game.floor}/10\n"
                     f"💰Множитель: x{game.get_current_multiplier():.2f}\n"
@@ -321,24 +318,25 @@ def register_tower_handlers(bot):
                 return
 
         elif call.data == "tower_cashout":
-            if user_id not in active_tower_games:
-                bot.answer_callback_query(call.id, "❌ Игра не найдена")
+            # Игру снимаем до выплаты: повторное нажатие её уже не найдёт
+            with balance_service.user_lock(user_id):
+                game = active_tower_games.pop(user_id, None)
+                if game is not None:
+                    win_amount = payout(game.bet_amount, game.get_current_multiplier())
+                    balance_service.credit(user_id, win_amount, game='tower')
+
+            if game is None:
+                await bot.answer_callback_query(call.id, "❌ Игра не найдена")
                 return
 
-            game = active_tower_games[user_id]
-
-            win_amount = game.bet_amount * game.get_current_multiplier()
-            users_data[user_id]['balance'] = round(users_data[user_id].get('balance', 0) + win_amount, 2)
-            save_users_data(users_data)
-
             # ТОЧНО КАК В СКРИНЕ 6 - победа
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"🏰 Башня · ПОБЕДА🥳\n\n"
                 f"<blockquote><b>Победа!🥳</b>\n\n"
                 f"Вы не разбудили дракона🐉\n\n"
-                f"💰Ставка: ${game.bet_amount}\n"
-                f"🍀Выигрыш: ${round(win_amount, 2)}\n"
-                f"💎Баланс: ${users_data[user_id]['balance']}</blockquote>",
+                f"💰Ставка: ${format_money(game.bet_amount)}\n"
+                f"🍀Выигрыш: ${format_money(win_amount)}\n"
+                f"💎Баланс: ${format_money(account_store.get_balance(user_id))}</blockquote>",
                 call.message.chat.id,
                 call.message.message_id,
                 parse_mode='HTML',
@@ -347,15 +345,14 @@ def register_tower_handlers(bot):
             return
 
         elif call.data == "tower_again":
-            if user_id in active_tower_games:
-                del active_tower_games[user_id]
+            active_tower_games.discard(user_id)
             if user_id in user_temp_data_tower:
                 del user_temp_data_tower[user_id]
 
-            balance = users_data[user_id].get('balance', 0)
-            balance_rounded = round(balance, 2)
+            balance = account_store.get_balance(user_id)
+            balance_rounded = format_money(balance)
 
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 f"🏰 Башня\n\n<blockquote>💎Баланс: ${balance_rounded}\nСумма ставки👇</blockquote>",
                 call.message.chat.id,
                 call.message.message_id,
@@ -365,38 +362,37 @@ def register_tower_handlers(bot):
             return
 
         elif call.data == "tower_ignore":
-            bot.answer_callback_query(call.id)
+            await bot.answer_callback_query(call.id)
             return
 
-    def process_custom_bet(message):
+    async def process_custom_bet(message):
         try:
-            bet_amount = float(message.text)
+            bet_amount = parse_amount(message.text)
 
             if bet_amount < MIN_BET:
-                bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${MIN_BET}")
+                await bot.send_message(message.chat.id, f"❌ Минимальная ставка: ${format_money(MIN_BET)}")
                 return
 
             if bet_amount > MAX_BET:
-                bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${MAX_BET}")
+                await bot.send_message(message.chat.id, f"❌ Максимальная ставка: ${format_money(MAX_BET)}")
                 return
 
-            users_data = load_users_data()
             user_id = str(message.from_user.id)
 
-            balance = users_data[user_id].get('balance', 0)
+            balance = account_store.get_balance(user_id)
             if bet_amount > balance:
-                bot.send_message(message.chat.id, "❌ Недостаточно средств!")
+                await bot.send_message(message.chat.id, "❌ Недостаточно средств!")
                 return
 
             user_temp_data_tower[user_id] = {'bet_amount': bet_amount}
 
-            bot.send_message(
+            await bot.send_message(
                 message.chat.id,
-                f"🏰 Башня · ${bet_amount}\n\n<blockquote>Выберите количество драконов🐉 на каждом этаже👇:</blockquote>",
+                f"🏰 Башня · ${format_money(bet_amount)}\n\n<blockquote>Выберите количество драконов🐉 на каждом этаже👇:</blockquote>",
                 parse_mode='HTML',
                 reply_markup=get_dragons_selection_keyboard()
             )
         except ValueError:
-            bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
+            await bot.send_message(message.chat.id, "❌ Введите корректную сумму!")
 
     register_tower_handlers.process_custom_bet = process_custom_bet
\ No newline at end of file
@@ -0,0 +1,197 @@
+import logging
+from datetime import datetime
+
+from db import shared_connection
+from write_behind import WriteBehindQueue
+from hot_table import hot_table
+from migrate_users import migrate
+from records import UserAccount
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+USERS_FILE = 'users_data.json'
+
+# Групповой коммит записей: не реже чем раз в FLUSH_INTERVAL секунд или каждые FLUSH_BATCH изменений
+FLUSH_INTERVAL = 0.2
+FLUSH_BATCH = 100
+
+# Сколько записей читает за раз полный обход iter_users
+ITER_CHUNK = 1000
+
+
+def first_seen_epoch(record):
+    """first_seen записи в секундах epoch (0, если поля нет)"""
+    first_seen = record.first_seen
+    return int(datetime.fromisoformat(first_seen).timestamp()) if first_seen else 0
+
+
+class UserStore:
+    """Записи пользователей построчно в casino.db: чтение и запись одной записи не зависят от числа пользователей"""
+
+    def __init__(self, db_path='casino.db', legacy_path=USERS_FILE,
+                 flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH):
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        self.conn, self._lock = shared_connection(db_path)
+        self._listeners = []
+        self.init_database()
+        # Ошибка переноса останавливает запуск: бот не должен работать на недоперенесённых данных
+        migrated = migrate(self.conn, self._lock, legacy_path)
+        if hot_table.created or migrated:
+            self.sync_hot_table()
+        # Число пользователей считается один раз и дальше ведётся в put_user
+        with self._lock:
+            self._user_count = self.conn.execute('SELECT COUNT(*) FROM user_records').fetchone()[0]
+        self._commits = WriteBehindQueue(self._commit, "user_store", flush_interval, flush_batch)
+
+    def init_database(self):
+        """Создание таблиц, если их ещё нет"""
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_records (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    joined INTEGER,
+                    data TEXT NOT NULL
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_user_records_username ON user_records (LOWER(username))')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_user_records_joined ON user_records (joined)')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            self.conn.commit()
+
+    def sync_hot_table(self):
+        """Заполняет first_seen и уровень в горячей таблице по всем записям"""
+        for user_id, record in self.iter_users():
+            hot_table.set_profile(user_id, first_seen_epoch(record), record.level)
+
+    def _commit(self, user_ids):
+        """Фиксирует одной транзакцией все записи, изменённые с прошлого коммита"""
+        with self._lock:
+            self.conn.commit()
+
+    def get_user(self, user_id):
+        """Запись пользователя (UserAccount) или None"""
+        with self._lock:
+            row = self.conn.execute('SELECT data FROM user_records WHERE user_id = ?', (int(user_id),)).fetchone()
+        return UserAccount.from_json(row[0]) if row else None
+
+    def put_user(self, user_id, record):
+        """Сохраняет запись пользователя; коммит выполнит фоновый поток"""
+        with self._lock:
+            exists = self.conn.execute('SELECT 1 FROM user_records WHERE user_id = ?', (int(user_id),)).fetchone()
+            self._write(user_id, record, exists)
+        self._saved(user_id, record)
+
+    def update_user(self, user_id, update):
+        """Чтение, изменение и запись одной операцией под блокировкой.
+
+        update(запись) меняет запись на месте; если записи нет, она создаётся
+        с first_seen = сейчас. Возвращает (запись, создана ли она)
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT data FROM user_records WHERE user_id = ?', (int(user_id),)).fetchone()
+            record = UserAccount.from_json(row[0]) if row else UserAccount(first_seen=datetime.now().isoformat())
+            update(record)
+            self._write(user_id, record, row)
+        self._saved(user_id, record)
+        return record, row is None
+
+    def _write(self, user_id, record, exists):
+        """Пишет запись в user_records; вызывается под блокировкой"""
+        self.conn.execute('''
+            INSERT INTO user_records (user_id, username, joined, data)
+            VALUES (?, ?, (SELECT COALESCE(MAX(joined), 0) + 1 FROM user_records), ?)
+            ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, data = excluded.data
+        ''', (int(user_id), record.username, record.to_json()))
+        if not exists:
+            self._user_count += 1
+
+    def _saved(self, user_id, record):
+        """Горячая таблица, фоновый коммит и подписчики после записи"""
+        hot_table.set_profile(user_id, first_seen_epoch(record), record.level)
+        self._commits.mark(int(user_id))
+        for listener in self._listeners:
+            listener(user_id, record)
+
+    def add_listener(self, listener):
+        """Подписка на сохранение записей: listener(user_id, запись) вызывается после put_user"""
+        self._listeners.append(listener)
+
+    def find_user(self, identifier):
+        """Поиск по ID или @username. Возвращает (user_id, запись) или None"""
+        with self._lock:
+            if identifier.startswith('@'):
+                row = self.conn.execute(
+                    'SELECT user_id, data FROM user_records WHERE LOWER(username) = ?',
+                    (identifier[1:].lower(),)
+                ).fetchone()
+            elif identifier.isdigit():
+                row = self.conn.execute(
+                    'SELECT user_id, data FROM user_records WHERE user_id = ?', (int(identifier),)
+                ).fetchone()
+            else:
+                row = None
+        return (str(row[0]), UserAccount.from_json(row[1])) if row else None
+
+    def count_users(self):
+        """Количество зарегистрированных пользователей (из счётчика, без запроса к БД)"""
+        return self._user_count
+
+    def get_recent_users(self, limit=10):
+        """Последние зарегистрированные пользователи: список (user_id, запись)"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT user_id, data FROM user_records ORDER BY joined DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [(str(user_id), UserAccount.from_json(data)) for user_id, data in reversed(rows)]
+
+    def iter_users(self, chunk_size=ITER_CHUNK):
+        """Все записи (user_id, запись) - для редких полных обходов.
+
+        Читаются блоками по chunk_size строк, блокировка держится только на
+        время чтения блока, поэтому в памяти не бывает всех записей сразу
+        """
+        last_id = -(1 << 63)
+        while True:
+            with self._lock:
+                # fetchall доводит ограниченный LIMIT запрос до конца - открытого
+                # чтения на общем соединении между блоками не остаётся
+                rows = self.conn.execute(
+                    'SELECT user_id, data FROM user_records WHERE user_id > ? ORDER BY user_id LIMIT ?',
+                    (last_id, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            for user_id, data in rows:
+                yield str(user_id), UserAccount.from_json(data)
+            last_id = rows[-1][0]
+
+    def close(self):
+        """Фиксирует последние изменения"""
+        self._commits.close()
+
+
+# Глобальный экземпляр хранилища, общий для всех модулей
+user_store = UserStore()
+
+
+def get_user(user_id):
+    return user_store.get_user(user_id)
+
+
+def put_user(user_id, record):
+    user_store.put_user(user_id, record)
+
+
+def update_user(user_id, update):
+    return user_store.update_user(user_id, update)
+
+
+def find_user(identifier):
+    return user_store.find_user(identifier)
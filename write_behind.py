@@ -0,0 +1,77 @@
+import time
+import atexit
+import logging
+import threading
+
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class WriteBehindQueue:
+    """Отложенная запись: копит изменённые ключи и сбрасывает их одной группой.
+
+    Сброс происходит каждые interval секунд или сразу, как только
+    накопилось max_batch изменений. flush_fn получает множество ключей.
+    """
+
+    def __init__(self, flush_fn, name, interval=1.0, max_batch=100):
+        self.flush_fn = flush_fn
+        self.name = name
+        self.interval = interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = set()
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def mark(self, key):
+        """Отмечает ключ изменённым; запись выполнит фоновый поток"""
+        with self._lock:
+            self._dirty.add(key)
+            depth = len(self._dirty)
+        metrics.set_gauge(f"{self.name}.queue_depth", depth)
+        if depth >= self.max_batch:
+            self._wake.set()
+
+    def flush(self):
+        """Сбрасывает накопленные изменения одной группой"""
+        with self._flush_lock:
+            with self._lock:
+                keys, self._dirty = self._dirty, set()
+            if not keys:
+                return
+
+            start = time.perf_counter()
+            try:
+                self.flush_fn(keys)
+            except Exception as e:
+                logging.error(f"Ошибка записи {self.name}: {e}")
+                metrics.inc(f"{self.name}.flush_errors")
+                # Вернём ключи в очередь - попробуем на следующем тике
+                with self._lock:
+                    self._dirty |= keys
+                return
+
+            metrics.observe(f"{self.name}.flush_ms", (time.perf_counter() - start) * 1000)
+            metrics.observe(f"{self.name}.batch_size", len(keys))
+            with self._lock:
+                metrics.set_gauge(f"{self.name}.queue_depth", len(self._dirty))
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Останавливает фоновый поток и сбрасывает последние изменения"""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()